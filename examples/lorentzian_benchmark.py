@@ -0,0 +1,106 @@
+"""
+Accuracy and speed of the closed-form Lorentzian estimator against the
+lmfit fit of `fitter`, on synthetic dips of known parameters and on the
+resonances of recorded transmission results:
+
+    python lorentzian_benchmark.py [RESULTS_FILE ...]
+"""
+
+try:
+    import ongpym
+    del ongpym
+except ImportError:
+    from pathlib import Path
+    file = Path(__file__). resolve()
+    package_root_directory = str(file)[:str(file).find('ONGPyMeasureSuite')] \
+        + 'ONGPyMeasureSuite'
+    exec(open(str(package_root_directory)+'/initialize.py').read())
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from ongpym.analysis import find_resonances, fit_resonance, fit_lorentzians
+from ongpym.storage import load_results
+
+# The fit cache would turn repeated lmfit fits into lookups
+METHODS = {'lmfit': lambda x, y: fit_resonance.__wrapped__(x, y),
+           'algebraic': lambda x, y: fit_lorentzians(x, y, refine=0),
+           'fast': lambda x, y: fit_lorentzians(x, y, refine=1)}
+
+
+def center_fwhm(fit):
+    return np.ravel(fit['center'])[0], np.ravel(fit['FWHM'])[0]
+
+
+def synthetic(n_trials=200, n=2000, noise=0.01, seed=0):
+    """ Relative errors of center and FWHM in units of the FWHM and time
+    per fit of every method on random dips.
+    """
+    rng = np.random.default_rng(seed)
+    x = np.linspace(1555, 1556, n)
+    errors = {method: [] for method in METHODS}
+    times = dict.fromkeys(METHODS, 0.)
+    for _ in range(n_trials):
+        center = rng.uniform(1555.3, 1555.7)
+        fwhm = rng.uniform(0.005, 0.05)
+        depth = rng.uniform(0.2, 0.9)
+        y = 1 + 0.05*(x - 1555) - depth/(1 + (2*(x - center)/fwhm)**2) \
+            + rng.normal(0, noise, n)
+        for method, fit in METHODS.items():
+            start = perf_counter()
+            c, w = center_fwhm(fit(x, y))
+            times[method] += perf_counter() - start
+            errors[method].append([(c - center)/fwhm, w/fwhm - 1])
+
+    print('Synthetic dips, %d trials, noise %g:' % (n_trials, noise))
+    print('%-10s %14s %14s %12s' % ('method', 'center/FWHM', 'FWHM rel.',
+                                    'time [ms]'))
+    for method in METHODS:
+        median = np.median(np.abs(errors[method]), axis=0)
+        print('%-10s %14.2e %14.2e %12.3f' % (
+            method, median[0], median[1], 1e3*times[method]/n_trials))
+
+
+def recorded(filename):
+    """ Deviation of the estimators from lmfit and time per fit on the
+    resonances of a recorded transmission trace.
+    """
+    data = load_results(filename).data
+    x = np.asarray(data['Wavelength'])
+    y = np.asarray(data['Voltage'])
+    resonances = find_resonances(x, y)
+    deviations = {method: [] for method in METHODS if method != 'lmfit'}
+    times = dict.fromkeys(METHODS, 0.)
+    for start, stop in zip(resonances['start'], resonances['stop']):
+        fits = {}
+        for method, fit in METHODS.items():
+            begin = perf_counter()
+            fits[method] = center_fwhm(fit(x[start:stop], y[start:stop]))
+            times[method] += perf_counter() - begin
+        c, w = fits['lmfit']
+        for method in deviations:
+            deviations[method].append([(fits[method][0] - c)/w,
+                                       fits[method][1]/w - 1])
+
+    n = max(len(resonances), 1)
+    print('%s, %d resonances:' % (filename, len(resonances)))
+    print('%-10s %14s %14s %12s' % ('method', 'center/FWHM', 'FWHM rel.',
+                                    'time [ms]'))
+    for method in METHODS:
+        if method in deviations and deviations[method]:
+            median = np.median(np.abs(deviations[method]), axis=0)
+        else:
+            median = [0., 0.]
+        print('%-10s %14.2e %14.2e %12.3f' % (
+            method, median[0], median[1], 1e3*times[method]/n))
+
+
+if __name__ == '__main__':
+    for noise in [0.003, 0.01, 0.03]:
+        synthetic(noise=noise)
+        print()
+    for filename in sys.argv[1:]:
+        recorded(filename)
+        print()
@@ -15,6 +15,10 @@ from ongpym.experiments.swept_transmission import \
     swept_transmission_interface
 from ongpym.experiments.voltage_sequence_time_domain import \
     voltage_sequence_time_domain_interface
+from ongpym.experiments.piezo_scan import piezo_scan_interface
+from ongpym.experiments.frequency_response import \
+    frequency_response_interface
+from ongpym.storage.retention import start_trash_retention
 
 from PyQt5.QtWidgets import \
     QApplication, QPushButton, QLabel, QGridLayout, QWidget, QVBoxLayout
@@ -68,6 +72,14 @@ class MainWindow(QWidget):
             'Voltage Sequence in Time Domain\n(Keysight E36106A + \
             Tektronix MDO3052)')
         self.button6.clicked.connect(self.v_seq_time_domain)
+        self.button7 = QPushButton(
+            'Piezo Scan Resonance Tracking\n(Toptica CTL + \
+            Tektronix MDO3052)')
+        self.button7.clicked.connect(self.piezo_scan)
+        self.button8 = QPushButton(
+            'Frequency Response\n(GWInstek AFG-2125 + \
+            Tektronix MDO3052)')
+        self.button8.clicked.connect(self.freq_response)
 
         self.layout.addWidget(self.title, 0, 1)
         self.layout.addWidget(self.button1, 1, 0)
@@ -76,6 +88,8 @@ class MainWindow(QWidget):
         self.layout.addWidget(self.button4, 2, 0)
         self.layout.addWidget(self.button5, 2, 1)
         self.layout.addWidget(self.button6, 2, 2)
+        self.layout.addWidget(self.button7, 3, 0)
+        self.layout.addWidget(self.button8, 3, 1)
 
         self.layout.setVerticalSpacing(100)
         self.layout.setHorizontalSpacing(50)
@@ -106,8 +120,19 @@ class MainWindow(QWidget):
         self.w = voltage_sequence_time_domain_interface()
         self.w.show()
 
+    def piezo_scan(self, checked):
+        self.w = piezo_scan_interface()
+        self.w.show()
+
+    def freq_response(self, checked):
+        self.w = frequency_response_interface()
+        self.w.show()
+
 
-app = QApplication(sys.argv)
-w = MainWindow()
-w.show()
-sys.exit(app.exec())
+# Worker processes, e.g. of the plot renderer, import this module again
+if __name__ == '__main__':
+    app = QApplication(sys.argv)
+    retention = start_trash_retention()
+    w = MainWindow()
+    w.show()
+    sys.exit(app.exec())
@@ -6,5 +6,8 @@ Created on Wed Jan 27 09:30:41 2021
 @author: amaeder
 """
 
+from . import utils
 from . import instruments
-from . import experiments
\ No newline at end of file
+from . import experiments
+from . import storage
+from . import analysis
\ No newline at end of file
@@ -0,0 +1,6 @@
+from .resonances import find_resonances, fit_resonance, fit_resonances
+from .lorentzian import fit_lorentzians, lorentzian_curve
+from .cache import FitCache, cached_fit, default_fit_cache
+from .fsr import estimate_fsr, resonance_comb, dispersion
+from .linearization import (WavelengthCorrection, wavelength_correction,
+                            cached_wavelength_correction)
@@ -0,0 +1,276 @@
+""" Headless re-analysis of transmission results in whole directories.
+
+Every transmission and swept-transmission result file below the given
+directories is analysed in a pool of processes: all resonances are
+detected and fitted, the FSR is estimated and optionally a plot is
+rendered. The fits of every resonance are appended to a summary table as
+soon as a file is done, and files that were analysed before are skipped,
+so an interrupted run continues where it stopped:
+
+    python -m ongpym.analysis.batch DIRECTORY [DIRECTORY ...] --output OUT
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from pymeasure.experiment import Results
+
+from ..storage import load_columns
+from ..storage.binary import EXTENSIONS
+from .resonances import find_resonances, fit_resonances
+from .fsr import estimate_fsr
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# x and y columns of the traces by procedure class
+TRACES = {'transmission_experiment': ('Wavelength', 'Voltage'),
+          'swept_transmission_experiment': ('Wavelength [nm]', 'Power')}
+
+SUMMARY = 'summary.csv'
+DONE = 'done.txt'
+
+
+def result_files(directories):
+    """ Yields the result files below the directories. """
+    extensions = ['.csv'] + list(EXTENSIONS)
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for file in sorted(files):
+                if os.path.splitext(file)[1].lower() in extensions:
+                    yield os.path.abspath(os.path.join(root, file))
+
+
+def procedure_name(filename):
+    """ Returns the name of the procedure class of a result file from its
+    header, without importing or constructing the procedure.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in EXTENSIONS:
+        header = EXTENSIONS[ext].read_header(filename)[0]
+    else:
+        header = ''
+        with open(filename, 'r') as f:
+            for line in f:
+                if not line.startswith(Results.COMMENT):
+                    break
+                header += line
+    search = re.search(r"<(?:[^>]+\.)?(?P<class>[^.>]+)>", header)
+    if search is None:
+        raise ValueError('%s has no procedure header.' % filename)
+    return search.group('class')
+
+
+def plot_fits(filename, x, y, fits, plotname):
+    """ Renders the trace with the fitted resonance centers as PNG. """
+    # Figures of the object-oriented API are not registered in pyplot, so
+    # nothing is kept alive between files
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(12, 4))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(x, y, '-k', lw=0.5)
+    centers = fits['center'].values
+    ax.plot(centers, np.interp(centers, x, y), 'vr', ms=4)
+    ax.set(xlabel='Wavelength [nm]', title=os.path.basename(filename))
+    os.makedirs(os.path.dirname(plotname), exist_ok=True)
+    fig.savefig(plotname, dpi=100)
+
+
+def analyse_file(filename, method='lmfit', snr=8., plotname=None):
+    """
+    Detects and fits all resonances of a transmission result file.
+
+    Parameters
+    ----------
+    filename : str
+        Result file.
+    method : str, optional
+        Fit method of :func:`fit_resonance`. The default is 'lmfit'.
+    snr : float, optional
+        Minimum prominence of the resonances in units of the noise level.
+        The default is 8.
+    plotname : str, optional
+        File name of the plot, None for no plot.
+
+    Returns
+    -------
+    pandas.DataFrame or None
+        The fits of all resonances with the file, procedure and FSR, or
+        None if the file does not hold a transmission trace.
+
+    """
+    name = procedure_name(filename)
+    if name not in TRACES:
+        return None
+    columns = TRACES[name]
+    data = load_columns(filename, columns).dropna()
+    x = np.asarray(data[columns[0]], dtype=np.float64)
+    y = np.asarray(data[columns[1]], dtype=np.float64)
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+
+    resonances = find_resonances(x, y, snr=snr)
+    fits = fit_resonances(x, y, resonances, processes=1, method=method)
+    try:
+        fsr = estimate_fsr(x, y, np.median(resonances['FWHM'])) \
+            if len(resonances) > 2 else np.nan
+    except ValueError:
+        fsr = np.nan
+
+    if plotname is not None:
+        plot_fits(filename, x, y, fits, plotname)
+
+    fits = fits.reset_index()
+    fits.insert(0, 'FSR', fsr)
+    fits.insert(0, 'procedure', name)
+    fits.insert(0, 'file', filename)
+    return fits
+
+
+def _analyse(filename, method, snr, plotname):
+    try:
+        return filename, analyse_file(filename, method, snr,
+                                      plotname), None
+    except Exception as e:
+        return filename, None, '%s: %s' % (type(e).__name__, e)
+
+
+class BatchAnalysis(object):
+    """ Analysis of all result files below directories into an output
+    directory, which holds the summary table and the list of analysed
+    files with their modification times.
+
+    :param output: Output directory.
+    :param method: Fit method, 'lmfit' or 'fast'.
+    :param snr: Minimum prominence of resonances in units of the noise.
+    :param plots: Whether plots are rendered into output/plots.
+    """
+
+    def __init__(self, output, method='lmfit', snr=8., plots=False):
+        self.output = os.path.abspath(output)
+        self.method = method
+        self.snr = snr
+        self.plot_directory = os.path.join(self.output, 'plots') \
+            if plots else None
+        os.makedirs(self.output, exist_ok=True)
+        self.summary = os.path.join(self.output, SUMMARY)
+        self.done_filename = os.path.join(self.output, DONE)
+
+    def done(self):
+        """ Returns the modification times of the analysed files by name.
+        """
+        done = {}
+        if os.path.exists(self.done_filename):
+            with open(self.done_filename) as f:
+                for line in f:
+                    mtime, _, filename = line.rstrip('\n').partition('\t')
+                    done[filename] = float(mtime)
+        return done
+
+    def record(self, filename, fits):
+        if fits is not None and len(fits) > 0:
+            fits.to_csv(self.summary, mode='a', index=False,
+                        header=not os.path.exists(self.summary))
+        with open(self.done_filename, 'a') as f:
+            f.write('%r\t%s\n' % (os.path.getmtime(filename), filename))
+
+    def run(self, directories, jobs=None, restart=False):
+        """ Analyses all new or modified files below the directories.
+
+        :param jobs: Number of processes, by default the number of CPUs.
+        :param restart: Whether files analysed before are analysed again.
+        :returns: The number of analysed files.
+        """
+        if restart:
+            for filename in [self.summary, self.done_filename]:
+                if os.path.exists(filename):
+                    os.remove(filename)
+        done = self.done()
+        files = [filename for filename in result_files(directories)
+                 if done.get(filename) != os.path.getmtime(filename) and
+                 not filename.startswith(self.output + os.sep)]
+        total = len(files)
+        log.info('%d files to analyse, %d done before' % (total, len(done)))
+
+        base = os.path.commonpath([os.path.abspath(directory)
+                                   for directory in directories])
+        jobs = jobs or os.cpu_count() or 1
+        start = time.time()
+        n = 0
+        pending = set()
+        queue = iter(files)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            while True:
+                # Only a few files per process are in flight at a time
+                while len(pending) < 2*jobs:
+                    filename = next(queue, None)
+                    if filename is None:
+                        break
+                    plotname = None
+                    if self.plot_directory is not None:
+                        plotname = os.path.join(
+                            self.plot_directory, os.path.splitext(
+                                os.path.relpath(filename, base))[0] + '.png')
+                    pending.add(executor.submit(
+                        _analyse, filename, self.method, self.snr,
+                        plotname))
+                if not pending:
+                    break
+                finished, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                for future in finished:
+                    filename, fits, error = future.result()
+                    n += 1
+                    elapsed = time.time() - start
+                    remaining = elapsed/n*(total - n)
+                    if error is not None:
+                        log.warning('[%d/%d] %s failed: %s' % (
+                            n, total, filename, error))
+                        continue
+                    self.record(filename, fits)
+                    log.info('[%d/%d] %s: %s, %d min left' % (
+                        n, total, filename,
+                        'skipped' if fits is None
+                        else '%d resonances' % len(fits),
+                        round(remaining/60)))
+        return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Detects and fits the resonances of all transmission '
+        'results below directories.')
+    parser.add_argument('directories', nargs='+')
+    parser.add_argument('--output', default='batch_analysis',
+                        help='Directory of the summary table and plots.')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Number of processes, by default all CPUs.')
+    parser.add_argument('--method', choices=['lmfit', 'fast'],
+                        default='lmfit', help='Fit method.')
+    parser.add_argument('--snr', type=float, default=8.,
+                        help='Minimum prominence of the resonances in units '
+                        'of the noise level.')
+    parser.add_argument('--plots', action='store_true',
+                        help='Render a plot of every file.')
+    parser.add_argument('--restart', action='store_true',
+                        help='Analyse files that were analysed before.')
+    args = parser.parse_args(argv)
+
+    batch = BatchAnalysis(args.output, args.method, args.snr, args.plots)
+    n = batch.run(args.directories, jobs=args.jobs, restart=args.restart)
+    print('Analysed %d files into %s' % (n, batch.summary))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    main()
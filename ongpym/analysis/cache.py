@@ -0,0 +1,208 @@
+"""
+Persistent cache of fit results keyed by a hash of the fitted data.
+
+Fitting the same data with the same options, e.g. when a run is analysed
+again with other plot settings, returns the stored result after a single
+lookup instead of fitting again.
+"""
+
+import os
+import logging
+import hashlib
+import tempfile
+import functools
+from functools import lru_cache
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+GB = 1024**3
+
+
+class FitCache(object):
+    """ Cache of fit results in a directory with one npz file per key.
+    When the cache exceeds `max_size`, the least recently used results are
+    deleted. Results are written atomically, so a cache can be shared by
+    several processes.
+
+    :param directory: Directory of the cache, created if necessary.
+    :param max_size: Maximum size of the cache in bytes.
+    """
+
+    EXTENSION = '.npz'
+    # Eviction removes results until the cache is below this fraction
+    LOW_WATER = 0.9
+
+    def __init__(self, directory, max_size=GB):
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+        self._size = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(*args, **kwargs):
+        """ Returns a hash of the arguments, of arrays by their content and
+        of all other values by their representation.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+
+        def update(value):
+            if hasattr(value, '__array__') and not np.isscalar(value):
+                value = np.ascontiguousarray(value)
+                digest.update(('%s%s' % (value.dtype.str,
+                                         value.shape)).encode())
+                digest.update(value.data)
+            else:
+                digest.update(repr(value).encode())
+
+        for value in args:
+            update(value)
+        for name, value in sorted(kwargs.items()):
+            digest.update(name.encode())
+            update(value)
+        return digest.hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+    def get(self, key):
+        """ Returns the arrays stored under `key` by name, or None. """
+        filename = self.filename(key)
+        try:
+            with np.load(filename) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        try:
+            # The modification time orders the results by their last use
+            os.utime(filename)
+        except OSError:
+            pass
+        return arrays
+
+    def put(self, key, **arrays):
+        """ Stores the arrays under `key`. """
+        handle, temporary = tempfile.mkstemp(suffix='.tmp',
+                                             dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(temporary, self.filename(key))
+        except Exception:
+            os.remove(temporary)
+            raise
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += os.path.getsize(self.filename(key))
+        if self._size > self.max_size:
+            self.evict()
+
+    def files(self):
+        """ Returns (filename, stat) of the cached results, least recently
+        used first.
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.EXTENSION):
+                try:
+                    files.append((entry.path, entry.stat()))
+                except OSError:
+                    continue
+        return sorted(files, key=lambda file: file[1].st_mtime)
+
+    def size(self):
+        return sum(stat.st_size for _, stat in self.files())
+
+    def evict(self):
+        """ Deletes the least recently used results until the cache is
+        below its size limit.
+        """
+        files = self.files()
+        size = sum(stat.st_size for _, stat in files)
+        for filename, stat in files:
+            if size <= self.LOW_WATER*self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+        self._size = size
+
+    def clear(self):
+        for filename, _ in self.files():
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+
+@lru_cache(maxsize=None)
+def default_fit_cache():
+    """ Returns the fit cache at PATH_FIT_CACHE of the configuration, by
+    default 'fit_cache' in PATH_TRASH, limited to FIT_CACHE_SIZE GB (1 GB
+    by default), or None if neither path is configured.
+    """
+    try:
+        from ..config import PATH_FIT_CACHE
+    except ImportError:
+        try:
+            from ..config import PATH_TRASH
+        except ImportError:
+            return None
+        PATH_FIT_CACHE = os.path.join(PATH_TRASH, 'fit_cache')
+    try:
+        from ..config import FIT_CACHE_SIZE
+    except ImportError:
+        FIT_CACHE_SIZE = 1
+    try:
+        return FitCache(PATH_FIT_CACHE, FIT_CACHE_SIZE*GB)
+    except OSError as e:
+        log.warning('Fit cache %s is not available: %s' % (PATH_FIT_CACHE,
+                                                           e))
+        return None
+
+
+def _pack(result):
+    if isinstance(result, dict):
+        return dict({'_kind': 'dict'}, **result)
+    return dict({'_kind': 'tuple'},
+                **{'_%d' % i: value for i, value in enumerate(result)})
+
+
+def _unpack(arrays):
+    kind = str(arrays.pop('_kind'))
+    if kind == 'dict':
+        return {name: value[()] if value.ndim == 0 else value
+                for name, value in arrays.items()}
+    return tuple(arrays['_%d' % i] for i in range(len(arrays)))
+
+
+def cached_fit(function):
+    """ Decorator that caches the results of a fit function in the
+    :func:`default_fit_cache`. The function has to return a dictionary or
+    a tuple of arrays or numbers; its arguments are hashed by content.
+    """
+    name = '%s.%s' % (function.__module__, function.__qualname__)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        cache = default_fit_cache()
+        if cache is None:
+            return function(*args, **kwargs)
+        key = cache.key(name, *args, **kwargs)
+        arrays = cache.get(key)
+        if arrays is not None:
+            return _unpack(arrays)
+        result = function(*args, **kwargs)
+        try:
+            cache.put(key, **_pack(result))
+        except OSError as e:
+            log.warning('Could not cache the fit: %s' % e)
+        return result
+
+    return wrapper
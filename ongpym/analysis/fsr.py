@@ -0,0 +1,227 @@
+"""
+Free spectral range and dispersion of a resonator from a whole widescan.
+
+The FSR is estimated from the periodicity of the trace by an FFT
+autocorrelation. It guides the detection of the resonance comb, whose
+centers are refined by vectorized parabola fits and numbered by mode.
+A polynomial of the resonance frequencies over the mode number then gives
+FSR(lambda), the group index and the dispersion D2 at every resonance,
+without any per-peak nonlinear fit.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks
+
+from .resonances import find_resonances
+
+SPEED_OF_LIGHT = 299792458.
+# Relative height of the autocorrelation maximum at the FSR
+HARMONIC = 0.5
+# Width of the smoothing of the autocorrelation in samples
+SMOOTHING = 4
+
+
+def uniform(x, y):
+    """
+    Returns the trace on an equidistant grid of the same number of
+    samples, interpolated if the x values are not equidistant.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    grid = np.linspace(x[0], x[-1], len(x))
+    if np.allclose(x, grid, rtol=0, atol=1e-3*abs(grid[1] - grid[0])):
+        return grid, y
+    return grid, np.interp(grid, x, y)
+
+
+def estimate_fsr(x, y, width=None):
+    """
+    Estimates the FSR from the periodicity of a transmission trace.
+
+    The resonances are equidistant in frequency rather than in wavelength,
+    so the trace is resampled equidistantly in 1/x. The autocorrelation of
+    its derivative, which is free of the baseline, is computed by FFT and
+    smoothed. The first of its strongest maxima beyond the zero crossing
+    and twice the width of the resonances is the mean distance of
+    neighbouring resonances.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Ascending wavelength of the trace.
+    y : numpy.ndarray
+        Transmission of the trace.
+    width : float, optional
+        Typical FWHM of the resonances in units of `x`. The default is the
+        median FWHM of the resonances found by :func:`find_resonances`.
+
+    Returns
+    -------
+    float
+        The FSR in units of `x` at the middle of the trace.
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if width is None:
+        resonances = find_resonances(x, y)
+        if len(resonances) == 0:
+            raise ValueError('The trace has no resonances.')
+        width = np.median(resonances['FWHM'])
+    inverse = np.linspace(1/x[-1], 1/x[0], len(x))
+    step = inverse[1] - inverse[0]
+    d = np.diff(np.interp(1/inverse, x, y))
+    d = d - d.mean()
+    n = len(d)
+    power = np.abs(np.fft.rfft(d, 2*n))**2
+    # Gaussian smoothing over a few samples, which removes the correlation
+    # of the noise of neighbouring samples
+    frequency = np.fft.rfftfreq(2*n)
+    power *= np.exp(-2*(np.pi*SMOOTHING*frequency)**2)
+    correlation = np.fft.irfft(power, 2*n)[:n//2]
+
+    negative = np.flatnonzero(correlation < 0)
+    if len(negative) == 0:
+        raise ValueError('The trace is not periodic.')
+    middle = (x[0] + x[-1])/2
+    # The correlation of every resonance with itself is skipped
+    first = max(negative[0], int(2*width/middle**2/step))
+    peaks, _ = find_peaks(correlation[first:])
+    if len(peaks) == 0:
+        raise ValueError('The trace is not periodic.')
+    # Multiples of the FSR correlate almost as strongly, so the first
+    # maximum of at least half the strongest one is taken
+    heights = correlation[first:][peaks]
+    lag = first + peaks[np.argmax(heights >= HARMONIC*heights.max())]
+
+    # Parabolic interpolation of the maximum
+    a, b, c = correlation[lag - 1:lag + 2]
+    offset = 0.5*(a - c)/(a - 2*b + c) if a - 2*b + c < 0 else 0.
+    return (lag + offset)*step*middle**2
+
+
+def refine_centers(x, y, peaks, half_width):
+    """
+    Refines the centers of dips by least-squares parabolas through
+    2*`half_width`+1 samples around every minimum, all at once.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Equidistant x values.
+    y : numpy.ndarray
+        Transmission.
+    peaks : numpy.ndarray
+        Sample indices of the minima.
+    half_width : int
+        Number of samples on either side of the minima.
+
+    Returns
+    -------
+    numpy.ndarray
+        The refined centers in units of `x`.
+
+    """
+    half_width = max(int(half_width), 1)
+    offsets = np.arange(-half_width, half_width + 1)
+    indices = np.clip(peaks[:, None] + offsets, 0, len(y) - 1)
+    # The same design matrix for every dip on an equidistant grid
+    design = np.stack([offsets**2, offsets, np.ones_like(offsets)], axis=1)
+    a, b, _ = np.linalg.pinv(design) @ y[indices].T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vertex = np.where(a > 0, -b/(2*a), 0.)
+    vertex = np.clip(vertex, -half_width, half_width)
+    return x[peaks] + vertex*(x[1] - x[0])
+
+
+def resonance_comb(x, y, fsr=None, snr=8.):
+    """
+    Detects the resonances of the dominant mode family and numbers them.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Ascending wavelength of the trace.
+    y : numpy.ndarray
+        Transmission of the trace.
+    fsr : float, optional
+        Approximate FSR. The default is the one of :func:`estimate_fsr`.
+    snr : float, optional
+        Minimum prominence of the resonances in units of the noise level.
+        The default is 8.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The 'mode' number, increasing with the wavelength and counting
+        resonances that were not detected, and the refined 'center' of
+        every resonance.
+
+    """
+    x, y = uniform(x, y)
+    dx = x[1] - x[0]
+    if fsr is None:
+        fsr = estimate_fsr(x, y)
+
+    resonances = find_resonances(x, y, snr=snr, distance=0.5*fsr/dx)
+    peaks = resonances['index'].values
+    half_width = np.median(resonances['FWHM'])/(2*dx) if len(peaks) else 1
+    centers = refine_centers(x, y, peaks, round(half_width))
+
+    # The FSR scales with the square of the wavelength
+    middle = (centers[1:] + centers[:-1])/2
+    local = fsr*(middle/np.median(centers))**2
+    steps = np.maximum(np.round(np.diff(centers)/local), 1).astype(int)
+    modes = np.concatenate([[0], np.cumsum(steps)])
+
+    return pd.DataFrame({'mode': modes, 'center': centers})
+
+
+def dispersion(comb, length=None, degree=3):
+    """
+    FSR, group index and dispersion at every resonance of a comb.
+
+    The resonance frequencies are fitted by a polynomial of the relative
+    mode number mu, increasing with the frequency and zero at the middle
+    of the comb, whose derivatives give D1/2pi and D2/2pi.
+
+    Parameters
+    ----------
+    comb : pandas.DataFrame
+        Resonance comb as returned by :func:`resonance_comb`, centers in
+        nm.
+    length : float, optional
+        Round-trip length of the resonator in m, to compute the group
+        index. The default is None.
+    degree : int, optional
+        Degree of the polynomial. The default is 3.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Per resonance the relative mode number 'mu', the 'center' in nm,
+        the 'FSR' in nm, 'D1' and 'D2' in Hz (both divided by 2pi), the
+        integrated dispersion 'Dint' in Hz and, with `length`, the
+        'group_index'.
+
+    """
+    modes = np.asarray(comb['mode'])
+    centers = np.asarray(comb['center'], dtype=np.float64)
+    frequency = SPEED_OF_LIGHT/(centers*1e-9)
+    mu = modes[len(modes)//2] - modes
+
+    polynomial = np.polynomial.Polynomial.fit(mu, frequency, degree)
+    D1 = polynomial.deriv(1)(mu)
+    D2 = polynomial.deriv(2)(mu)
+    Dint = frequency - polynomial(0) - polynomial.deriv(1)(0)*mu
+
+    table = pd.DataFrame({'mu': mu,
+                          'center': centers,
+                          'FSR': (centers*1e-9)**2*D1/SPEED_OF_LIGHT*1e9,
+                          'D1': D1,
+                          'D2': D2,
+                          'Dint': Dint})
+    if length is not None:
+        table['group_index'] = SPEED_OF_LIGHT/(D1*length)
+    return table
@@ -0,0 +1,194 @@
+"""
+Wavelength linearization of laser scans from a reference channel.
+
+The wavelength of a swept laser is only nominally linear in time. A
+reference channel recorded alongside the transmission corrects it:
+
+* A reference etalon gives fringes at equidistant frequencies. The scan is
+  mapped piecewise linearly between the fringes, anchored at the nominal
+  start and stop wavelengths.
+* A trigger or marker signal gives the time at which the scan starts,
+  from which the scan proceeds with its nominal speed.
+
+Etalon corrections are cached per scan configuration, so later scans with
+the same start, stop and speed reuse them. Trigger and marker corrections
+depend on the timing of every single scan and are never cached.
+"""
+
+import logging
+
+import numpy as np
+
+from .cache import default_fit_cache
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+SPEED_OF_LIGHT = 299792458.
+# Hysteresis of the edge detection relative to the amplitude
+HYSTERESIS = 0.25
+# Minimum number of rising edges that are taken as etalon fringes
+MIN_FRINGES = 10
+
+
+class WavelengthCorrection(object):
+    """ Piecewise linear map from the time of a scan to the wavelength,
+    extrapolated linearly beyond the first and last knot.
+
+    :param time: Ascending times of the knots in s.
+    :param wavelength: Wavelengths at the knots in nm.
+    """
+
+    def __init__(self, time, wavelength):
+        self.time = np.asarray(time, dtype=np.float64)
+        self.wavelength = np.asarray(wavelength, dtype=np.float64)
+
+    @classmethod
+    def nominal(cls, wl_start, wl_stop, speed, start=0.):
+        """ Returns the nominal scan that starts at `start`. """
+        return cls([start, start + (wl_stop - wl_start)/speed],
+                   [wl_start, wl_stop])
+
+    def __call__(self, t):
+        t = np.asarray(t, dtype=np.float64)
+        wavelength = np.interp(t, self.time, self.wavelength)
+        slopes = np.diff(self.wavelength)/np.diff(self.time)
+        before = t < self.time[0]
+        after = t > self.time[-1]
+        wavelength[before] = self.wavelength[0] + \
+            slopes[0]*(t[before] - self.time[0])
+        wavelength[after] = self.wavelength[-1] + \
+            slopes[-1]*(t[after] - self.time[-1])
+        return wavelength
+
+    def __repr__(self):
+        return 'WavelengthCorrection(%d knots, %g-%g nm)' % (
+            len(self.time), self.wavelength[0], self.wavelength[-1])
+
+
+def rising_edges(signal, hysteresis=HYSTERESIS):
+    """
+    Finds the rising edges of a signal with hysteresis, vectorized.
+
+    Parameters
+    ----------
+    signal : numpy.ndarray
+        Reference or trigger signal.
+    hysteresis : float, optional
+        Half width of the hysteresis band around the middle level relative
+        to the amplitude of the signal.
+
+    Returns
+    -------
+    numpy.ndarray
+        Fractional sample positions of the crossings of the middle level.
+
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    low, high = np.percentile(signal, [1, 99])
+    r = signal - (low + high)/2
+    h = hysteresis*(high - low)
+    state = np.where(r > h, 1, np.where(r < -h, -1, 0))
+    defined = np.flatnonzero(state)
+    if len(defined) == 0 or high - low <= 0:
+        return np.zeros(0)
+    rising = np.flatnonzero(np.diff(state[defined]) == 2)
+    i0 = defined[rising]
+    i1 = defined[rising + 1]
+    # Linear interpolation of the crossing between the last sample below
+    # and the first sample above the band
+    return i0 + (i1 - i0)*(-r[i0])/(r[i1] - r[i0])
+
+
+def wavelength_correction(t, reference, wl_start, wl_stop, speed,
+                          etalon_fsr=None):
+    """
+    Builds the wavelength correction of a scan from its reference channel.
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        Equidistant time of the samples in s, zero at the trigger.
+    reference : numpy.ndarray
+        Reference channel, fringes of an etalon or a trigger signal.
+    wl_start : float
+        Start wavelength of the scan in nm.
+    wl_stop : float
+        Stop wavelength of the scan in nm.
+    speed : float
+        Nominal speed of the scan in nm/s.
+    etalon_fsr : float, optional
+        FSR of the etalon in Hz. The default is the FSR for which the
+        fringes span the nominal scan.
+
+    Returns
+    -------
+    WavelengthCorrection
+        The correction of the scan.
+
+    """
+    t = np.asarray(t, dtype=np.float64)
+    dt = t[1] - t[0]
+    edges = t[0] + rising_edges(reference)*dt
+    duration = (wl_stop - wl_start)/speed
+
+    if len(edges) < MIN_FRINGES:
+        if len(edges) == 0:
+            log.info('No edges in the reference, using the nominal scan.')
+            return WavelengthCorrection.nominal(wl_start, wl_stop, speed)
+        log.info('Scan starts at the marker at %g s.' % edges[0])
+        return WavelengthCorrection.nominal(wl_start, wl_stop, speed,
+                                            edges[0])
+
+    # Fractional fringe numbers at the nominal start and stop of the scan
+    fringes = np.arange(len(edges))
+    slopes = np.diff(fringes)/np.diff(edges)
+    k_start, k_stop = np.interp([0., duration], edges, fringes)
+    k_start += slopes[0]*min(0. - edges[0], 0.)
+    k_stop += slopes[-1]*max(duration - edges[-1], 0.)
+
+    nu_start = SPEED_OF_LIGHT/(wl_start*1e-9)
+    if etalon_fsr is None:
+        nu_stop = SPEED_OF_LIGHT/(wl_stop*1e-9)
+        etalon_fsr = (nu_start - nu_stop)/(k_stop - k_start)
+    frequency = nu_start - (fringes - k_start)*etalon_fsr
+    log.info('Linearized the scan with %d fringes of %.4g GHz.' % (
+        len(edges), etalon_fsr*1e-9))
+    return WavelengthCorrection(edges, SPEED_OF_LIGHT/frequency*1e9)
+
+
+def cached_wavelength_correction(t, reference, wl_start, wl_stop, speed,
+                                 etalon_fsr=None, refresh=False):
+    """
+    Same as :func:`wavelength_correction`, but an etalon correction is
+    taken from the :func:`default_fit_cache` if one was stored for the
+    same scan configuration, i.e. start and stop wavelength, speed and
+    etalon. Scans whose reference has fewer than MIN_FRINGES edges, i.e. a
+    trigger, a marker or a missing or misleveled reference, are corrected
+    on their own and never cached.
+
+    Parameters
+    ----------
+    refresh : bool, optional
+        Whether the correction is computed again and replaces the cached
+        one. The default is False.
+
+    """
+    cache = default_fit_cache()
+    # Trigger and marker corrections are computed for every scan
+    if cache is None or len(rising_edges(reference)) < MIN_FRINGES:
+        return wavelength_correction(t, reference, wl_start, wl_stop, speed,
+                                     etalon_fsr)
+    key = cache.key('wavelength_correction', float(wl_start),
+                    float(wl_stop), float(speed), etalon_fsr)
+    arrays = None if refresh else cache.get(key)
+    if arrays is not None:
+        return WavelengthCorrection(arrays['time'], arrays['wavelength'])
+    correction = wavelength_correction(t, reference, wl_start, wl_stop,
+                                       speed, etalon_fsr)
+    try:
+        cache.put(key, time=correction.time,
+                  wavelength=correction.wavelength)
+    except OSError as e:
+        log.warning('Could not cache the wavelength correction: %s' % e)
+    return correction
@@ -0,0 +1,158 @@
+"""
+Fast closed-form fitting of Lorentzian dips on a linear baseline.
+
+A single Lorentzian dip d(x) = D/(1 + ((x - c)/g)^2) below a baseline has
+a reciprocal that is a quadratic polynomial in x,
+
+    1/d(x) = ((x - c)^2 + g^2)/(D g^2),
+
+so after subtracting a baseline estimated from the edges of the window,
+center, width and depth follow from a weighted linear least-squares fit
+of a parabola, without iterations. Optional Gauss-Newton steps of the
+full model then refine all dips and the baseline jointly.
+"""
+
+import numpy as np
+
+# Fraction of the window on either side that estimates the baseline
+EDGE = 0.1
+# Fraction of the depth above which samples belong to the core of a dip
+CORE = 0.25
+
+
+def lorentzian_curve(x, fit):
+    """
+    Evaluates fitted dips on their baseline.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        x values.
+    fit : dict
+        Fit as returned by :func:`fit_lorentzians`.
+
+    Returns
+    -------
+    numpy.ndarray
+        The model at `x`.
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = fit['intercept'] + fit['slope']*x
+    for center, fwhm, depth in zip(fit['center'], fit['FWHM'],
+                                   fit['depth']):
+        y = y - depth/(1 + (2*(x - center)/fwhm)**2)
+    return y
+
+
+def _model(t, p, n):
+    """ Returns the model and its Jacobian at normalized x values `t` for
+    the parameters p = [b0, b1, D_1, c_1, g_1, ..., D_n, c_n, g_n].
+    """
+    f = p[0] + p[1]*t
+    jacobian = np.empty((len(t), 2 + 3*n))
+    jacobian[:, 0] = 1
+    jacobian[:, 1] = t
+    for k in range(n):
+        depth, center, width = p[2 + 3*k:5 + 3*k]
+        u = (t - center)/width
+        lorentz = 1/(1 + u**2)
+        f = f - depth*lorentz
+        jacobian[:, 2 + 3*k] = -lorentz
+        jacobian[:, 3 + 3*k] = -2*depth*u*lorentz**2/width
+        jacobian[:, 4 + 3*k] = -2*depth*u**2*lorentz**2/width
+    return f, jacobian
+
+
+def _algebraic(t, d, center):
+    """ Estimates depth, center and half width of a single dip from its
+    depth profile `d` below the baseline. `center` is the fallback center.
+    """
+    # Only the core of the dip, the tails are dominated by noise
+    valid = d > CORE*d.max() if len(d) else d > 0
+    t, d = t[valid], d[valid]
+    if len(t) >= 3:
+        # d*(1 - d*q(t)) = 0 is linear in the coefficients of q
+        a = d[:, None]**2*np.stack([np.ones_like(t), t, t**2], axis=1)
+        p0, p1, p2 = np.linalg.lstsq(a, d, rcond=None)[0]
+        if p2 > 0:
+            center = -p1/(2*p2)
+            width2 = p0/p2 - center**2
+            if width2 > 0:
+                return 1/(p2*width2), center, np.sqrt(width2)
+    # Not a dip shape, estimate the width at half depth instead
+    depth = d.max() if len(d) else 0.
+    width = np.count_nonzero(d > depth/2)*np.median(np.diff(t)) / 2 \
+        if len(t) > 1 else 1.
+    return depth, center, max(width, 1e-12)
+
+
+def fit_lorentzians(x, y, centers=None, refine=1):
+    """
+    Fits one or more Lorentzian dips on a common linear baseline.
+
+    Every dip is first estimated algebraically in its share of the window,
+    split at the middle between neighbouring dips, and then all
+    parameters are refined jointly by `refine` Gauss-Newton steps.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        x values of the window, e.g. the wavelength.
+    y : numpy.ndarray
+        Transmission in the window.
+    centers : array_like, optional
+        Approximate centers of the dips. The default is a single dip at the
+        minimum of `y`.
+    refine : int, optional
+        Number of Gauss-Newton steps. The default is 1; with 0 the
+        algebraic estimate is returned.
+
+    Returns
+    -------
+    dict
+        Arrays of the 'center', 'FWHM' and 'depth' of the dips and the
+        'slope' and 'intercept' of the baseline.
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if centers is None:
+        centers = [x[np.argmin(y)]]
+    centers = np.sort(np.atleast_1d(np.asarray(centers, dtype=np.float64)))
+
+    # Normalized x values keep the polynomial fits well conditioned
+    x0 = (x[0] + x[-1])/2
+    scale = (x[-1] - x[0])/2 or 1.
+    t = (x - x0)/scale
+    guesses = (centers - x0)/scale
+
+    edge = max(int(EDGE*len(t)), 1)
+    t_edges = np.concatenate([t[:edge], t[-edge:]])
+    y_edges = np.concatenate([y[:edge], y[-edge:]])
+    b1, b0 = np.polyfit(t_edges, y_edges, 1)
+    d = b0 + b1*t - y
+
+    bounds = np.concatenate([[-np.inf], (guesses[1:] + guesses[:-1])/2,
+                             [np.inf]])
+    p = [b0, b1]
+    for k, guess in enumerate(guesses):
+        share = (t >= bounds[k]) & (t < bounds[k+1])
+        p += list(_algebraic(t[share], d[share], guess))
+    p = np.array(p)
+
+    n = len(guesses)
+    for _ in range(refine):
+        f, jacobian = _model(t, p, n)
+        step = np.linalg.lstsq(jacobian, y - f, rcond=None)[0]
+        refined = p + step
+        if not np.all(np.isfinite(refined)) or \
+                np.any(refined[4::3] <= 0):
+            break
+        p = refined
+
+    return {'center': p[3::3]*scale + x0,
+            'FWHM': 2*p[4::3]*scale,
+            'depth': p[2::3],
+            'slope': p[1]/scale,
+            'intercept': p[0] - p[1]*x0/scale}
@@ -0,0 +1,250 @@
+"""
+Detection and fitting of all resonances of a transmission trace.
+
+Dips are detected in the whole trace by their prominence above the noise,
+a fit window is sized for every dip from its estimated width and its
+neighbours, and every window is fitted with a Lorentzian on a linear
+baseline, independently and in parallel processes.
+"""
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks
+from lmfit.models import LinearModel, LorentzianModel
+
+from .lorentzian import fit_lorentzians
+from .cache import cached_fit
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+RESULT_COLUMNS = ['center', 'Q', 'FWHM', 'extinction', 'depth', 'success']
+
+# Fitting fewer resonances is faster than starting processes
+MIN_PARALLEL = 16
+
+
+def noise_level(y):
+    """
+    Robust estimate of the standard deviation of the noise of a trace from
+    the median absolute difference of neighbouring samples, which is
+    insensitive to the resonances and slow drifts of the baseline.
+
+    Parameters
+    ----------
+    y : numpy.ndarray
+        The trace.
+
+    Returns
+    -------
+    float
+        Standard deviation of the noise.
+
+    """
+    return np.median(np.abs(np.diff(y)))/(0.6745*np.sqrt(2))
+
+
+def find_resonances(x, y, prominence=None, snr=8., min_width=2,
+                    window=5., distance=None):
+    """
+    Detects all dips of a transmission trace whose prominence exceeds the
+    noise and sizes a fit window for each of them.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Ascending x values of the trace, e.g. the wavelength.
+    y : numpy.ndarray
+        Transmission of the trace.
+    prominence : float, optional
+        Minimum prominence of a dip. The default is `snr` times the noise
+        level of the trace.
+    snr : float, optional
+        Minimum prominence in units of the noise level. The default is 8.
+    min_width : float, optional
+        Minimum full width at half prominence in samples. The default
+        is 2.
+    window : float, optional
+        Half width of the fit windows in units of the estimated FWHM. The
+        windows are limited to half the distance to the neighbouring dips.
+        The default is 5.
+    distance : float, optional
+        Minimum distance between dips in samples, e.g. a fraction of the
+        FSR to only detect one family of resonances. The default is None.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per dip with the sample 'index', the x value 'center',
+        the estimated 'FWHM' in units of x, the 'prominence' and the
+        'start' and 'stop' samples of the fit window.
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if prominence is None:
+        prominence = snr*noise_level(y)
+
+    peaks, properties = find_peaks(-y, prominence=prominence,
+                                   width=min_width, rel_height=0.5,
+                                   distance=distance)
+    samples = np.arange(len(x))
+    left = np.interp(properties['left_ips'], samples, x)
+    right = np.interp(properties['right_ips'], samples, x)
+    widths = properties['widths']
+
+    # Windows of `window` FWHM on either side, up to the middle between
+    # neighbouring dips
+    half = np.maximum(window*widths, min_width).astype(np.int64)
+    bounds = np.concatenate([[0], (peaks[1:] + peaks[:-1])//2,
+                             [len(x)]])
+    start = np.maximum(peaks - half, bounds[:-1])
+    stop = np.minimum(peaks + half + 1, bounds[1:])
+
+    return pd.DataFrame({'index': peaks,
+                         'center': x[peaks],
+                         'FWHM': right - left,
+                         'prominence': properties['prominences'],
+                         'start': start,
+                         'stop': stop})
+
+
+def _resonance(center, fwhm, depth, baseline, success):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        extinction = 10*np.log10(baseline/(baseline - depth))
+    return {'center': center,
+            'Q': center/fwhm,
+            'FWHM': fwhm,
+            'extinction': extinction,
+            'depth': depth,
+            'success': success}
+
+
+@cached_fit
+def fit_resonance(x, y, center=None, fwhm=None, method='lmfit'):
+    """
+    Fits a single dip with a Lorentzian on a linear baseline.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        x values of the fit window.
+    y : numpy.ndarray
+        Transmission in the fit window.
+    center : float, optional
+        Initial center. The default is the x value of the minimum.
+    fwhm : float, optional
+        Initial FWHM. The default is a tenth of the window.
+    method : str, optional
+        'lmfit' for a least-squares fit, 'fast' for the closed-form
+        estimate of :func:`fit_lorentzians`. The default is 'lmfit'.
+
+    Returns
+    -------
+    dict
+        'center', 'Q', 'FWHM', the 'extinction' in dB, the 'depth' of the
+        dip and whether the fit converged as 'success'. All values are NaN
+        if the fit failed. Results are cached by :func:`cached_fit`.
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if center is None:
+        center = x[np.argmin(y)]
+    if method == 'fast':
+        fit = fit_lorentzians(x, y, [center])
+        lam, FWHM, depth = fit['center'][0], fit['FWHM'][0], fit['depth'][0]
+        return _resonance(lam, FWHM, depth,
+                          fit['slope']*lam + fit['intercept'],
+                          bool(np.isfinite(lam) and FWHM > 0))
+    if fwhm is None or not fwhm > 0:
+        fwhm = (x[-1] - x[0])/10
+
+    # The baseline is guessed from the edges of the window
+    edge = max(len(x)//10, 1)
+    x_edges = np.concatenate([x[:edge], x[-edge:]])
+    y_edges = np.concatenate([y[:edge], y[-edge:]])
+    slope, intercept = np.polyfit(x_edges, y_edges, 1)
+    depth = slope*center + intercept - y.min()
+
+    lor_mod = LorentzianModel(prefix='lor_')
+    line_mod = LinearModel(prefix='line_')
+    mod = lor_mod + line_mod
+    pars = lor_mod.make_params(center=center, sigma=fwhm/2,
+                               amplitude=-depth*np.pi*fwhm/2)
+    pars += line_mod.make_params(slope=slope, intercept=intercept)
+    pars['lor_sigma'].set(min=0)
+
+    try:
+        out = mod.fit(y, pars, x=x)
+    except Exception as e:
+        log.info('Fit at %g failed: %s' % (center, e))
+        return dict(dict.fromkeys(RESULT_COLUMNS[:-1], np.nan),
+                    success=False)
+
+    values = out.best_values
+    lam = values['lor_center']
+    FWHM = 2*values['lor_sigma']
+    depth = -values['lor_amplitude']/(np.pi*values['lor_sigma'])
+    baseline = values['line_slope']*lam + values['line_intercept']
+    return _resonance(lam, FWHM, depth, baseline, bool(out.success))
+
+
+def _fit_window(window):
+    return fit_resonance(*window)
+
+
+def fit_resonances(x, y, resonances=None, processes=None, method='lmfit',
+                   **kwargs):
+    """
+    Fits all resonances of a trace, each in its own window, in a pool of
+    processes.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        Ascending x values of the trace, e.g. the wavelength.
+    y : numpy.ndarray
+        Transmission of the trace.
+    resonances : pandas.DataFrame, optional
+        Resonances as returned by :func:`find_resonances`. By default they
+        are detected with the keyword arguments.
+    processes : int, optional
+        Number of processes. The default is the number of CPUs; with 1 or
+        few resonances the fits run in the calling process.
+    method : str, optional
+        Fit method of :func:`fit_resonance`. The default is 'lmfit'.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The 'center', 'Q', 'FWHM', 'extinction' in dB, 'depth' and
+        'success' of every fit, indexed by the sample index of the dip.
+
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if resonances is None:
+        resonances = find_resonances(x, y, **kwargs)
+
+    windows = [(x[start:stop], y[start:stop], center, fwhm, method)
+               for start, stop, center, fwhm in zip(
+                   resonances['start'], resonances['stop'],
+                   resonances['center'], resonances['FWHM'])]
+    log.info('Fitting %d resonances' % len(windows))
+
+    if processes == 1 or len(windows) < MIN_PARALLEL:
+        results = [_fit_window(window) for window in windows]
+    else:
+        workers = processes or os.cpu_count() or 1
+        chunksize = max(len(windows)//(4*workers), 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_fit_window, windows,
+                                        chunksize=chunksize))
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS,
+                        index=pd.Index(resonances['index'], name='index'))
@@ -0,0 +1,4 @@
+from .windows import ManagedResultsWindow
+from .curves import DecimatedResultsCurve
+from .decimation import minmax_decimate
+from .rendering import PlotRenderer, render_plot
@@ -0,0 +1,83 @@
+import logging
+
+import numpy as np
+
+from pymeasure.display.curves import ResultsCurve
+
+from .decimation import minmax_decimate, view_slice
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class DecimatedResultsCurve(ResultsCurve):
+    """ :class:`ResultsCurve` that keeps the full data of its results but
+    only draws a min/max decimated view of about two samples per pixel of
+    the plot width. Whenever the x range of the view changes, e.g. when
+    zooming in, the visible part of the data is decimated again, so zoomed
+    views show the full resolution. Clipping to the view requires ascending
+    x values, otherwise the whole trace is decimated. Error bars are not
+    supported.
+    """
+
+    DEFAULT_WIDTH = 1000
+
+    def __init__(self, results, x, y, **kwargs):
+        super(DecimatedResultsCurve, self).__init__(results, x, y, **kwargs)
+        self._x_data = np.zeros(0)
+        self._y_data = np.zeros(0)
+        self._columns = (None, None)
+        self._ascending = True
+        self._checked = 0
+        self._decimating = False
+
+    def update(self):
+        """Updates the data by polling the results"""
+        if self.force_reload:
+            self.results.reload()
+        data = self.results.data  # get the current snapshot
+
+        x = np.asarray(data[self.x])
+        if (self.x, self.y) == self._columns and \
+                len(x) == len(self._x_data) and not self.force_reload:
+            # Nothing new to draw, the view is redrawn on range changes
+            return
+        if self.x != self._columns[0] or len(x) < self._checked:
+            self._ascending = True
+            self._checked = 0
+        if self._ascending and len(x) > self._checked:
+            # Only the new rows have to be checked for the order
+            self._ascending = bool(np.all(
+                np.diff(x[max(self._checked-1, 0):]) >= 0))
+            self._checked = len(x)
+
+        self._columns = (self.x, self.y)
+        self._x_data = x
+        self._y_data = np.asarray(data[self.y])
+        self.decimate()
+
+    def decimate(self):
+        """ Sets the decimated visible part of the data as plot data. """
+        if self._decimating:
+            return
+        self._decimating = True
+        try:
+            x, y = self._x_data, self._y_data
+            view = self.getViewBox()
+            width = self.DEFAULT_WIDTH
+            if view is not None:
+                width = max(int(view.width()), 1) or width
+                if self._ascending and len(x) > 0 and \
+                        not view.autoRangeEnabled()[0]:
+                    x_min, x_max = view.viewRange()[0]
+                    visible = view_slice(x, x_min, x_max)
+                    x, y = x[visible], y[visible]
+            self.setData(*minmax_decimate(x, y, width))
+        finally:
+            self._decimating = False
+
+    def viewRangeChanged(self, vb=None, ranges=None, changed=None):
+        super(DecimatedResultsCurve, self).viewRangeChanged(vb, ranges,
+                                                            changed)
+        if changed is None or changed[0]:
+            self.decimate()
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+def minmax_decimate(x, y, n_bins):
+    """
+    Min/max decimation of a trace for plotting. The trace is divided into
+    `n_bins` bins of consecutive samples and of every bin only the samples
+    with the minimum and the maximum value are kept, in their original
+    order. Drawn as a line, the decimated trace covers the same vertical
+    extent per bin as the full trace, so peaks and noise bands stay
+    visible.
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        x values of the trace.
+    y : numpy.ndarray
+        y values of the trace.
+    n_bins : int
+        Number of bins, typically the width of the plot in pixels.
+
+    Returns
+    -------
+    x, y : numpy.ndarray
+        The decimated trace of at most 2*(`n_bins`+1) samples. Traces that
+        are not longer than that are returned unchanged.
+
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n_bins = max(int(n_bins), 1)
+    if len(y) <= 2*(n_bins+1):
+        return x, y
+
+    bin_size = len(y)//n_bins
+    n = bin_size*n_bins
+    bins = y[:n].reshape(n_bins, bin_size)
+    first = np.arange(n_bins)*bin_size
+    indices = [np.sort(np.stack([bins.argmin(axis=1), bins.argmax(axis=1)],
+                                axis=1), axis=1) + first[:, None]]
+    if n < len(y):
+        rest = y[n:]
+        indices.append(np.sort([rest.argmin(), rest.argmax()]) + n)
+    indices = np.concatenate([np.ravel(i) for i in indices])
+    return x[indices], y[indices]
+
+
+def view_slice(x, x_min, x_max):
+    """
+    Returns the slice of the ascending values `x` that covers the interval
+    [`x_min`, `x_max`], including one sample beyond either end so that
+    lines are drawn up to the borders of the view.
+    """
+    start = max(np.searchsorted(x, x_min, side='left') - 1, 0)
+    stop = min(np.searchsorted(x, x_max, side='right') + 1, len(x))
+    return slice(start, stop)
@@ -0,0 +1,197 @@
+""" Rendering of plots to image files in a background process.
+
+Procedures queue the arrays and a description of the plot and continue
+with the next measurement, while a worker process draws and saves the
+plot with the Agg backend. Nothing is drawn in the process of the
+interface, so no figures accumulate there, and the memory of the queue is
+bounded: traces are decimated to at most MAX_POINTS samples and at most
+MAX_PENDING plots wait. Further plots wait up to PUT_TIMEOUT seconds for
+a free place and are otherwise rendered by the caller, so no plot is
+ever lost.
+
+    render_plot('run_PLOT.png', [{'x': x, 'y': y, 'fmt': '.k'}],
+                xlabel='Wavelength [nm]', ylabel='Voltage [V]')
+"""
+
+import sys
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing
+from functools import lru_cache
+
+import numpy as np
+
+from .decimation import minmax_decimate
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Maximum number of plots waiting to be rendered
+MAX_PENDING = 8
+# Maximum number of samples per line
+MAX_POINTS = 20000
+# Time in seconds a plot waits for a free place in the queue
+PUT_TIMEOUT = 10
+
+
+def render(filename, lines, xlabel=None, ylabel=None, title=None,
+           legend=False, dpi=100):
+    """
+    Draws lines into a new figure and saves it.
+
+    Parameters
+    ----------
+    filename : str
+        File name of the image, whose extension gives the format.
+    lines : list of dict
+        Lines with the values 'x' and 'y', optionally the format string
+        'fmt' and further keyword arguments of `Axes.plot`, e.g. 'label'.
+    xlabel : str, optional
+        Label of the x axis.
+    ylabel : str, optional
+        Label of the y axis.
+    title : str, optional
+        Title of the plot.
+    legend : bool, optional
+        Whether a legend of the labelled lines is drawn. The default is
+        False.
+    dpi : int, optional
+        Resolution of the image. The default is 100.
+
+    """
+    # Figures of the object-oriented API are not registered in pyplot and
+    # are freed as soon as they are saved
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for line in lines:
+        line = dict(line)
+        x, y = line.pop('x'), line.pop('y')
+        fmt = line.pop('fmt', '-')
+        ax.plot(x, y, fmt, **line)
+    ax.set(xlabel=xlabel, ylabel=ylabel, title=title)
+    if legend:
+        ax.legend()
+    fig.savefig(filename, dpi=dpi)
+
+
+def _render_loop(jobs):
+    """ Renders the plots of the queue until it yields None. """
+    # Errors of the worker are reported on its stderr
+    log.addHandler(logging.StreamHandler(sys.stderr))
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        try:
+            render(**job)
+        except Exception:
+            log.exception('Rendering of %s failed.' % job['filename'])
+
+
+class PlotRenderer(object):
+    """ Queue of plots that are rendered by a worker process. The worker
+    is started with the first plot and again if it died.
+
+    :param max_pending: Maximum number of plots waiting to be rendered.
+    :param max_points: Maximum number of samples per line, longer lines
+                       are min/max decimated.
+    :param put_timeout: Time in seconds a plot waits for a free place in
+                        the queue before it is rendered by the caller.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING, max_points=MAX_POINTS,
+                 put_timeout=PUT_TIMEOUT):
+        self.max_pending = max_pending
+        self.max_points = max_points
+        self.put_timeout = put_timeout
+        # A spawned worker does not inherit the Qt and instrument state of
+        # the interface
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._jobs = None
+        self._process = None
+
+    def _worker(self):
+        if self._process is None or not self._process.is_alive():
+            if self._process is not None:
+                log.warning('Plot renderer died, restarting it.')
+            self._jobs = self._context.Queue(self.max_pending)
+            self._process = self._context.Process(
+                target=_render_loop, args=(self._jobs,),
+                name='PlotRenderer', daemon=True)
+            self._process.start()
+        return self._jobs
+
+    def _line(self, line):
+        line = dict(line)
+        x = np.asarray(line['x'])
+        y = np.asarray(line['y'])
+        if len(y) > self.max_points:
+            x, y = minmax_decimate(x, y, self.max_points//2 - 1)
+        else:
+            # The queue pickles later, so the arrays must not change
+            x, y = x.copy(), y.copy()
+        line['x'], line['y'] = x, y
+        return line
+
+    def submit(self, filename, lines, **kwargs):
+        """ Queues a plot for :func:`render`. While `max_pending` plots
+        are waiting, it waits for a free place, and after `put_timeout`
+        seconds renders the plot itself.
+
+        :returns: Whether the plot was queued, False if it was rendered by
+                  the caller.
+        """
+        job = dict(kwargs, filename=filename,
+                   lines=[self._line(line) for line in lines])
+        with self._lock:
+            try:
+                self._worker().put(job, timeout=self.put_timeout)
+                return True
+            except queue.Full:
+                pass
+        log.warning('Plot renderer is busy with %d plots, rendering %s '
+                    'directly.' % (self.max_pending, filename))
+        render(**job)
+        return False
+
+    def close(self, timeout=60):
+        """ Renders the waiting plots and stops the worker. """
+        with self._lock:
+            if self._process is None:
+                return
+            if self._process.is_alive():
+                try:
+                    self._jobs.put(None, timeout=timeout)
+                except queue.Full:
+                    pass
+                self._process.join(timeout)
+                if self._process.is_alive():
+                    log.warning('Plot renderer did not finish, '
+                                'terminating it.')
+                    self._process.terminate()
+            self._process = None
+            self._jobs = None
+
+
+@lru_cache(maxsize=None)
+def default_plot_renderer():
+    """ Returns the plot renderer shared by all procedures, which renders
+    the waiting plots when the interpreter exits.
+    """
+    renderer = PlotRenderer()
+    atexit.register(renderer.close)
+    return renderer
+
+
+def render_plot(filename, lines, **kwargs):
+    """ Queues a plot for :func:`render` in the
+    :func:`default_plot_renderer`, see :meth:`PlotRenderer.submit`.
+    """
+    return default_plot_renderer().submit(filename, lines, **kwargs)
@@ -0,0 +1,200 @@
+import os
+import logging
+import sqlite3
+from datetime import datetime
+
+import pyqtgraph as pg
+
+from pymeasure.display.Qt import QtCore, QtGui
+from pymeasure.display.widgets import ResultsDialog
+from pymeasure.display.windows import ManagedWindow
+
+from ..storage import (load_results, new_results, results_extension,
+                       allocate_filename, release_filename)
+from ..storage.catalog import STATUSES, default_catalog
+from .curves import DecimatedResultsCurve
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class StoredResultsDialog(ResultsDialog):
+    """ :class:`ResultsDialog` previewing files of all results backends. """
+
+    def update_plot(self, filename):
+        self.plot.clear()
+        if os.path.isdir(filename) or filename == '':
+            return
+        try:
+            results = load_results(str(filename))
+        except Exception:
+            return
+
+        curve = DecimatedResultsCurve(results,
+                                      x=self.plot_widget.plot_frame.x_axis,
+                                      y=self.plot_widget.plot_frame.y_axis,
+                                      pen=pg.mkPen(color=(255, 0, 0),
+                                                   width=1.75),
+                                      antialias=True)
+        curve.update()
+        self.plot.addItem(curve)
+
+        self.preview_param.clear()
+        for key, param in results.procedure.parameter_objects().items():
+            new_item = QtGui.QTreeWidgetItem([param.name, str(param)])
+            self.preview_param.addTopLevelItem(new_item)
+        self.preview_param.sortItems(0, QtCore.Qt.AscendingOrder)
+
+
+class ManagedResultsWindow(ManagedWindow):
+    """ :class:`ManagedWindow` whose results backend is selected with the
+    class attributes `results_backend` ('csv', 'hdf5', 'npz' or
+    'memmap') and `results_compression`, and whose browser reopens files
+    of all backends. Child classes create their results with
+    :meth:`new_results`. The curves of the plot are decimated to the width
+    of the plot, see :class:`DecimatedResultsCurve`.
+
+    Queued runs are recorded in the run catalog together with their
+    status and timing. When a run ends, the fit results that its procedure
+    left in the attribute `fit_results`, a list of dictionaries with one
+    dictionary per fitted peak and optionally units in `FIT_UNITS`, are
+    added to the catalog.
+    """
+
+    results_backend = 'csv'
+    results_compression = False
+
+    def allocate_filename(self, directory, prefix):
+        """ Reserves a unique file name with the extension of the results
+        backend of the window, see :func:`allocate_filename`.
+        """
+        return allocate_filename(directory, prefix,
+                                 results_extension(self.results_backend))
+
+    def new_results(self, procedure, data_filename):
+        """ Returns new results of `procedure` in the backend of the
+        window; the extension of `data_filename` is adapted to it.
+        """
+        return new_results(procedure, data_filename, self.results_backend,
+                           self.results_compression)
+
+    def queue_results(self, procedure, data_filename):
+        """ Queues a run of `procedure` into `data_filename`, a name
+        reserved by :meth:`allocate_filename`. If the results or the
+        experiment cannot be created, the reserved file is removed again.
+
+        :returns: The queued experiment.
+        """
+        results = None
+        try:
+            results = self.new_results(procedure, data_filename)
+            experiment = self.new_experiment(results)
+        except Exception:
+            # An open file could not be removed on Windows
+            try:
+                getattr(results, 'close', lambda: None)()
+            except Exception:
+                pass
+            release_filename(data_filename)
+            raise
+        self.manager.queue(experiment)
+        return experiment
+
+    def new_curve(self, results, color=None, **kwargs):
+        if color is None:
+            color = pg.intColor(self.browser.topLevelItemCount() % 8)
+        kwargs.setdefault('pen', pg.mkPen(color=color, width=2))
+        kwargs.setdefault('antialias', False)
+        curve = DecimatedResultsCurve(results,
+                                      x=self.plot_widget.plot_frame.x_axis,
+                                      y=self.plot_widget.plot_frame.y_axis,
+                                      **kwargs)
+        curve.setSymbol(None)
+        curve.setSymbolBrush(None)
+        return curve
+
+    def catalog_run(self, experiment, status=None):
+        """ Records the status of an experiment in the run catalog, by
+        default the status of its procedure.
+        """
+        catalog = default_catalog()
+        if catalog is None:
+            return
+        results = experiment.results
+        procedure = experiment.procedure
+        if status is None:
+            status = STATUSES.get(procedure.status, 'finished')
+        try:
+            if status == 'queued':
+                catalog.add_run(results.data_filename, procedure,
+                                queued=datetime.now())
+            elif status == 'running':
+                catalog.set_status(results.data_filename, status)
+            else:
+                catalog.set_status(results.data_filename, status,
+                                   rows=len(results.data))
+                fit_results = getattr(procedure, 'fit_results', None) or []
+                for peak, values in enumerate(fit_results):
+                    catalog.record_fit(results.data_filename, values, peak,
+                                       getattr(procedure, 'FIT_UNITS', None))
+        except (sqlite3.Error, KeyError) as e:
+            log.warning('Run catalog not updated: %s' % e)
+
+    def _setup_ui(self):
+        super(ManagedResultsWindow, self)._setup_ui()
+        # ManagedWindow does not handle failed runs
+        self.manager.failed.connect(self.failed)
+
+    @staticmethod
+    def close_results(experiment):
+        """ Completes the results file of a run that has ended. The worker
+        and its recorder have stopped when the manager signals the end.
+        """
+        try:
+            getattr(experiment.results, 'close', lambda: None)()
+        except Exception as e:
+            log.warning('Closing %s failed: %s' % (
+                experiment.results.data_filename, e))
+
+    def queued(self, experiment):
+        super(ManagedResultsWindow, self).queued(experiment)
+        self.catalog_run(experiment, 'queued')
+
+    def running(self, experiment):
+        super(ManagedResultsWindow, self).running(experiment)
+        self.catalog_run(experiment, 'running')
+
+    def finished(self, experiment):
+        self.close_results(experiment)
+        super(ManagedResultsWindow, self).finished(experiment)
+        self.catalog_run(experiment)
+
+    def abort_returned(self, experiment):
+        self.close_results(experiment)
+        super(ManagedResultsWindow, self).abort_returned(experiment)
+        self.catalog_run(experiment)
+
+    def failed(self, experiment):
+        self.close_results(experiment)
+        self.catalog_run(experiment, 'failed')
+
+    def open_experiment(self):
+        dialog = StoredResultsDialog(self.procedure_class.DATA_COLUMNS,
+                                     self.x_axis, self.y_axis)
+        if dialog.exec_():
+            filenames = dialog.selectedFiles()
+            for filename in map(str, filenames):
+                if filename in self.manager.experiments:
+                    QtGui.QMessageBox.warning(
+                        self, "Load Error",
+                        "The file %s cannot be opened twice."
+                        % os.path.basename(filename))
+                elif filename == '':
+                    return
+                else:
+                    results = load_results(filename)
+                    experiment = self.new_experiment(results)
+                    experiment.curve.update()
+                    experiment.browser_item.progressbar.setValue(100.)
+                    self.manager.load(experiment)
+                    log.info('Opened data file %s' % filename)
@@ -10,3 +10,5 @@ from .powermeter_basic import powermeter_basic_experiment, powermeter_basic_inte
 from .electrode_resistance import electrode_resistance_experiment, electrode_resistance_interface
 from .swept_transmission import swept_transmission_experiment, swept_transmission_interface
 from .voltage_sequence_time_domain import voltage_sequence_time_domain_experiment, voltage_sequence_time_domain_interface
+from .piezo_scan import piezo_scan_experiment, piezo_scan_interface
+from .frequency_response import frequency_response_experiment, frequency_response_interface
@@ -10,26 +10,67 @@ except ImportError:
 
 import sys
 import logging
-from pymeasure.experiment import Procedure, Results
-from pymeasure.display.windows import ManagedWindow
-from pymeasure.experiment.results import unique_filename
-from pymeasure.experiment import FloatParameter, IntegerParameter
+from datetime import datetime
+from pymeasure.experiment import Procedure
+from pymeasure.experiment import (FloatParameter, IntegerParameter,
+                                  BooleanParameter)
+from pymeasure.experiment.parameters import Parameter
 import numpy as np
 
 
-from ongpym.instruments.keysight.e36106a import E36106A
+from ongpym.instruments.keysight.supply_bank import E36106ABank
 from time import sleep
 
+from ..display import ManagedResultsWindow
 from ..config import ADDRESS_E36106A
+try:
+    from ..config import ADDRESSES_E36106A
+except ImportError:
+    ADDRESSES_E36106A = [ADDRESS_E36106A]
 
 sys.modules['cloudpickle'] = None
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
 
+class RunningStats(object):
+    """ Streaming mean and variance of a sequence of samples (Welford's
+    algorithm). Works for scalars as well as elementwise for arrays, where
+    non-finite samples are skipped and `n` counts the finite samples of
+    every element.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.
+        self._M2 = 0.
+
+    def add(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        valid = np.isfinite(x)
+        self.n = self.n + valid.astype(int)
+        with np.errstate(invalid='ignore'):
+            delta = np.where(valid, x - self.mean, 0.)
+            self.mean = self.mean + delta/np.maximum(self.n, 1)
+            self._M2 = self._M2 + np.where(valid, delta*(x - self.mean),
+                                           0.)
+
+    @property
+    def variance(self):
+        n = np.asarray(self.n)
+        return np.where(n < 2, np.inf,
+                        self._M2/np.maximum(n - 1, 1))
+
+    @property
+    def stderr(self):
+        """ Standard error of the mean. """
+        return np.sqrt(self.variance/np.maximum(self.n, 1))
+
+
 class electrode_resistance_experiment(Procedure):
 
     # Define Parameters
+    supplies = Parameter('Supplies', default='0')
     V_min = FloatParameter('Minimum Voltage', default=0, minimum=0,
                            maximum=100)
     V_max = FloatParameter('Maximum Voltage', default=10, minimum=0,
@@ -38,48 +79,203 @@ class electrode_resistance_experiment(Procedure):
                             maximum=25)
     N_avg = IntegerParameter('Number of Averages per Step', default=1,
                              minimum=1, maximum=100)
+    precision = BooleanParameter('Target Precision Mode', default=False)
+    R_stderr = FloatParameter('Target Standard Error on R', units='Ohm',
+                              default=0.1, minimum=1e-6, maximum=1e6)
+    N_max = IntegerParameter('Maximum Averages per Step', default=1000,
+                             minimum=3, maximum=100000)
 
-    DATA_COLUMNS = ['V set [V]', 'V [V]', 'I [mA]', 'R [Ohm]', 'P [mW]']
+    ramp = BooleanParameter('Ramp Mode (Output stays on)', default=False)
+    adaptive = BooleanParameter('Adaptive Stepping', default=False)
+    V_step_min = FloatParameter('Minimum Voltage Stepsize', default=0.05,
+                                minimum=0.001, maximum=25)
+    tolerance = FloatParameter('Curvature Tolerance', units='%', default=1,
+                               minimum=0.01, maximum=100)
+    settle_tolerance = FloatParameter('Settling Tolerance', units='%',
+                                      default=0.1, minimum=0.001,
+                                      maximum=10)
+    settle_timeout = FloatParameter('Maximum Settling Time', units='s',
+                                    default=5, minimum=0.1, maximum=600)
+
+    DATA_COLUMNS = ['Channel', 'V set [V]', 'V [V]', 'I [mA]', 'R [Ohm]',
+                    'P [mW]', 'R err [Ohm]', 'N avg']
 
     def startup(self):
         log.info('Starting Resistance Measurement.')
         self.emit('progress', 0)
 
-        # Connect to the voltage source and reset it
-        self.src = E36106A(ADDRESS_E36106A)
+        # Connect to the voltage sources and reset them. The supplies are
+        # given as comma separated indices into ADDRESSES_E36106A.
+        self.channels = [int(i) for i in str(self.supplies).split(',')]
+        self.src = E36106ABank([ADDRESSES_E36106A[i] for i in self.channels])
         self.src.reset()
 
     def execute(self):
         log.info('Measurement in progress.')
+        if self.ramp:
+            # Keep the output on and step upwards, so that every point
+            # only settles from the previous one instead of from zero
+            self.src.set_voltages(self.V_min)
+            self.src.enable()
+        try:
+            if self.adaptive:
+                self.adaptive_sweep()
+            else:
+                self.uniform_sweep()
+        finally:
+            if self.ramp:
+                self.src.disable()
+
+    def uniform_sweep(self):
         Vs = np.arange(self.V_min, self.V_max, self.V_step)
         for j, Vj in enumerate(Vs):
-            self.src.voltage_range = Vj
+            self.measure_point(Vj)
+            self.emit('progress', j/len(Vs)*100)
+            if self.should_stop():
+                break
+
+    def measure_point(self, Vj):
+        """ Applies the voltage Vj to all supplies, measures and emits one
+        data point per supply. Returns the measured columns as arrays.
+        """
+        self.src.set_voltages(Vj)
+        if not self.ramp:
             self.src.enable()
+        if self.adaptive or self.ramp:
+            settled = self.src.wait_for_settling(
+                tolerance=self.settle_tolerance/100,
+                timeout=self.settle_timeout)
+            if not np.all(settled):
+                log.info('Current not settled at %g V on supplies %s.'
+                         % (Vj, np.asarray(self.channels)[~settled]))
+        else:
             sleep(1)
-            V_set = []
-            I_set = []
-            for _ in np.arange(self.N_avg):
-                V_set.append(self.src.voltage)
-                I_set.append(self.src.current)
+        if self.precision:
+            V, I0, R_err, N = self.sample_to_precision()
+        else:
+            V, I0, V_std, I_std = self.src.measure_averaged(self.N_avg)
+            N = self.N_avg
+            R_err = np.full_like(V, np.nan)
+            if N > 1:
+                R_err = np.abs(V/(I0*1e-3))*np.sqrt(
+                    (V_std/V)**2 + (I_std/I0)**2)/np.sqrt(N)
+        if not self.ramp:
             self.src.disable()
-            V = np.average(np.array(V_set))
-            I0 = np.average(np.array(I_set))
 
-            data_curr = {'V set [V]': Vj, 'V [V]': V, 'I [mA]': I0,
-                         'R [Ohm]': V/(I0*1e-3), 'P [mW]': V*I0}
-            self.emit('results', data_curr)
-            self.emit('progress', j/len(Vs)*100)
+        data_curr = {'V set [V]': np.full_like(V, Vj), 'V [V]': V,
+                     'I [mA]': I0, 'R [Ohm]': V/(I0*1e-3), 'P [mW]': V*I0,
+                     'R err [Ohm]': R_err, 'N avg': np.full(np.shape(V), N)}
+        for k, channel in enumerate(self.channels):
+            data = {key: value[k] for key, value in data_curr.items()}
+            data['Channel'] = channel
+            self.emit('results', data)
+        return data_curr
+
+    def sample_to_precision(self):
+        """ Samples voltage and current until the standard error of R
+        reaches R_stderr on all supplies or N_max samples are taken.
+        Supplies whose current is zero within its standard error, e.g. at
+        0 V, have no defined R and only need the minimum of 3 samples.
+
+        :returns: Tuple (V, I, R_err, N) of arrays of the mean voltage and
+                  current and the achieved standard error of R (NaN without
+                  current), and the sample count.
+        """
+        V_stats, I_stats, R_stats = \
+            RunningStats(), RunningStats(), RunningStats()
+        N = 0
+        while N < self.N_max:
+            V, I0 = self.src.measure()
+            V_stats.add(V)
+            I_stats.add(I0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                R_stats.add(V/(I0*1e-3))
+            N += 1
+            if N >= 3:
+                no_current = np.abs(I_stats.mean) <= 2*I_stats.stderr
+                if np.all((R_stats.stderr <= self.R_stderr) | no_current):
+                    break
+            if self.should_stop():
+                break
+        no_current = np.abs(I_stats.mean) <= 2*I_stats.stderr
+        R_err = np.where(no_current, np.nan, R_stats.stderr)
+        return V_stats.mean, I_stats.mean, R_err, N
+
+    def curvature_error(self, P, R):
+        """ Returns the relative deviations of the last point of R(P) from
+        the straight line through the two points before it, without the
+        undefined ones of supplies without current.
+        """
+        if len(R) < 3:
+            return np.array([])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            R_lin = R[-2] + (R[-2]-R[-3])/(P[-2]-P[-3])*(P[-1]-P[-2])
+            err = np.abs(R[-1]-R_lin)/np.abs(R[-1])
+        return err[np.isfinite(err)]
+
+    def adaptive_sweep(self):
+        """ Sweeps from V_min to V_max, adapting the voltage step to the
+        curvature of R(P). The deviation of each new point from the straight
+        line through the two previous points estimates the local error.
+        Where it exceeds the tolerance, the sweep backs off and measures the
+        midpoint of the last step, repeatedly down to V_step_min, before the
+        next step shrinks; in linear regions the step grows, bounded by
+        V_step_min and V_step. With ramp, the output stays on and the
+        voltage only rises, so the last step is not refined and only the
+        next step shrinks. With several supplies the largest error of all
+        of them sets the step.
+        """
+        tolerance = self.tolerance/100
+        Vj = self.V_min
+        step = self.V_step_min
+        V, P, R = [], [], []
+        while Vj < self.V_max:
+            data_curr = self.measure_point(Vj)
+            V.append(Vj)
+            P.append(data_curr['P [mW]'])
+            R.append(data_curr['R [Ohm]'])
+
+            err = self.curvature_error(P, R)
+            # The last step undersampled R(P), refine it by bisection,
+            # which would step the ramped output back down
+            while not self.ramp and len(err) and err.max() > tolerance and \
+                    (V[-1] - V[-2])/2 >= self.V_step_min and \
+                    not self.should_stop():
+                Vm = (V[-2] + V[-1])/2
+                data_mid = self.measure_point(Vm)
+                V.insert(-1, Vm)
+                P.insert(-1, data_mid['P [mW]'])
+                R.insert(-1, data_mid['R [Ohm]'])
+                step = V[-1] - V[-2]
+                err = self.curvature_error(P, R)
+
+            if len(err):
+                factor = np.sqrt(tolerance/max(err.max(), 1e-12))
+                step = step*np.clip(factor, 0.5, 2)
+            else:
+                step = 2*step
+            step = np.clip(step, self.V_step_min, self.V_step)
+
+            self.emit('progress',
+                      (Vj-self.V_min)/(self.V_max-self.V_min)*100)
+            if self.should_stop():
+                break
+            Vj += step
 
     def shutdown(self):
+        self.src.disable()
         self.src.disconnect()
 
 
-class electrode_resistance_interface(ManagedWindow):
+class electrode_resistance_interface(ManagedResultsWindow):
     def __init__(self):
         super(electrode_resistance_interface, self).__init__(
             procedure_class=electrode_resistance_experiment,
-            inputs=['V_min', 'V_max', 'V_step', 'N_avg'],
-            displays=['V_min', 'V_max', 'V_step', 'N_avg'],
+            inputs=['supplies', 'V_min', 'V_max', 'V_step', 'N_avg',
+                    'precision', 'R_stderr', 'N_max', 'ramp', 'adaptive',
+                    'V_step_min', 'tolerance', 'settle_tolerance',
+                    'settle_timeout'],
+            displays=['supplies', 'V_min', 'V_max', 'V_step', 'N_avg'],
             x_axis='P [mW]',
             y_axis='R [Ohm]',
             directory_input=True,
@@ -96,14 +292,10 @@ class electrode_resistance_interface(ManagedWindow):
         if procedure is None:
             procedure = self.make_procedure()
 
-        filename = unique_filename(directory)
-        print(filename)
-
-        results = Results(procedure, filename)
-
-        experiment = self.new_experiment(results)
+        filename = self.allocate_filename(
+            directory, 'DATA' + datetime.now().strftime("%Y-%m-%d"))
 
-        self.manager.queue(experiment)
+        self.queue_results(procedure, filename)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,328 @@
+try:
+    import ongpym
+    del ongpym
+except ImportError:
+    from pathlib import Path
+    file = Path(__file__). resolve()
+    package_root_directory = str(file)[:str(file).find('ONGPyMeasureSuite')] \
+        + 'ONGPyMeasureSuite'
+    exec(open(str(package_root_directory)+'/initialize.py').read())
+
+import os
+import sys
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+import numpy as np
+
+from pymeasure.experiment import Procedure
+from pymeasure.experiment import (IntegerParameter, FloatParameter,
+                                  BooleanParameter, ListParameter)
+from pymeasure.experiment.parameters import Parameter
+
+from ..instruments.gwinstek.afg2125 import AFG2125
+from ..instruments.tektronix.mdo3052 import MDO3052
+
+from ..display import ManagedResultsWindow
+from ..config import ADDRESS_AFG2125, ADDRESS_MDO3052, PATH_TRASH
+
+sys.modules['cloudpickle'] = None
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+HORIZONTAL_SCALES = np.array([[1*i, 2*i, 4*i]
+                             for i in [1e-9, 1e-8, 1e-7, 1e-6, 1e-5, 1e-4,
+                                       1e-3, 1e-2, 1e-1, 1e0, 1e1, 1e2,
+                                       1e3]]).flatten()
+
+
+def horizontal_scale(frequency, n_periods):
+    """
+    Returns the smallest horizontal scale of the oscilloscope (10 divisions)
+    that covers `n_periods` periods at `frequency`.
+
+    """
+    h_scale_min = n_periods/frequency/10.
+    i = np.searchsorted(HORIZONTAL_SCALES, h_scale_min)
+    return HORIZONTAL_SCALES[min(i, len(HORIZONTAL_SCALES)-1)]
+
+
+def lock_in(t, y, frequency):
+    """
+    Digital lock-in demodulation of one or several traces at `frequency`.
+    The traces are cut to an integer number of periods to suppress leakage
+    of the DC level and the harmonics.
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        Uniformly spaced time values in s.
+    y : numpy.ndarray
+        Trace, or array of shape (traces, samples) of traces sharing `t`.
+    frequency : float
+        Demodulation frequency in Hz.
+
+    Returns
+    -------
+    phasor : complex or numpy.ndarray
+        Complex amplitude of the component at `frequency` of every trace;
+        its modulus is the amplitude and its argument the phase.
+
+    """
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    dt = t[1] - t[0]
+    n_whole = int(np.floor(len(t)*dt*frequency))
+    n = len(t)
+    if n_whole >= 1:
+        n = min(int(np.rint(n_whole/frequency/dt)), len(t))
+
+    reference = np.exp(-2j*np.pi*frequency*t[:n])
+    y = y[..., :n]
+    y = y - y.mean(axis=-1, keepdims=True)
+    return 2*(y @ reference)/n
+
+
+def transfer_function(t, response, signal, frequency):
+    """
+    Demodulates a response/signal pair at `frequency`.
+
+    Returns
+    -------
+    gain : float
+        Ratio of the response and signal amplitudes.
+    phase : float
+        Phase of the response relative to the signal in degree.
+    response_amplitude, signal_amplitude : float
+        Amplitudes of the response and signal in V.
+
+    """
+    phasors = lock_in(t, np.vstack([response, signal]), frequency)
+    H = phasors[0]/phasors[1]
+    return (np.abs(H), np.degrees(np.angle(H)),
+            np.abs(phasors[0]), np.abs(phasors[1]))
+
+
+class frequency_response_experiment(Procedure):
+    # Parameter definition
+    f_start = FloatParameter(name='Start Frequency', minimum=1e-3,
+                             maximum=25e6, default=1e2, units='Hz')
+    f_stop = FloatParameter(name='Stop Frequency', minimum=1e-3,
+                            maximum=25e6, default=1e6, units='Hz')
+    n_frequencies = IntegerParameter(name='Number of Frequencies',
+                                     minimum=2, maximum=1000, default=41)
+    amplitude = FloatParameter(name='Amplitude', default=1,
+                               minimum=0, units='Vpp')
+    offset = FloatParameter(name='Offset', default=0, minimum=-10, maximum=10,
+                            units='V')
+    settle_time = FloatParameter(name='Settling Time', minimum=0,
+                                 maximum=100, default=0.2, units='s')
+
+    response_channel = ListParameter(name='Response Channel',
+                                     choices=['CH1', 'CH2'], default='CH1')
+    signal_channel = ListParameter(name='Signal Channel',
+                                   choices=['CH1', 'CH2'], default='CH2')
+
+    n_periods = IntegerParameter(name='Number of Periods',
+                                 minimum=1, maximum=30, default=10)
+    vertical_resolution = FloatParameter(name='Vertical Resolution',
+                                         minimum=1, maximum=1000, default=5,
+                                         units='mV/div')
+    vertical_offset = FloatParameter(name='Vertical Offset', default=0,
+                                     minimum=-4, maximum=4, units='div')
+    termination_response = ListParameter(name='Response Channel Termination',
+                                         choices=['50 Ohm', '1 MOhm'],
+                                         default='50 Ohm')
+    termination_signal = ListParameter(name='Signal Channel Termination',
+                                       choices=['50 Ohm', '1 MOhm'],
+                                       default='1 MOhm')
+    record_length = ListParameter(name='Record Length',
+                                  choices=[1000, 10000, 100000],
+                                  default=10000)
+
+    directory = Parameter('', default='empty')
+    saving = BooleanParameter('Save Data', default=False)
+    filename = Parameter('Filename', default='FrequencyResponse')
+
+    DATA_COLUMNS = ['Frequency [Hz]', 'Gain', 'Gain [dB]', 'Phase [deg]',
+                    'Response [V]', 'Signal [V]']
+
+    def startup(self):
+        log.info('Startup.')
+        self.fg = AFG2125(ADDRESS_AFG2125)
+        log.info('Connection to AFG2125 established.')
+        self.osc = MDO3052(ADDRESS_MDO3052)
+        log.info('Connection to MDO3052 established.')
+
+        if self.response_channel == self.signal_channel:
+            raise ValueError('Response and signal channel have to differ.')
+
+        self.frequencies = np.logspace(np.log10(self.f_start),
+                                       np.log10(self.f_stop),
+                                       self.n_frequencies)
+
+        log.info('Setup Oscilloscope')
+        self.osc.reset()
+        self.osc.select()
+        self.osc.acqidilaymode = 'OFF'
+        self.osc.horizontalpos = 0
+
+        channels = {'CH1': self.osc.ch1, 'CH2': self.osc.ch2}
+        ch_response = channels[self.response_channel]
+        ch_signal = channels[self.signal_channel]
+
+        ch_signal.termination = 'FIF'
+        if self.termination_signal == '1 MOhm':
+            ch_signal.termination = 'MEG'
+        ch_signal.scale = self.amplitude/3.
+        ch_signal.position = 0
+
+        ch_response.termination = 'FIF'
+        if self.termination_response == '1 MOhm':
+            ch_response.termination = 'MEG'
+        ch_response.scale = self.vertical_resolution/1000
+        ch_response.position = self.vertical_offset
+
+        self.osc.triggertyp = 'EDG'
+        self.osc.triggermode = 'NORM'
+        self.osc.triggersource = self.signal_channel
+        self.osc.triggerslope = 'RIS'
+        if self.signal_channel == 'CH1':
+            self.osc.triggerlevel1 = self.offset
+        else:
+            self.osc.triggerlevel2 = self.offset
+        self.osc.acqu_state = 0
+        self.osc.singelrun = 'SEQ'
+        self.osc.acquirereclen = self.record_length
+        self.emit('progress', 10)
+
+        log.info('Setup Function Generator')
+        with self.fg.batch():
+            self.fg.signal = 'SIN'
+            self.fg.frequency = self.frequencies[0]
+            self.fg.amplitude = self.amplitude
+            self.fg.offset = self.offset
+            self.fg.high_impedance = True
+
+        log.info('Setup Completed')
+        self.emit('progress', 20)
+
+    def settle(self, frequency):
+        """ Sets the generator to `frequency` and waits until the device
+        under test settled.
+        """
+        self.fg.frequency = frequency
+        sleep(self.settle_time)
+
+    def acquire(self):
+        """ Records one single sequence on the oscilloscope. """
+        self.osc.acqu_state = 1
+        sleep(0.1)
+        while self.osc.acqu_state == 1.0:
+            if self.should_stop():
+                break
+            sleep(0.01)
+
+    def read_traces(self):
+        """ Transfers and rescales the response and signal traces. """
+        record_length = self.osc.acquirereclen
+        traces = []
+        for channel in [self.response_channel, self.signal_channel]:
+            traces.append(np.asarray(self.osc.get_scaled_waveform(
+                stop=record_length, channel=channel)))
+        t = np.asarray(self.osc.get_timebase(len(traces[0])))
+        return t, traces[0], traces[1]
+
+    def execute(self):
+        log.info('Measurement in progress.')
+        self.fg.output = True
+        sleep(self.settle_time)
+
+        # The generator settles at the next frequency on a second thread
+        # while the traces of the current one are transferred
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for j, f in enumerate(self.frequencies):
+                self.osc.horizontalscal = horizontal_scale(f, self.n_periods)
+                self.acquire()
+                if self.should_stop():
+                    log.info('Measurement stopped.')
+                    break
+
+                settling = None
+                if j+1 < len(self.frequencies):
+                    settling = executor.submit(self.settle,
+                                               self.frequencies[j+1])
+
+                t, response, signal = self.read_traces()
+                gain, phase, r_amp, s_amp = \
+                    transfer_function(t, response, signal, f)
+                data = {'Frequency [Hz]': f,
+                        'Gain': gain,
+                        'Gain [dB]': 20*np.log10(gain),
+                        'Phase [deg]': phase,
+                        'Response [V]': r_amp,
+                        'Signal [V]': s_amp}
+                self.emit('results', data)
+                self.emit('progress', 20+80*(j+1)/len(self.frequencies))
+
+                if settling is not None:
+                    settling.result()
+
+    def shutdown(self):
+        log.info('Shutting Down')
+        self.fg.output = False
+        self.osc.adapter.connection.close()
+        self.fg.adapter.connection.close()
+
+        log.info('Measurement Successful.')
+        self.emit('progress', 100)
+
+
+class frequency_response_interface(ManagedResultsWindow):
+    def __init__(self):
+        super(frequency_response_interface, self).__init__(
+            procedure_class=frequency_response_experiment,
+            inputs=['f_start', 'f_stop', 'n_frequencies', 'amplitude',
+                    'offset', 'settle_time', 'response_channel',
+                    'signal_channel', 'n_periods', 'vertical_resolution',
+                    'vertical_offset', 'termination_response',
+                    'termination_signal', 'record_length', 'saving',
+                    'filename'],
+            displays=['f_start', 'f_stop', 'amplitude'],
+            x_axis='Frequency [Hz]',
+            y_axis='Gain [dB]',
+            directory_input=True,
+            sequencer=True,
+            sequencer_inputs=['amplitude', 'offset'])
+
+        self.setWindowTitle('Frequency Response')
+
+    def queue(self, *, procedure=None):
+        directory = self.directory
+        if procedure is None:
+            procedure = self.make_procedure()
+
+        if not procedure.saving:
+            directory = PATH_TRASH+"\\.trash"
+        elif directory == '':
+            directory = PATH_TRASH
+
+        procedure.directory = directory
+        filename = procedure.filename.replace('.csv', '')
+        procedure.filename = filename
+
+        dirfilename = self.allocate_filename(directory, filename)
+        procedure.filename = os.path.splitext(
+            os.path.basename(dirfilename))[0]
+
+        self.queue_results(procedure, dirfilename)
+
+
+if __name__ == "__main__":
+    from pymeasure.display.Qt import QtGui
+
+    app = QtGui.QApplication(sys.argv)
+    window = frequency_response_interface()
+    window.show()
+    sys.exit(app.exec_())
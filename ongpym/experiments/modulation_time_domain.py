@@ -10,14 +10,14 @@ except ImportError:
 
 import os
 import sys
+import ast
 
 import logging
 
 from time import sleep
 import numpy as np
 
-from pymeasure.display.windows import ManagedWindow
-from pymeasure.experiment import Procedure, Results
+from pymeasure.experiment import Procedure
 from pymeasure.experiment import (IntegerParameter,
                                   FloatParameter, BooleanParameter,
                                   ListParameter)
@@ -25,6 +25,8 @@ from pymeasure.experiment.parameters import Parameter
 from ..instruments.gwinstek.afg2125 import AFG2125
 from ..instruments.tektronix.mdo3052 import MDO3052
 
+from ..display import ManagedResultsWindow
+from ..storage import emit_block, ScaledCodes
 from ..config import ADDRESS_AFG2125, ADDRESS_MDO3052
 
 log = logging.getLogger(__name__)
@@ -36,6 +38,92 @@ HORIZONTAL_SCALES = np.array([[1*i, 2*i, 4*i]
                              1e-2, 1e-1, 1e0, 1e1, 1e2, 1e3]]).flatten()
 
 
+def prbs(order, t):
+    """ Returns the pseudo-random binary sequence of the given order
+    (2^order-1 bits, Fibonacci LFSR) as +-1 sampled at the period
+    fractions t.
+    """
+    taps = {3: 2, 4: 3, 5: 3, 6: 5, 7: 6, 9: 5, 10: 7, 11: 9, 15: 14}
+    if order not in taps:
+        raise ValueError('PRBS order has to be one of %s.' % sorted(taps))
+    n_bits = 2**order - 1
+    state = np.ones(order, dtype=bool)
+    bits = np.empty(n_bits, dtype=bool)
+    for i in range(n_bits):
+        bits[i] = state[-1]
+        feedback = state[order-1] ^ state[taps[order]-1]
+        state = np.roll(state, 1)
+        state[0] = feedback
+    return np.where(bits[(np.asarray(t)*n_bits).astype(int) % n_bits],
+                    1., -1.)
+
+
+# Functions and constants of waveform expressions
+WAVEFORM_FUNCTIONS = {name: getattr(np, name)
+                      for name in ['sin', 'cos', 'tan', 'arcsin', 'arccos',
+                                   'arctan', 'sinh', 'cosh', 'tanh', 'exp',
+                                   'log', 'log10', 'sqrt', 'abs', 'sign',
+                                   'where', 'mod', 'floor', 'ceil',
+                                   'minimum', 'maximum', 'clip', 'pi', 'e']}
+WAVEFORM_FUNCTIONS['prbs'] = prbs
+# Syntax of waveform expressions, no attributes, subscripts, lambdas or
+# comprehensions
+WAVEFORM_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp,
+                  ast.Compare, ast.IfExp, ast.Call, ast.Name, ast.Load,
+                  ast.Constant, ast.operator, ast.unaryop, ast.boolop,
+                  ast.cmpop)
+
+
+def parse_waveform(text):
+    """ Returns the compiled waveform expression `text`, which may only
+    use numbers, t, operators and the WAVEFORM_FUNCTIONS.
+    """
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as e:
+        raise ValueError("Invalid waveform expression '%s': %s" % (text, e))
+    for node in ast.walk(tree):
+        if not isinstance(node, WAVEFORM_NODES):
+            raise ValueError("'%s' is not allowed in waveform expressions."
+                             % type(node).__name__)
+        if isinstance(node, ast.Name) and node.id != 't' and \
+                node.id not in WAVEFORM_FUNCTIONS:
+            raise ValueError("Unknown name '%s' in the waveform expression."
+                             % node.id)
+        if isinstance(node, ast.Call) and not isinstance(node.func,
+                                                         ast.Name):
+            raise ValueError('Only the functions %s can be called in '
+                             'waveform expressions.'
+                             % ', '.join(sorted(WAVEFORM_FUNCTIONS)))
+        if isinstance(node, ast.Constant) and \
+                not isinstance(node.value, (int, float, complex)):
+            raise ValueError('Waveform expressions may only contain '
+                             'numbers.')
+    return compile(tree, '<waveform>', 'eval')
+
+
+def waveform_from_text(text, n_points):
+    """ Returns one period of an arbitrary waveform. `text` is either the
+    path of a .npy file or a text file with one value per line or comma,
+    or an expression of the period fraction t in [0, 1) with the functions
+    of WAVEFORM_FUNCTIONS, e.g. 'sin(2*pi*t)', 't + 0.2*exp(-t/0.02)' or
+    'prbs(7, t)', see :func:`parse_waveform`.
+    """
+    text = text.strip()
+    if os.path.isfile(text):
+        if text.endswith('.npy'):
+            return np.load(text).ravel()
+        with open(text) as file:
+            values = file.read().replace(',', ' ').split()
+        return np.asarray(values, dtype=float)
+
+    t = np.arange(n_points)/n_points
+    expression = parse_waveform(text)
+    namespace = dict(WAVEFORM_FUNCTIONS, t=t)
+    waveform = eval(expression, {'__builtins__': {}}, namespace)
+    return np.broadcast_to(np.asarray(waveform, dtype=float), t.shape)
+
+
 class modulation_time_domain_experiment(Procedure):
     # Parameter definition
 
@@ -46,8 +134,12 @@ class modulation_time_domain_experiment(Procedure):
     offset = FloatParameter(name='Offset', default=0, minimum=-10, maximum=10,
                             units='V')
     signal = ListParameter(name='Signal Type',
-                           choices=['Triangular', 'Square'],
+                           choices=['Triangular', 'Square', 'Arbitrary'],
                            default='Triangular')
+    waveform = Parameter('Arbitrary Waveform (f(t) or File)',
+                         default='sin(2*pi*t)')
+    waveform_points = IntegerParameter(name='Arbitrary Waveform Points',
+                                       minimum=2, maximum=4096, default=4096)
 
     response_channel = ListParameter(name='Response Channel',
                                      choices=['CH1', 'CH2'], default='CH1')
@@ -92,6 +184,25 @@ class modulation_time_domain_experiment(Procedure):
         self.osc = MDO3052(ADDRESS_MDO3052)
         log.info('Connection to MDO3052 established.')
 
+        log.info('Setup Function Generator')
+        # All settings go out as one line by the writer thread of the
+        # adapter while the oscilloscope is set up, errors are checked
+        # afterwards
+        with self.fg.batch(background=True):
+            if self.signal == 'Arbitrary':
+                log.info('Upload Arbitrary Waveform')
+                self.fg.upload_waveform(
+                    waveform_from_text(self.waveform, self.waveform_points))
+            elif self.signal == 'Triangular':
+                self.fg.signal = 'RAMP'
+            elif self.signal == 'Square':
+                self.fg.signal = 'SQU'
+            self.fg.frequency = self.frequency
+            self.fg.amplitude = self.amplitude
+            self.fg.offset = self.offset
+            # self.termination_response == '1 MOhm'
+            self.fg.high_impedance = True
+
         log.info('Setup Oscilloscope')
         self.osc.reset()
 
@@ -161,15 +272,8 @@ class modulation_time_domain_experiment(Procedure):
         self.osc.singelrun = 'SEQ'
         self.osc.acquirereclen = self.record_length
 
-        log.info('Setup Function Generator')
-        self.fg.frequency = self.frequency
-        self.fg.amplitude = self.amplitude
-        self.fg.offset = self.offset
-        self.fg.signal = 'RAMP'
-        if self.signal == 'Square':
-            self.fg.signal = 'SQU'
-
-        self.fg.high_impedance = True  # self.termination_response == '1 MOhm'
+        # The generator was configured in the background meanwhile
+        self.fg.check_errors()
 
         log.info('Setup Completed')
         self.emit('progress', 20)
@@ -188,33 +292,23 @@ class modulation_time_domain_experiment(Procedure):
 
         log.info('Data Processing')
         record_length = self.osc.acquirereclen
-        response = self.osc.getwaveform(stop=record_length,
-                                        channel=self.response_channel)
+        # The codes are rescaled to volts by the results, raw results
+        # store them unscaled
+        response = self.osc.get_scaled_waveform(
+            stop=record_length, channel=self.response_channel)
         if not self.signal_channel == 'n/a':
-            signal = self.osc.getwaveform(stop=record_length,
-                                          channel=self.signal_channel)
+            signal = self.osc.get_scaled_waveform(
+                stop=record_length, channel=self.signal_channel)
         else:
-            signal = np.zeros_like(response)
-
-        # Rescaling to correct voltage levels
-        s_scale, s_off, s_pos = self.osc.get_vscale(self.signal_channel)
-        r_scale, r_off, r_pos = self.osc.get_vscale(self.response_channel)
+            signal = ScaledCodes(np.zeros_like(response.codes), 0)
 
-        signal = (signal-s_pos)*s_scale-s_off
-        response = (response-r_pos)*r_scale-r_off
-
-        t0, tscale, record_length = self.osc.get_timescale()
-        time = np.linspace(t0, t0+record_length*tscale, record_length)
+        time = self.osc.get_timebase(len(response))
 
         self.emit('progress', 80)
         log.info('Emitting Data')
-        for i in range(len(time)):
-            data = {'Time [s]': time[i],
-                    'Response [V]': response[i],
-                    'Signal [V]': signal[i]}
-            self.emit('results', data)
-            if self.should_stop():
-                break
+        emit_block(self, {'Time [s]': time,
+                          'Response [V]': response,
+                          'Signal [V]': signal})
         log.info('Data Emitted')
         self.emit('progress', 90)
 
@@ -227,11 +321,15 @@ class modulation_time_domain_experiment(Procedure):
         self.emit('progress', 100)
 
 
-class modulation_time_domain_interface(ManagedWindow):
+class modulation_time_domain_interface(ManagedResultsWindow):
+    # Time traces are stored as raw oscilloscope codes
+    results_backend = 'raw'
+
     def __init__(self):
         super(modulation_time_domain_interface, self).__init__(
             procedure_class=modulation_time_domain_experiment,
             inputs=['frequency', 'amplitude', 'offset', 'signal',
+                    'waveform', 'waveform_points',
                     'response_channel', 'signal_channel', 'n_periods',
                     'vertical_resolution', 'vertical_offset', 'record_length',
                     'acquisition_mode', 'termination_response',
@@ -259,13 +357,8 @@ class modulation_time_domain_interface(ManagedWindow):
         procedure.directory = directory
         filename = procedure.filename
 
-        while (procedure.filename+'.csv') in os.listdir(directory):
-            procedure.filename = procedure.filename+'_1'
-            filename = procedure.filename
-
-        dirfilename = os.path.join(directory, filename)
-
-        results = Results(procedure, dirfilename+'.csv')
-        experiment = self.new_experiment(results)
+        dirfilename = self.allocate_filename(directory, filename)
+        procedure.filename = os.path.splitext(
+            os.path.basename(dirfilename))[0]
 
-        self.manager.queue(experiment)
+        self.queue_results(procedure, dirfilename)
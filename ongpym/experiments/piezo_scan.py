@@ -0,0 +1,340 @@
+try:
+    import ongpym
+    del ongpym
+except ImportError:
+    from pathlib import Path
+    file = Path(__file__). resolve()
+    package_root_directory = str(file)[:str(file).find('ONGPyMeasureSuite')] \
+        + 'ONGPyMeasureSuite'
+    exec(open(str(package_root_directory)+'/initialize.py').read())
+
+import os
+import sys
+import logging
+
+from time import sleep, time
+import numpy as np
+
+
+from pymeasure.experiment import Procedure
+from pymeasure.experiment import (IntegerParameter, FloatParameter,
+                                  BooleanParameter, ListParameter)
+from pymeasure.experiment.parameters import Parameter
+
+from ..instruments.tektronix.mdo3052 import MDO3052
+from ..instruments.toptica.topticactl import TopticaCTL
+
+from ..display import ManagedResultsWindow
+from ..storage import emit_block
+from ..config import ADDRESS_MDO3052, ADDRESS_TOPTICACTL, PATH_TRASH
+
+sys.modules['cloudpickle'] = None
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+HORIZONTAL_SCALES = np.array([[1*i, 2*i, 4*i]
+                             for i in [1e-6, 1e-5, 1e-4, 1e-3, 1e-2,
+                                       1e-1, 1e0, 1e1, 1e2, 1e3]]).flatten()
+
+
+def period_traces(t, y, frequency):
+    """
+    Cuts a trace recorded during a triangular piezo scan into the rising
+    ramps of the individual scan periods. The scan period is assumed to
+    start at t = 0, i.e. at the trigger.
+
+    Parameters
+    ----------
+    t : numpy.ndarray
+        Uniformly spaced time values of the trace in s.
+    y : numpy.ndarray
+        Recorded trace.
+    frequency : float
+        Scan frequency of the piezo in Hz.
+
+    Returns
+    -------
+    traces : numpy.ndarray
+        Array of shape (periods, bins) holding the rising ramp of every
+        complete scan period in the trace.
+    t_periods : numpy.ndarray
+        Start time of every period in s.
+
+    """
+    dt = t[1] - t[0]
+    n_periods = int(np.floor(t[-1]*frequency))
+    n_bins = int(np.floor(0.5/frequency/dt))
+    if n_periods < 1 or n_bins < 3:
+        return np.zeros((0, max(n_bins, 0))), np.zeros(0)
+
+    t_periods = np.arange(n_periods)/frequency
+    t_bins = (np.arange(n_bins)+0.5)*0.5/frequency/n_bins
+    index = np.rint((t_periods[:, None]+t_bins[None, :]-t[0])/dt)
+    index = np.clip(index.astype(int), 0, len(y)-1)
+
+    return y[index], t_periods
+
+
+def resonance_per_period(traces, smoothing=1):
+    """
+    Extracts the resonance dip of every row of `traces` at once.
+
+    Parameters
+    ----------
+    traces : numpy.ndarray
+        Array of shape (periods, bins), e.g. from :func:`period_traces`.
+    smoothing : int, optional
+        Width of the boxcar filter (in bins) applied along the scan before
+        the extraction. The default is 1 (no smoothing).
+
+    Returns
+    -------
+    center : numpy.ndarray
+        Resonance center as fraction of the ramp (0 to 1).
+    fwhm : numpy.ndarray
+        Full width at half depth as fraction of the ramp.
+    extinction : numpy.ndarray
+        Ratio of baseline and dip minimum in dB.
+
+    """
+    Y = np.asarray(traces, dtype=np.float64)
+    n_rows, n_scan = Y.shape
+    if n_rows == 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0)
+    n_bins = n_scan
+    if smoothing > 1:
+        c = np.cumsum(np.pad(Y, ((0, 0), (1, 0))), axis=1)
+        Y = (c[:, smoothing:]-c[:, :-smoothing])/smoothing
+        n_bins = Y.shape[1]
+
+    rows = np.arange(n_rows)
+    cols = np.arange(n_bins)
+
+    baseline = np.median(Y, axis=1)
+    i_min = np.argmin(Y, axis=1)
+    y_min = Y[rows, i_min]
+    half = 0.5*(baseline+y_min)
+
+    above = Y >= half[:, None]
+
+    # last sample above half depth left of the minimum
+    left_mask = above & (cols[None, :] < i_min[:, None])
+    left = np.where(left_mask.any(axis=1),
+                    n_bins-1-np.argmax(left_mask[:, ::-1], axis=1), 0)
+    left = np.minimum(left, n_bins-2)
+    y0, y1 = Y[rows, left], Y[rows, left+1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_left = left+np.where(y0 != y1, (y0-half)/(y0-y1), 0)
+
+    # first sample above half depth right of the minimum
+    right_mask = above & (cols[None, :] > i_min[:, None])
+    right = np.where(right_mask.any(axis=1),
+                     np.argmax(right_mask, axis=1), n_bins-1)
+    right = np.maximum(right, 1)
+    y0, y1 = Y[rows, right-1], Y[rows, right]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_right = right-1+np.where(y0 != y1, (half-y0)/(y1-y0), 1)
+
+    # bin i of the smoothed rows is centered on bin i+(smoothing-1)/2
+    offset = 0.5*(max(smoothing, 1)-1)
+    center = (0.5*(x_left+x_right)+offset+0.5)/n_scan
+    fwhm = (x_right-x_left)/n_scan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        extinction = np.where((baseline > 0) & (y_min > 0),
+                              10*np.log10(baseline/y_min), np.nan)
+
+    return center, fwhm, extinction
+
+
+class piezo_scan_experiment(Procedure):
+    # Parameter definition
+    wl_center = FloatParameter('Center Wavelength', units='nm',
+                               minimum=1460.0, maximum=1570.0,
+                               default=1555.0)
+    laserpower = FloatParameter('Laser Power', units='mW', default=10,
+                                maximum=60.0)
+
+    piezo_frequency = FloatParameter('Scan Frequency', units='Hz',
+                                     minimum=1, maximum=1000, default=20)
+    piezo_Vpp = FloatParameter('Scan Amplitude', units='Vpp', minimum=0,
+                               maximum=140, default=2)
+    piezo_Vo = FloatParameter('Scan Offset', units='V', minimum=0,
+                              maximum=140, default=70)
+    tuning = FloatParameter('Piezo Tuning Coefficient', units='pm/V',
+                            default=1)
+
+    n_periods = IntegerParameter('Periods per Acquisition', minimum=1,
+                                 maximum=100, default=10)
+    n_acquisitions = IntegerParameter('Number of Acquisitions', minimum=1,
+                                      maximum=100000, default=100)
+    smoothing = IntegerParameter('Smoothing', units='bins', minimum=1,
+                                 maximum=100, default=1)
+
+    vertical_resolution = FloatParameter(name='Vertical Resolution',
+                                         minimum=1, maximum=1000, default=50,
+                                         units='mV/div')
+    vertical_offset = FloatParameter(name='Vertical Offset', default=-4,
+                                     minimum=-4, maximum=4, units='div')
+    termination_response = ListParameter(name='Response Channel Termination',
+                                         choices=['50 Ohm', '1 MOhm'],
+                                         default='50 Ohm')
+    trigger_level = FloatParameter('Trigger Level', units='V',
+                                   minimum=-3.2, maximum=3.2, default=2.5)
+    record_length = ListParameter(name='Record Length',
+                                  choices=[1000, 10000, 100000, 1000000],
+                                  default=100000)
+
+    directory = Parameter('', default='empty')
+    saving = BooleanParameter('Save Data', default=False)
+    filename = Parameter('Filename', default='PiezoScan')
+
+    DATA_COLUMNS = ['Time [s]', 'Center [nm]', 'Detuning [pm]',
+                    'FWHM [pm]', 'Extinction [dB]']
+
+    def startup(self):
+        log.info('Startup.')
+        self.laser = TopticaCTL(ADDRESS_TOPTICACTL)
+        log.info('Connection to TopticaCTL established.')
+        self.osc = MDO3052(ADDRESS_MDO3052)
+        log.info('Connection to MDO3052 established.')
+
+        self.laser.power_stabilization = True
+        self.laser.power_set = self.laserpower
+        self.laser.wavelength_set = self.wl_center
+
+        log.info('Setup Piezo Scan')
+        self.laser.piezo_enabled = False
+        self.laser.piezo_signal = 1
+        self.laser.piezo_frequency = self.piezo_frequency
+        self.laser.piezo_Vpp = self.piezo_Vpp
+        self.laser.piezo_Vo = self.piezo_Vo
+        self.emit('progress', 10)
+
+        log.info('Setup Oscilloscope')
+        self.osc.reset()
+        self.osc.select()
+
+        T_min = self.n_periods/self.piezo_frequency
+        h_scale_min = T_min/10.
+        for i, _ in enumerate(HORIZONTAL_SCALES):
+            if HORIZONTAL_SCALES[i] < h_scale_min:
+                continue
+            else:
+                h_scale = HORIZONTAL_SCALES[i]
+                break
+        self.osc.horizontalscal = h_scale
+        self.osc.acqidilaymode = 'OFF'
+        self.osc.horizontalpos = 0
+
+        self.osc.ch1.termination = 'FIF'
+        if self.termination_response == '1 MOhm':
+            self.osc.ch1.termination = 'MEG'
+        self.osc.ch1.scale = self.vertical_resolution/1000
+        self.osc.ch1.position = self.vertical_offset
+        self.osc.ch2.scale = 1
+
+        # CH2 carries the sync signal marking the start of each scan period
+        self.osc.triggertyp = 'EDG'
+        self.osc.triggermode = 'NORM'
+        self.osc.triggersource = 'CH2'
+        self.osc.triggerslope = 'RIS'
+        self.osc.triggerlevel2 = self.trigger_level
+        self.osc.acqu_state = 0
+        self.osc.singelrun = 'SEQ'
+        self.osc.acquirereclen = self.record_length
+
+        self.laser.piezo_enabled = True
+
+        log.info('Setup Completed')
+        self.emit('progress', 20)
+
+    def execute(self):
+        log.info('Tracking in progress.')
+        t_start = time()
+        for j in range(self.n_acquisitions):
+            t_acq = time()-t_start
+            self.osc.acqu_state = 1
+            sleep(self.n_periods/self.piezo_frequency)
+            while self.osc.acqu_state == 1.0:
+                if self.should_stop():
+                    break
+                sleep(0.01)
+            if self.should_stop():
+                log.info('Tracking stopped.')
+                break
+
+            record_length = self.osc.acquirereclen
+            response = np.asarray(self.osc.get_scaled_waveform(
+                stop=record_length, channel='CH1'))
+            t = np.asarray(self.osc.get_timebase(len(response)))
+
+            traces, t_periods = period_traces(t, response,
+                                              self.piezo_frequency)
+            center, fwhm, extinction = \
+                resonance_per_period(traces, smoothing=self.smoothing)
+
+            # rising ramp runs from Vo-Vpp/2 to Vo+Vpp/2
+            detuning = (center-0.5)*self.piezo_Vpp*self.tuning
+            linewidth = fwhm*self.piezo_Vpp*self.tuning
+
+            emit_block(self, {'Time [s]': t_acq+t_periods,
+                              'Center [nm]': self.wl_center+detuning*1e-3,
+                              'Detuning [pm]': detuning,
+                              'FWHM [pm]': linewidth,
+                              'Extinction [dB]': extinction})
+            self.emit('progress', 20+80*(j+1)/self.n_acquisitions)
+
+    def shutdown(self):
+        log.info('Shutting Down')
+        self.laser.piezo_enabled = False
+        self.laser.close()
+        self.osc.adapter.connection.close()
+        self.emit('progress', 100)
+
+
+class piezo_scan_interface(ManagedResultsWindow):
+    def __init__(self):
+        super(piezo_scan_interface, self).__init__(
+            procedure_class=piezo_scan_experiment,
+            inputs=['wl_center', 'laserpower', 'piezo_frequency',
+                    'piezo_Vpp', 'piezo_Vo', 'tuning', 'n_periods',
+                    'n_acquisitions', 'smoothing', 'vertical_resolution',
+                    'vertical_offset', 'termination_response',
+                    'trigger_level', 'record_length', 'saving', 'filename'],
+            displays=['wl_center', 'piezo_frequency', 'piezo_Vpp'],
+            x_axis='Time [s]',
+            y_axis='Center [nm]',
+            directory_input=True,
+            sequencer=True,
+            sequencer_inputs=['wl_center', 'piezo_frequency', 'piezo_Vpp'])
+
+        self.setWindowTitle('Piezo Scan Resonance Tracking')
+
+    def queue(self, *, procedure=None):
+        directory = self.directory
+        if procedure is None:
+            procedure = self.make_procedure()
+
+        if not procedure.saving:
+            directory = PATH_TRASH+"\\.trash"
+        elif directory == '':
+            directory = PATH_TRASH
+
+        procedure.directory = directory
+        filename = procedure.filename.replace('.csv', '')
+        procedure.filename = filename
+
+        dirfilename = self.allocate_filename(directory, filename)
+        procedure.filename = os.path.splitext(
+            os.path.basename(dirfilename))[0]
+
+        self.queue_results(procedure, dirfilename)
+
+
+if __name__ == "__main__":
+    from pymeasure.display.Qt import QtGui
+
+    app = QtGui.QApplication(sys.argv)
+    window = piezo_scan_interface()
+    window.show()
+    sys.exit(app.exec_())
@@ -14,11 +14,10 @@ import logging
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
-from pymeasure.experiment import Procedure, Results
-from pymeasure.display.windows import ManagedWindow
+from datetime import datetime
+from pymeasure.experiment import Procedure
 
-from pymeasure.experiment.results import unique_filename
-from pymeasure.experiment import FloatParameter, IntegerParameter
+from pymeasure.experiment import FloatParameter, IntegerParameter, BooleanParameter
 
 import numpy as np
 
@@ -26,6 +25,7 @@ import numpy as np
 from ongpym.instruments.keysight.e36106a import E36106A
 from time import sleep
 
+from ..display import ManagedResultsWindow
 from ..config import ADDRESS_E36106A
 
 
@@ -38,6 +38,9 @@ class power_change_step_experiment(Procedure):
     V_max = FloatParameter('Maximum Voltage',default=10,minimum=0,maximum=100)
     V_step = FloatParameter('Voltage Stepsize',default=1,minimum=0.001,maximum=25)
     N_avg = IntegerParameter('Number of Averages per Step',default=1,minimum=1,maximum=100)
+    ramp = BooleanParameter('Ramp Mode (Output stays on)',default=False)
+    settle_tolerance = FloatParameter('Settling Tolerance',units='%',default=0.1,minimum=0.001,maximum=10)
+    settle_timeout = FloatParameter('Maximum Settling Time',units='s',default=5,minimum=0.1,maximum=600)
 
     DATA_COLUMNS = ['V set [V]', 'V [V]', 'I [mA]', 'R [Ohm]', 'P [mW]']
 
@@ -54,33 +57,44 @@ class power_change_step_experiment(Procedure):
     def execute(self):
         log.info('changing in progress.')
         Vs = np.arange(self.V_min,self.V_max,self.V_step)
-        for i,Vi in enumerate(Vs):
-            self.src.voltage_range = Vi
+        if self.ramp:
+            # output stays on, every step settles from the previous one
+            self.src.voltage_range = self.V_min
             self.src.enable()
-            sleep(0.5)
-            V_set = []
-            I_set = []
-            for _ in np.arange(self.N_avg):
-                V_set.append(self.src.voltage)
-                I_set.append(self.src.current)
-            self.src.disable()
-            V = np.average(np.array(V_set))
-            I = np.average(np.array(I_set))
-
-            data_curr = {'V set [V]':Vi,'V [V]':V, 'I [mA]':I, 'R [Ohm]':V/(I*1e-3), 'P [mW]':V*I}
-            self.emit('results',data_curr)
-            self.emit('progress',i/len(Vs)*100)
+        try:
+            for i,Vi in enumerate(Vs):
+                self.src.voltage_range = Vi
+                if self.ramp:
+                    if not self.src.wait_for_settling(tolerance=self.settle_tolerance/100,
+                                                      timeout=self.settle_timeout):
+                        log.info('Current not settled at %g V.' % Vi)
+                else:
+                    self.src.enable()
+                    sleep(0.5)
+                V, I, _, _ = self.src.measure_averaged(self.N_avg)
+                if not self.ramp:
+                    self.src.disable()
+
+                data_curr = {'V set [V]':Vi,'V [V]':V, 'I [mA]':I, 'R [Ohm]':V/(I*1e-3), 'P [mW]':V*I}
+                self.emit('results',data_curr)
+                self.emit('progress',i/len(Vs)*100)
+                if self.should_stop():
+                    break
+        finally:
+            if self.ramp:
+                self.src.disable()
 
 
 
     def shutdown(self):
+        self.src.disable()
         self.src.disconnect()
 
-class power_change_step_interface(ManagedWindow):
+class power_change_step_interface(ManagedResultsWindow):
     def __init__(self):
         super(power_change_step_interface, self).__init__(
             procedure_class=power_change_step_experiment,
-            inputs=['V_min','V_max','V_step','N_avg'],              
+            inputs=['V_min','V_max','V_step','N_avg','ramp','settle_tolerance','settle_timeout'],              
             displays=['V_min','V_max','V_step','N_avg'],            
             x_axis='P [mW]',                          
             y_axis='R [Ohm]',                          
@@ -98,13 +112,10 @@ class power_change_step_interface(ManagedWindow):
         if procedure is None:
             procedure = self.make_procedure()
 
-        filename=unique_filename(directory)      
-        print(filename)
-        
-        results = Results(procedure, filename)   #makes it possible to read and write data to and from a file
-        experiment = self.new_experiment(results)#builds a new experiment
+        filename = self.allocate_filename(
+            directory, 'DATA' + datetime.now().strftime("%Y-%m-%d"))
 
-        self.manager.queue(experiment)           #queues the experiment
+        self.queue_results(procedure, filename)
 
 
 if __name__ == "__main__":
@@ -15,18 +15,19 @@ import logging
 
 from time import sleep
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 from pymeasure.display.Qt import QtGui
-from pymeasure.display.windows import ManagedWindow
 
-from pymeasure.experiment import Procedure, Results
+from pymeasure.experiment import Procedure
 from pymeasure.experiment import (IntegerParameter, FloatParameter,
                                   BooleanParameter, ListParameter)
 from pymeasure.experiment.parameters import Parameter
 
 from ongpym.instruments.keysight.n7744c import N7744C
+from ..display import ManagedResultsWindow
+from ..display.rendering import render_plot
+from ..storage import emit_block
 from ..config import ADDRESS_N7744C, PATH_TRASH
 
 sys.modules['cloudpickle'] = None
@@ -127,21 +128,16 @@ class powermeter_basic_experiment(Procedure):
         self.emit('progress', 70)
 
         # Emit data to result
-        for i in range(len(pm_data)):
-            data = {'Time [s]': tt[i], self.DATA_COLUMNS[1]: pm_data[i]}
-            self.emit('results', data)
-            if self.should_stop():
-                break
+        emit_block(self, {'Time [s]': tt, self.DATA_COLUMNS[1]: pm_data})
         log.info('Results successfully obtained.')
         self.emit('progress', 90)
 
         if self.plotting:
             log.info('Plotting in progress.')
-            fig, ax = plt.subplots()
-            ax.plot(tt, pm_data)
-            ax.set_xlabel(self.DATA_COLUMNS[0])
-            ax.set_ylabel(self.DATA_COLUMNS[1])
-            fig.savefig(self.directory+'/'+self.filename+'_PLOT.png')
+            render_plot(self.directory+'/'+self.filename+'_PLOT.png',
+                        [{'x': tt, 'y': pm_data}],
+                        xlabel=self.DATA_COLUMNS[0],
+                        ylabel=self.DATA_COLUMNS[1])
 
         self.emit('progress', 100)
 
@@ -150,7 +146,7 @@ class powermeter_basic_experiment(Procedure):
         log.info('Shutting Down.')
 
 
-class powermeter_basic_interface(ManagedWindow):
+class powermeter_basic_interface(ManagedResultsWindow):
 
     def __init__(self):
         super(powermeter_basic_interface, self).__init__(
@@ -179,16 +175,11 @@ class powermeter_basic_interface(ManagedWindow):
         procedure.directory = directory
         filename = procedure.filename
 
-        while procedure.filename in os.listdir(directory):
-            procedure.filename = procedure.filename+'_1'
-            filename = procedure.filename
-
-        dirfilename = os.path.join(directory, filename)
-        print(dirfilename)
-        results = Results(procedure, dirfilename)
-        experiment = self.new_experiment(results)
+        dirfilename = self.allocate_filename(directory, filename)
+        procedure.filename = os.path.splitext(
+            os.path.basename(dirfilename))[0]
 
-        self.manager.queue(experiment)
+        self.queue_results(procedure, dirfilename)
 
 
 if __name__ == "__main__":
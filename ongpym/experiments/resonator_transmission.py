@@ -13,30 +13,39 @@ import sys
 
 
 import logging
-from pymeasure.display.windows import ManagedWindow
 
-from pymeasure.experiment import Procedure, Results
+from pymeasure.experiment import Procedure
 from pymeasure.experiment import (FloatParameter, BooleanParameter,
-                                  IntegerParameter)
-from pymeasure.experiment.results import unique_filename
+                                  IntegerParameter, ListParameter)
 from pymeasure.experiment.parameters import Parameter
 
 from ongpym.instruments.tektronix.mdo3052 import MDO3052
 from ongpym.instruments.toptica.topticactl import TopticaCTL
+from ongpym.display import ManagedResultsWindow
+from ongpym.display.rendering import render_plot
+from ongpym.storage import emit_block, ScaledCodes, TimeBase
+from ongpym.analysis.lorentzian import fit_lorentzians, lorentzian_curve
+from ongpym.analysis.cache import cached_fit
+from ongpym.analysis.linearization import cached_wavelength_correction
 from ongpym.config import ADDRESS_MDO3052, ADDRESS_TOPTICACTL, PATH_TRASH
+try:
+    from ongpym.config import ETALON_FSR
+except ImportError:
+    ETALON_FSR = None
 
 from scipy.signal import find_peaks
 from lmfit.models import LinearModel, LorentzianModel
-import matplotlib.pyplot as plt
 import numpy as np
 from time import sleep
+from datetime import datetime
 
 sys.modules['cloudpickle'] = None
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
 
-def fitter(x, y, double, x_original):
+@cached_fit
+def fitter(x, y, double, x_original, method='lmfit'):
     """
     Parameters
     ----------
@@ -48,6 +57,10 @@ def fitter(x, y, double, x_original):
         Is True if two peaks are given.
     x_original : TYPE
         The whole values for the x axis.
+    method : str, optional
+        'lmfit' for a least-squares fit with lmfit, 'fast' for the
+        algebraic estimate with one Gauss-Newton step of
+        :func:`fit_lorentzians`. The default is 'lmfit'.
 
     Returns
     -------
@@ -56,7 +69,12 @@ def fitter(x, y, double, x_original):
     fit : TYPE
         Fitted data points.
 
+    Fits of the same data and options are taken from the fit cache.
+
     """
+    if method == 'fast':
+        return fast_fitter(x, y, double, x_original)
+
     if double:
         peaks, _ = find_peaks(-y, distance=len(y)/2)
 
@@ -109,8 +127,42 @@ def fitter(x, y, double, x_original):
         return val, fit
 
 
+def fast_fitter(x, y, double, x_original):
+    """
+    Same as :func:`fitter`, but with the closed-form estimator of
+    :func:`fit_lorentzians` instead of lmfit.
+
+    Returns
+    -------
+    val : TYPE
+        [FSR,Q,Q2,lam,lam2,FWHM,FWHM2].
+    fit : TYPE
+        Fitted data points.
+
+    """
+    if double:
+        peaks, _ = find_peaks(-y, distance=len(y)/2)
+    else:
+        peaks, _ = find_peaks(-y, distance=len(y))
+
+    out = fit_lorentzians(x, y, x[peaks])
+    fit = lorentzian_curve(x_original, out)
+
+    lam = out['center']
+    FWHM = out['FWHM']
+    Q = lam/FWHM
+
+    if double:
+        FSR = lam[1] - lam[0]
+        val = np.array([FSR, Q[0], Q[1], lam[0], lam[1], FWHM[0], FWHM[1]])
+    else:
+        val = np.array([Q[0], lam[0], FWHM[0]])
+    return val, fit
+
+
 def fitplot(name, directory, xvalue, yvalue, wl_start, wl_stop,
-            logplot=False, fit=False, double=False, save=False):
+            logplot=False, fit=False, double=False, save=False,
+            method='lmfit'):
     """
     Parameters
     ----------
@@ -134,6 +186,9 @@ def fitplot(name, directory, xvalue, yvalue, wl_start, wl_stop,
         Is true if two peaks should be fitted. The default is False.
     save : TYPE, optional
         Is True if the plot should be saved. The default is False.
+    method : str, optional
+        Fit method of :func:`fitter`, 'lmfit' or 'fast'. The default is
+        'lmfit'.
 
     Returns
     -------
@@ -151,59 +206,44 @@ def fitplot(name, directory, xvalue, yvalue, wl_start, wl_stop,
     y_fit = yvalue[b][c]
 
     if fit or double:
-        fit_values, fit_curve = fitter(x_fit, y_fit, double, xvalue)
+        fit_values, fit_curve = fitter(x_fit, y_fit, double, xvalue,
+                                       method)
 
     if save:
-        fig, ax = plt.subplots()
-        ax.set(xlabel='Wavelength [nm]',
-               title='transmission experiment of: ' + str(name))
+        if fit or double:
+            if double:
+                label = ('FSR=' + str(int(fit_values[0]*10000)/10)
+                         + ' pm\nQ1=' + str(int(fit_values[1]*10)/10)
+                         + '\nQ2=' + str(int(fit_values[2]*10)/10)
+                         + '\nFWHM1=' + str(int(fit_values[5]*10000)/10)
+                         + ' pm \nFWHM2=' + str(int(fit_values[6]*10000)/10)
+                         + ' pm\n$\lambda$1='
+                         + str(int(fit_values[3]*100)/100) + ' nm'
+                         + ' \n$\lambda$2='
+                         + str(int(fit_values[4]*100)/100) + ' nm')
+            else:
+                label = ('Q=' + str(int(fit_values[0]*10)/10)
+                         + '\nFWHM=' + str(int(fit_values[2]*10000)/10)
+                         + ' pm\n$\lambda$='
+                         + str(int(fit_values[1]*100)/100) + ' nm')
         if logplot:
-            ax.plot(xvalue, 10.0*np.log10(yvalue), '.k')
-            ax.set_ylabel('Signal [dB]')
+            lines = [{'x': xvalue, 'y': 10.0*np.log10(yvalue), 'fmt': '.k'}]
             if fit or double:
-                if double:
-                    ax.plot(xvalue, 10*np.log10(fit_curve), '--r',
-                            label='FSR=' + str(int(fit_values[0]*10000)/10)
-                            + ' pm\nQ1=' + str(int(fit_values[1]*10)/10)
-                            + '\nQ2=' + str(int(fit_values[2]*10)/10)
-                            + '\nFWHM1=' + str(int(fit_values[5]*10000)/10)
-                            + ' pm \nFWHM2=' + str(int(fit_values[6]*10000)/10)
-                            + ' pm\n$\lambda$1='
-                            + str(int(fit_values[3]*100)/100)
-                            + ' nm'+' \n$\lambda$2='
-                            + str(int(fit_values[4]*100)/100) + ' nm')
-
-                else:
-                    ax.plot(xvalue, 10*np.log10(fit_curve), '--r',
-                            label='Q=' + str(int(fit_values[0]*10)/10)
-                            + '\nFWHM=' + str(int(fit_values[2]*10000)/10)
-                            + ' pm\n$\lambda$='
-                            + str(int(fit_values[1]*100)/100) + ' nm')
+                lines.append({'x': xvalue, 'y': 10*np.log10(fit_curve),
+                              'fmt': '--r', 'label': label})
+            ylabel = 'Signal [dB]'
         else:
-            ax.plot(xvalue, yvalue, '.k')
-            ax.set_ylabel('Voltage[V]')
+            lines = [{'x': xvalue, 'y': yvalue, 'fmt': '.k'}]
             if fit or double:
-                if double:
-                    ax.plot(xvalue, fit_curve, '--r',
-                            label='FSR=' + str(int(fit_values[0]*10000)/10)
-                            + ' pm\nQ1=' + str(int(fit_values[1]*10)/10)
-                            + '\nQ2=' + str(int(fit_values[2]*10)/10)
-                            + '\nFWHM1=' + str(int(fit_values[5]*10000)/10)
-                            + ' pm \nFWHM2=' + str(int(fit_values[6]*10000)/10)
-                            + ' pm\n$\lambda$1='
-                            + str(int(fit_values[3]*100)/100) + ' nm'
-                            + ' \n$\lambda$2='
-                            + str(int(fit_values[4]*100)/100) + ' nm')
-
-                else:
-                    ax.plot(xvalue, fit_curve, '--r',
-                            label='Q=' + str(int(fit_values[0]*10)/10)
-                            + '\nFWHM=' + str(int(fit_values[2]*10000)/10)
-                            + ' pm\n$\lambda$='
-                            + str(int(fit_values[1]*100)/100) + ' nm')
-
-        ax.legend()
-        plt.savefig(directory)
+                lines.append({'x': xvalue, 'y': fit_curve, 'fmt': '--r',
+                              'label': label})
+            ylabel = 'Voltage[V]'
+
+        # Rendered in the background, the run continues at once
+        render_plot(directory, lines, xlabel='Wavelength [nm]',
+                    ylabel=ylabel,
+                    title='transmission experiment of: ' + str(name),
+                    legend=fit or double)
 
     if fit or double:
         return fit_values, fit_curve
@@ -211,48 +251,44 @@ def fitplot(name, directory, xvalue, yvalue, wl_start, wl_stop,
         return 0, xvalue*0
 
 
-def plot_name(file):
+def fit_results(fit_values, double):
     """
     Parameters
     ----------
-    file : TYPE
-        path of the csv file.
+    fit_values : numpy.ndarray
+        Fitted values as returned by fitter.
+    double : bool
+        Is True if two peaks were fitted.
 
     Returns
     -------
-    TYPE
-        returns the same directory for the file, but now for .png data.
+    list
+        One dictionary of Q, wavelength and FWHM (and FSR) per fitted
+        peak, as recorded in the run catalog.
 
     """
-    return os.path.abspath(file[:-3] + 'png')
+    if double:
+        FSR, Q, Q2, lam, lam2, FWHM, FWHM2 = fit_values
+        return [{'Q': Q, 'wavelength': lam, 'FWHM': FWHM, 'FSR': FSR},
+                {'Q': Q2, 'wavelength': lam2, 'FWHM': FWHM2, 'FSR': FSR}]
+    Q, lam, FWHM = fit_values
+    return [{'Q': Q, 'wavelength': lam, 'FWHM': FWHM}]
 
 
-def unique(dic, filename, count):
+def plot_name(file):
     """
     Parameters
     ----------
-    dic : TYPE
-        Directrory of the file.
-    filename : TYPE
-        the filename.
-    count : TYPE
-        a integer which is added behinde the name.
+    file : TYPE
+        path of the csv file.
 
     Returns
     -------
-    file_n : TYPE
-        a unique filename in the given directory.
+    TYPE
+        returns the same directory for the file, but now for .png data.
 
     """
-    dic_n = os.path.abspath(dic)
-    file = os.path.join(dic_n, filename + '_' + str(count) + '.csv')
-    file_n = file
-    i = 0
-    while os.path.exists(file_n):
-        i += 1
-        file_n = file[:-4] + '_' + str(i) + '.csv'
-
-    return file_n
+    return os.path.splitext(os.path.abspath(file))[0] + '.png'
 
 
 def nosampl_validator(nofsampl):
@@ -287,9 +323,14 @@ class transmission_experiment(Procedure):
 
     fit_data = BooleanParameter('fit one peak', default=False)
     fit_double = BooleanParameter('fit two peaks', default=False)
+    fit_method = ListParameter('fit method', choices=['lmfit', 'fast'],
+                               default='lmfit')
 
     averig = BooleanParameter('average', default=False)
 
+    linearize = BooleanParameter('linearize wavelength with CH2',
+                                 default=False)
+
     avnom = IntegerParameter('Average cycles', default=5)
 
     dicforplot = Parameter('', default='empty')
@@ -298,6 +339,7 @@ class transmission_experiment(Procedure):
 
     DATA_COLUMNS = ['Wavelength', 'Voltage', 'Triggervoltage',
                     'fit', 'time_orig']
+    FIT_UNITS = {'wavelength': 'nm', 'FWHM': 'nm', 'FSR': 'nm'}
 
     def startup(self):
         """
@@ -380,8 +422,9 @@ class transmission_experiment(Procedure):
         new_rec = nofsampl_new*1000
         self.emit('progress', 41.0)
 
-        d = np.zeros(new_rec)
-        trig = np.zeros(new_rec)
+        # The codes of all repetitions are summed up losslessly
+        d = np.zeros(new_rec, dtype=np.int32)
+        trig = np.zeros(new_rec, dtype=np.int32)
 
         for i in range(rep):
             log.info('started '+str(i+1)+'. repetition')
@@ -411,39 +454,49 @@ class transmission_experiment(Procedure):
 
         self.emit('progress', 99.0)
         log.info('scaling of data')
-        tstart, tscale, rec = self.osci.get_timescale()
-        t = np.linspace(tstart, tstart+rec*tscale, rec)
-        wavelength = t*self.speed+self.wl_start
+        t = self.osci.get_timebase(len(d))
         vscale, voff, vpos = self.osci.get_vscale('CH1')
         trscale, troff, trpos = self.osci.get_vscale('CH2')
 
-        scaled = (d/rep-vpos)*vscale-voff
-        trscaled = ((trig/rep-trpos)*trscale-troff)
+        # Scale of the mean of the summed codes
+        scaled = ScaledCodes(d, vscale/rep, vpos*rep, voff)
+        trscaled = ScaledCodes(trig, trscale/rep, trpos*rep, troff)
+
+        if self.linearize:
+            # Etalon fringes or the trigger on CH2 correct the wavelength
+            correction = cached_wavelength_correction(
+                np.asarray(t), np.asarray(trscaled), self.wl_start,
+                self.wl_stop, self.speed, ETALON_FSR)
+            wavelength = correction(np.asarray(t))
+        else:
+            wavelength = TimeBase(t.x0*self.speed+self.wl_start,
+                                  t.dx*self.speed, len(t))
 
         log.info('plotting and postprocessing of data started')
 
-        fit_values, fit_curve = fitplot(self.name, self.dicforplot, wavelength,
-                                        scaled, self.wl_start, self.wl_stop,
+        fit_values, fit_curve = fitplot(self.name, self.dicforplot,
+                                        np.asarray(wavelength),
+                                        np.asarray(scaled),
+                                        self.wl_start, self.wl_stop,
                                         logplot=self.yscalelog,
                                         fit=self.fit_data,
                                         double=self.fit_double,
-                                        save=self.saveplot)
+                                        save=self.saveplot,
+                                        method=self.fit_method)
 
         log.info('plotting and postprocessing done')
+        if self.fit_data or self.fit_double:
+            # Recorded in the run catalog by the interface
+            self.fit_results = fit_results(fit_values, self.fit_double)
 
         log.info('emiting data to the file')
-        for i in range(len(scaled)):
-            data = {
-                'Wavelength': wavelength[i],
-                'Voltage': scaled[i],
-                'Triggervoltage': trscaled[i],
-                'fit': fit_curve[i],
-                'time_orig': t[i]
-            }
-            self.emit('results', data)
-
-            if self.should_stop():
-                break
+        emit_block(self, {
+            'Wavelength': wavelength,
+            'Voltage': scaled,
+            'Triggervoltage': trscaled,
+            'fit': fit_curve,
+            'time_orig': t
+        })
         log.info('emitting data done')
 
         self.emit('progress', 100.0)
@@ -460,15 +513,17 @@ class transmission_experiment(Procedure):
         self.laser.close()
 
 
-class transmission_interface(ManagedWindow):
+class transmission_interface(ManagedResultsWindow):
+    # Time traces are stored as raw oscilloscope codes
+    results_backend = 'raw'
 
     def __init__(self):
         super(transmission_interface, self).__init__(
             procedure_class=transmission_experiment,
             inputs=['wl_start', 'wl_stop', 'speed', 'laserpower',
-                    'averig', 'avnom', 'saveplot', 'yscalelog',
-                    'fit_data', 'fit_double', 'nofsampl', 'auto_scale',
-                    'vertic', 'name'],
+                    'averig', 'avnom', 'linearize', 'saveplot',
+                    'yscalelog', 'fit_data', 'fit_double', 'fit_method',
+                    'nofsampl', 'auto_scale', 'vertic', 'name'],
             displays=['wl_start', 'wl_stop', 'speed', 'nofsampl'],
             x_axis='Wavelength',
             y_axis='Voltage',
@@ -504,15 +559,10 @@ class transmission_interface(ManagedWindow):
             directory = PATH_TRASH
 
         if procedure.name == 'noname':
-            filename = unique_filename(directory,
-                                       suffix='_'+str(self.runner),
-                                       datetimeformat="%Y_%m_%d",
-                                       index=True)
-
+            prefix = 'DATA' + datetime.now().strftime("%Y_%m_%d")
         else:
-            filename = unique(directory, str(procedure.name), str(self.runner))
-
-        plotname = plot_name(filename)
+            prefix = str(procedure.name)
+        prefix += '_' + str(self.runner)
         self.runner += 1
 
         if procedure.wl_start < procedure.wl_stop:
@@ -527,11 +577,9 @@ class transmission_interface(ManagedWindow):
             except RuntimeError:
                 log.info('Oscilloscope is not connected')
                 return
-            procedure.dicforplot = plotname
-            results = Results(procedure, filename)
-            experiment = self.new_experiment(results)
-
-            self.manager.queue(experiment)
+            filename = self.allocate_filename(directory, prefix)
+            procedure.dicforplot = plot_name(filename)
+            self.queue_results(procedure, filename)
         else:
             log.info('start wavelangth must be smaller than stop wavelength')
 
@@ -13,21 +13,21 @@ import sys
 import logging
 
 from time import sleep
-import matplotlib.pyplot as plt
 
 from pymeasure.display.Qt import QtGui
-from pymeasure.display.windows import ManagedWindow
 
-from pymeasure.experiment import Procedure, Results
+from pymeasure.experiment import Procedure
 from pymeasure.experiment import (FloatParameter, BooleanParameter,
                                   ListParameter)
 from pymeasure.experiment.parameters import Parameter
 from pymeasure.log import console_log
 
-from pymeasure.experiment.results import unique_filename
 
 from ongpym.instruments.keysight.n7744c import N7744C
 from ongpym.instruments.keysight.n7776c import N7776C
+from ..display import ManagedResultsWindow
+from ..display.rendering import render_plot
+from ..storage import emit_block
 from ..config import ADDRESS_N7744C, ADDRESS_N7776C, PATH_TRASH
 
 
@@ -161,22 +161,17 @@ class swept_transmission_experiment(Procedure):
         wl_data = self.laser.get_wl_data()
         self.emit('progress', 70)
         # Emit data to result
-        for i in range(len(pm_data)):
-            data = {'Wavelength [nm]': wl_data[i],
-                    self.DATA_COLUMNS[1]: pm_data[i]}
-            self.emit('results', data)
-            if self.should_stop():
-                break
+        emit_block(self, {'Wavelength [nm]': wl_data,
+                          self.DATA_COLUMNS[1]: pm_data})
         log.info('Results successfully obtained.')
         self.emit('progress', 90)
 
         if self.plotting:
             log.info('Plotting in progress.')
-            fig, ax = plt.subplots()
-            ax.plot(wl_data, pm_data)
-            ax.set_xlabel(self.DATA_COLUMNS[0])
-            ax.set_ylabel(self.DATA_COLUMNS[1])
-            fig.savefig(self.directory+'/'+self.filename+'_PLOT.png')
+            render_plot(self.directory+'/'+self.filename+'_PLOT.png',
+                        [{'x': wl_data, 'y': pm_data}],
+                        xlabel=self.DATA_COLUMNS[0],
+                        ylabel=self.DATA_COLUMNS[1])
 
         self.emit('progress', 100)
 
@@ -187,7 +182,7 @@ class swept_transmission_experiment(Procedure):
         log.info('Shutting Down.')
 
 
-class swept_transmission_interface(ManagedWindow):
+class swept_transmission_interface(ManagedResultsWindow):
     def __init__(self):
         super(swept_transmission_interface, self).__init__(
             procedure_class=swept_transmission_experiment,
@@ -219,19 +214,11 @@ class swept_transmission_interface(ManagedWindow):
         filename = procedure.filename.replace('.csv', '')
         procedure.filename = filename
 
-        while (procedure.filename+'.csv') in os.listdir(directory):
-            log.info('File already exists. Giving unique filename.')
-            procedure.filename = \
-                unique_filename(directory,
-                                prefix=filename.replace('.csv', '')+'_')
-            filename = procedure.filename
-
-        dirfilename = os.path.join(directory, filename)
-
-        results = Results(procedure, dirfilename.replace('.csv', '')+'.csv')
-        experiment = self.new_experiment(results)
+        dirfilename = self.allocate_filename(directory, filename)
+        procedure.filename = os.path.splitext(
+            os.path.basename(dirfilename))[0]
 
-        self.manager.queue(experiment)
+        self.queue_results(procedure, dirfilename)
 
 
 if __name__ == "__main__":
@@ -22,18 +22,18 @@ import matplotlib.pyplot as plt
 
 
 from pymeasure.display.Qt import QtGui
-from pymeasure.display.windows import ManagedWindow
 from pymeasure.display import Plotter
 
-from pymeasure.experiment import Procedure, Results, Worker
+from pymeasure.experiment import Procedure, Worker
 from pymeasure.experiment import IntegerParameter, FloatParameter,BooleanParameter,IntegerParameter, ListParameter
 from pymeasure.experiment.parameters import Parameter
 from pymeasure.log import console_log
-from pymeasure.experiment.results import unique_filename
 
 from ..instruments.tektronix.mdo3052 import MDO3052
 from ..instruments.keysight.e36106a import E36106A
 
+from ..display import ManagedResultsWindow
+from ..storage import emit_block, ScaledCodes
 from ..config import ADDRESS_E36106A, ADDRESS_MDO3052, PATH_TRASH
 
 HORIZONTAL_SCALES = np.array([[1*i,2*i,4*i] for i in [1e-6,1e-5,1e-4,1e-3,1e-2,1e-1,1e0,1e1,1e2,1e3]]).flatten()
@@ -173,32 +173,20 @@ class voltage_sequence_time_domain_experiment(Procedure):
         
         log.info('Data Processing')
         record_length = self.osc.acquirereclen
-        response = self.osc.getwaveform(stop=record_length,channel=self.response_channel)
+        # The codes are rescaled to volts by the results, raw results store them unscaled
+        response = self.osc.get_scaled_waveform(stop=record_length,channel=self.response_channel)
         if not self.signal_channel == 'n/a':
-            signal = self.osc.getwaveform(stop=record_length,channel=self.signal_channel)
+            signal = self.osc.get_scaled_waveform(stop=record_length,channel=self.signal_channel)
         else:
-            signal = np.zeros_like(response)
+            signal = ScaledCodes(np.zeros_like(response.codes),0)
             
-        #Rescaling to correct voltage levels
-        s_scale,s_off,s_pos=self.osc.get_vscale(self.signal_channel)
-        r_scale,r_off,r_pos=self.osc.get_vscale(self.response_channel)
-    
-        
-        signal = (signal-s_pos)*s_scale-s_off
-        response= (response-r_pos)*r_scale-r_off
-            
-        t0,tscale,record_length = tstart,tscale,rec=self.osc.get_timescale()
-        time=np.linspace(t0,t0+rec*tscale,rec)
+        time = self.osc.get_timebase(len(response))
         
         self.emit('progress',80)
         log.info('Emitting Data')
-        for i in range(len(time)):
-            data = {'Time [s]': time[i],
-                    'Response [V]': response[i],
-                    'Signal [V]': signal[i]}
-            self.emit('results', data)
-            if self.should_stop():
-                break
+        emit_block(self, {'Time [s]': time,
+                          'Response [V]': response,
+                          'Signal [V]': signal})
         log.info('Data Emitted')
         self.emit('progress',90)
         
@@ -211,7 +199,10 @@ class voltage_sequence_time_domain_experiment(Procedure):
         self.emit('progress',100)
         
     
-class voltage_sequence_time_domain_interface(ManagedWindow):
+class voltage_sequence_time_domain_interface(ManagedResultsWindow):
+    # Time traces are stored as raw oscilloscope codes
+    results_backend = 'raw'
+
     def __init__(self):
         super(voltage_sequence_time_domain_interface, self).__init__(
             procedure_class=voltage_sequence_time_domain_experiment,
@@ -239,16 +230,9 @@ class voltage_sequence_time_domain_interface(ManagedWindow):
         procedure.filename = filename
         
         
-        while (procedure.filename+'.csv') in os.listdir(directory):
-            log.info('File already exists. Giving unique filename.')
-            procedure.filename = unique_filename(directory,prefix=filename.replace('.csv','')+'_')
-            filename = procedure.filename
-            
-        dirfilename = os.path.join(directory,filename)
-
-        results = Results(procedure,dirfilename.replace('.csv','')+'.csv')
-        experiment = self.new_experiment(results)
+        dirfilename = self.allocate_filename(directory,filename)
+        procedure.filename = os.path.splitext(os.path.basename(dirfilename))[0]
 
-        self.manager.queue(experiment)
+        self.queue_results(procedure, dirfilename)
 
         
@@ -15,18 +15,22 @@ import logging
 from time import sleep
 import numpy as np
 
-from pymeasure.display.windows import ManagedWindow
 
-from pymeasure.experiment import Procedure, Results
+from pymeasure.experiment import Procedure
 from pymeasure.experiment import (FloatParameter, BooleanParameter,
                                   ListParameter)
 from pymeasure.experiment.parameters import Parameter
-from pymeasure.experiment.results import unique_filename
 
 from ..instruments.tektronix.mdo3052 import MDO3052
-from ..instruments.keysight.e36106a import E36106A
+from ..instruments.keysight.supply_bank import E36106ABank
 
+from ..display import ManagedResultsWindow
+from ..storage import emit_block, ScaledCodes
 from ..config import ADDRESS_E36106A, ADDRESS_MDO3052, PATH_TRASH
+try:
+    from ..config import ADDRESSES_E36106A
+except ImportError:
+    ADDRESSES_E36106A = [ADDRESS_E36106A]
 
 sys.modules['cloudpickle'] = None
 log = logging.getLogger(__name__)
@@ -39,9 +43,12 @@ HORIZONTAL_SCALES = np.array([[1*i, 2*i, 4*i]
 
 class voltage_sequence_time_domain_experiment(Procedure):
     # Parameter definition
+    supplies = Parameter('Supplies', default='0')
     voltage_sequence = Parameter('Voltage Sequence', default='0,1,0')
     dwell_time = FloatParameter(name='Dwell Time', minimum=0,
                                 maximum=2000, default=2, units='s')
+    hardware_timing = BooleanParameter('Hardware Timed Sequence',
+                                       default=False)
 
     response_channel = ListParameter(name='Response Channel',
                                      choices=['CH1', 'CH2'], default='CH1')
@@ -75,23 +82,53 @@ class voltage_sequence_time_domain_experiment(Procedure):
 
     DATA_COLUMNS = ['Time [s]', 'Response [V]', 'Signal [V]']
 
+    def voltage_array(self):
+        """ Returns the voltage sequence as array with one row per supply.
+        Sequences of different supplies are separated by ';', a single
+        sequence is applied to all supplies.
+        """
+        try:
+            rows = [np.asarray(row.split(','), dtype=np.float64)
+                    for row in str(self.voltage_sequence).split(';')]
+        except ValueError:
+            raise ValueError("The voltage_sequence '%s' is no list of "
+                             "numbers." % self.voltage_sequence)
+        if len(set(len(row) for row in rows)) > 1:
+            raise ValueError('The sequences of voltage_sequence have '
+                             'different lengths %s.' % (
+                                 [len(row) for row in rows],))
+        if len(rows) not in (1, len(self.src)):
+            raise ValueError('voltage_sequence has %d sequences, but '
+                             'supplies selects %d supplies; give one '
+                             'sequence or one per supply.' % (
+                                 len(rows), len(self.src)))
+        return np.broadcast_to(np.array(rows),
+                               (len(self.src), len(rows[0])))
+
     def startup(self):
         log.info('Startup.')
-        self.src = E36106A(ADDRESS_E36106A)
+        # Supplies are given as comma separated indices into
+        # ADDRESSES_E36106A
+        channels = [int(i) for i in str(self.supplies).split(',')]
+        self.src = E36106ABank([ADDRESSES_E36106A[i] for i in channels])
         log.info('Connection to E36106A established.')
         self.osc = MDO3052(ADDRESS_MDO3052)
         log.info('Connection to MDO3052 established.')
 
         log.info('Reset Voltage Source')
         self.src.reset()
+
+        voltage_array = self.voltage_array()
+        if self.hardware_timing:
+            log.info('Upload Voltage Sequence')
+            self.src.upload_sequence(voltage_array, self.dwell_time)
+
         log.info('Setup Oscilloscope')
         self.osc.reset()
 
         self.osc.write('sel:ch2 on')
 
-        voltage_array = np.asarray(self.voltage_sequence.split(','),
-                                   dtype=np.float64)
-        T_min = len(voltage_array)*self.dwell_time
+        T_min = voltage_array.shape[1]*self.dwell_time
         h_scale_min = T_min/10.
         for i, _ in enumerate(HORIZONTAL_SCALES):
             if HORIZONTAL_SCALES[i] < h_scale_min:
@@ -119,7 +156,7 @@ class voltage_sequence_time_domain_experiment(Procedure):
             self.ch_signal.termination = 'FIF'
             if self.termination_signal == '1 MOhm':
                 self.ch_signal.termination = 'MEG'
-            self.ch_signal.scale = max(voltage_array)/4.
+            self.ch_signal.scale = voltage_array.max()/4.
             self.ch_signal.position = 0
         else:
             self.ch_signal = None
@@ -164,16 +201,28 @@ class voltage_sequence_time_domain_experiment(Procedure):
         log.info('Measurement in progress.')
         self.osc.acqu_state = 1
         self.src.enable()
-        voltage_array = np.asarray(self.voltage_sequence.split(','),
-                                   dtype=np.float64)
+        voltage_array = self.voltage_array()
         while self.osc.triggerstate != 'REA':
             log.info('Wait for Trigger to be Ready.')
             sleep(2)
 
         self.osc.force_trig()
-        for i, Vi in enumerate(voltage_array):
-            self.src.voltage_range = Vi
-            sleep(self.dwell_time)
+        if self.hardware_timing:
+            self.src.start_sequence()
+            try:
+                while self.src.sequence_running():
+                    if self.should_stop():
+                        self.src.abort_sequence()
+                        break
+                    sleep(0.05)
+            except Exception:
+                # Leave no supply in list mode
+                self.src.abort_sequence()
+                raise
+        else:
+            for Vi in voltage_array.T:
+                self.src.set_voltages(Vi)
+                sleep(self.dwell_time)
         self.src.disable()
 
         while self.osc.acqu_state == 1.0:
@@ -184,33 +233,23 @@ class voltage_sequence_time_domain_experiment(Procedure):
         log.info('Measurement Completed.')
         log.info('Data Processing')
         record_length = self.osc.acquirereclen
-        response = self.osc.getwaveform(stop=record_length,
-                                        channel=self.response_channel)
+        # The codes are rescaled to volts by the results, raw results
+        # store them unscaled
+        response = self.osc.get_scaled_waveform(
+            stop=record_length, channel=self.response_channel)
         if not self.signal_channel == 'n/a':
-            signal = self.osc.getwaveform(stop=record_length,
-                                          channel=self.signal_channel)
+            signal = self.osc.get_scaled_waveform(
+                stop=record_length, channel=self.signal_channel)
         else:
-            signal = np.zeros_like(response)
-
-        # Rescaling to correct voltage levels
-        s_scale, s_off, s_pos = self.osc.get_vscale(self.signal_channel)
-        r_scale, r_off, r_pos = self.osc.get_vscale(self.response_channel)
+            signal = ScaledCodes(np.zeros_like(response.codes), 0)
 
-        signal = (signal-s_pos)*s_scale-s_off
-        response = (response-r_pos)*r_scale-r_off
-
-        t0, tscale, record_length = self.osc.get_timescale()
-        time = np.linspace(t0, t0+record_length*tscale, record_length)
+        time = self.osc.get_timebase(len(response))
 
         self.emit('progress', 80)
         log.info('Emitting Data')
-        for i in range(len(time)):
-            data = {'Time [s]': time[i],
-                    'Response [V]': response[i],
-                    'Signal [V]': signal[i]}
-            self.emit('results', data)
-            if self.should_stop():
-                break
+        emit_block(self, {'Time [s]': time,
+                          'Response [V]': response,
+                          'Signal [V]': signal})
         log.info('Data Emitted')
         self.emit('progress', 90)
 
@@ -223,12 +262,16 @@ class voltage_sequence_time_domain_experiment(Procedure):
         self.emit('progress', 100)
 
 
-class voltage_sequence_time_domain_interface(ManagedWindow):
+class voltage_sequence_time_domain_interface(ManagedResultsWindow):
+    # Time traces are stored as raw oscilloscope codes
+    results_backend = 'raw'
+
     def __init__(self):
         super(voltage_sequence_time_domain_interface, self).__init__(
             procedure_class=voltage_sequence_time_domain_experiment,
-            inputs=['voltage_sequence', 'dwell_time', 'response_channel',
-                    'signal_channel', 'vertical_resolution', 'vertical_offset',
+            inputs=['supplies', 'voltage_sequence', 'dwell_time',
+                    'hardware_timing', 'response_channel', 'signal_channel',
+                    'vertical_resolution', 'vertical_offset',
                     'termination_response', 'termination_signal',
                     'record_length', 'acquisition_mode', 'saving', 'filename'],
             displays=['voltage_sequence', 'dwell_time'],
@@ -253,16 +296,8 @@ class voltage_sequence_time_domain_interface(ManagedWindow):
         filename = procedure.filename.replace('.csv', '')
         procedure.filename = filename
 
-        while (procedure.filename+'.csv') in os.listdir(directory):
-            log.info('File already exists. Giving unique filename.')
-            procedure.filename = \
-                unique_filename(directory,
-                                prefix=filename.replace('.csv', '')+'_')
-            filename = procedure.filename
-
-        dirfilename = os.path.join(directory, filename)
-
-        results = Results(procedure, dirfilename.replace('.csv', '')+'.csv')
-        experiment = self.new_experiment(results)
+        dirfilename = self.allocate_filename(directory, filename)
+        procedure.filename = os.path.splitext(
+            os.path.basename(dirfilename))[0]
 
-        self.manager.queue(experiment)
+        self.queue_results(procedure, dirfilename)
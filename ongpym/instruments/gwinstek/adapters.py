@@ -1,12 +1,164 @@
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+
 from pymeasure.adapters import SerialAdapter
 
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
 
 class GWInstekAdapter(SerialAdapter):
+    """ Provides a :class:`SerialAdapter` for GW Instek instruments, which
+    terminates every command itself and reads replies up to the read
+    termination. Within :meth:`buffered`, setting commands are collected and
+    sent as one line, so that several settings cost a single transfer. With
+    `background=True` the lines are written by a writer thread and the
+    caller continues at once; every read first waits for the pending
+    writes and raises the first error of them.
+
+    :param port: A string representing the serial port
+    :param baudrate: Baud rate of the serial connection
+    :param timeout: Read timeout in seconds
+    :param write_termination: Termination appended to every line written
+    :param read_termination: Termination of the replies of the instrument
+    :param max_line_length: Maximum length of one coalesced line in
+                            characters; longer batches are split.
+    """
+
+    def __init__(self, port, baudrate=9600, timeout=2,
+                 write_termination='\n', read_termination='\n',
+                 max_line_length=256, **kwargs):
+        super(GWInstekAdapter, self).__init__(
+            port, baudrate=baudrate, timeout=timeout, **kwargs)
+        self.write_termination = write_termination
+        self.read_termination = read_termination
+        self.max_line_length = max_line_length
+        self._buffer = None
+        self._background = 0
+        self._queue = None
+        self._write_error = None
+
+    @contextmanager
+    def buffered(self, background=False):
+        """ Context manager collecting the commands written inside it. They
+        are sent joined to one line when the context is left or right before
+        the next query, whichever comes first. Contexts may be nested; only
+        the outermost one sends.
+
+        :param background: Whether the lines, and binary blocks written
+                           inside the context, are handed to the writer
+                           thread instead of being written before the
+                           context returns.
+        """
+        if background:
+            self._background += 1
+        try:
+            if self._buffer is not None:
+                yield self
+                return
+            self._buffer = []
+            try:
+                yield self
+            finally:
+                commands, self._buffer = self._buffer, None
+                self._send(commands)
+        finally:
+            if background:
+                self._background -= 1
+
+    def _writer(self):
+        while True:
+            data = self._queue.get()
+            try:
+                self.connection.write(data)
+            except Exception as e:
+                log.error('GWInstekAdapter: background write failed: %s' % e)
+                if self._write_error is None:
+                    self._write_error = e
+            finally:
+                self._queue.task_done()
+
+    def _write_bytes(self, data):
+        """ Writes `data` to the port, in the writer thread inside a
+        background :meth:`buffered` context.
+        """
+        if not self._background:
+            self.flush()
+            self.connection.write(data)
+            return
+        if self._queue is None:
+            self._queue = queue.Queue()
+            threading.Thread(target=self._writer, name='GWInstekWriter',
+                             daemon=True).start()
+        self._queue.put(data)
+
+    def flush(self):
+        """ Waits until the writer thread has written all pending data and
+        raises the first error of these writes.
+        """
+        if self._queue is not None:
+            self._queue.join()
+        if self._write_error is not None:
+            error, self._write_error = self._write_error, None
+            raise error
+
+    def _send(self, commands):
+        """ Writes the commands joined as compound SCPI lines. """
+        line = ''
+        for command in commands:
+            if line and len(line) + len(command) + 2 > self.max_line_length:
+                self._write_line(line)
+                line = ''
+            line = command if not line else line + ';:' + command
+        if line:
+            self._write_line(line)
+
+    def _write_line(self, line):
+        self._write_bytes((line + self.write_termination).encode())
+
+    def write(self, command):
+        """ Writes a command to the instrument. Inside :meth:`buffered`
+        setting commands are only queued, while queries send the queue
+        together with the query.
+
+        :param command: SCPI command string to be sent to the instrument
+        """
+        command = command.strip()
+        if self._buffer is None:
+            self._write_line(command)
+            return
+        self._buffer.append(command)
+        if '?' in command:
+            commands, self._buffer = self._buffer, []
+            self._send(commands)
+
+    def write_binary_block(self, command, data):
+        """ Writes a command followed by `data` as IEEE 488.2 definite
+        length block (#<n><length><bytes>). Queued commands are sent first,
+        since a binary block cannot be part of a compound line.
+
+        :param command: SCPI command string preceding the block
+        :param data: Bytes of the block
+        """
+        if self._buffer:
+            commands, self._buffer = self._buffer, []
+            self._send(commands)
+        length = str(len(data))
+        header = "#%d%s" % (len(length), length)
+        self._write_bytes(command.encode() + header.encode() + data
+                          + self.write_termination.encode())
+
     def read(self):
-        """ Reads until the buffer is empty and returns the resulting
-        ASCII respone
+        """ Reads one reply up to the read termination and returns the
+        resulting ASCII response
 
         :returns: String ASCII response of the instrument.
         """
-        # return b"\n".join(self.connection.readline()).decode('ascii')
-        return self.connection.readline().decode()
+        self.flush()
+        termination = self.read_termination.encode()
+        reply = self.connection.read_until(termination)
+        if not reply.endswith(termination):
+            log.warning('GWInstekAdapter: read timed out after %r.' % reply)
+        return reply.decode().rstrip(self.read_termination)
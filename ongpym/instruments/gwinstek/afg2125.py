@@ -1,52 +1,133 @@
 import logging
+from contextlib import contextmanager
 from pymeasure.instruments import Instrument
 from .adapters import GWInstekAdapter
 from numpy import inf as npinf
+import numpy as np
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
 
 class AFG2125(Instrument):
-    def __init__(self, port, **kwargs):
+    def __init__(self, port, baudrate=9600, timeout=2, **kwargs):
         super(AFG2125, self).__init__(
-            GWInstekAdapter(port), "GW Instek AFG-2125 Function Generator",
-            **kwargs)
+            GWInstekAdapter(port, baudrate=baudrate, timeout=timeout),
+            "GW Instek AFG-2125 Function Generator", **kwargs)
 
-    signal = Instrument.control("SOUR:FUNC?\n", "SOUR:FUNC %s\n",
+    @contextmanager
+    def batch(self, check_errors=True, background=False):
+        """ Context manager sending all settings made inside it as one
+        line, without waiting for the instrument in between. The error
+        queue is checked once afterwards instead of after every setting.
+
+        With `background=True` the line and any waveform uploaded inside
+        the context are written by the writer thread of the adapter and the
+        context returns at once. The error check is then deferred: call
+        :meth:`check_errors` later, which waits for the pending writes.
+
+        .. code-block:: python
+
+            with fg.batch(background=True):
+                fg.frequency = 1e3
+                fg.amplitude = 1
+                fg.signal = 'SQU'
+            ...  # set up other instruments meanwhile
+            fg.check_errors()
+        """
+        with self.adapter.buffered(background=background):
+            yield self
+        if check_errors and not background:
+            self.check_errors()
+
+    def check_errors(self):
+        """ Reads all errors from the error queue, logs them and returns
+        them as list of strings.
+        """
+        errors = []
+        while True:
+            err = self.values("SYST:ERR?")
+            try:
+                code = int(float(err[0]))
+            except (ValueError, IndexError):
+                log.error("GW Instek AFG-2125: unreadable error %s" % err)
+                break
+            if code == 0:
+                break
+            errmsg = "GW Instek AFG-2125: %s: %s" % (code, err[-1])
+            log.error(errmsg)
+            errors.append(errmsg)
+        return errors
+
+    ARB_POINTS_MAX = 4096
+    ARB_CODE_MAX = 511
+
+    def upload_waveform(self, waveform, start=0, byte_order='>'):
+        """ Uploads an arbitrary waveform into the volatile memory in one
+        binary transfer and selects it as output signal. The waveform is
+        scaled to the full DAC range, so that its minimum and maximum map to
+        the output amplitude set with `amplitude` and `offset`.
+
+        :param waveform: Samples of one period, at most ARB_POINTS_MAX.
+        :param start: Start address in the volatile memory.
+        :param byte_order: Byte order of the 16 bit DAC codes, '>' for big
+                           endian or '<' for little endian.
+        :returns: Array of the uploaded DAC codes.
+        """
+        waveform = np.asarray(waveform, dtype=float).ravel()
+        if not 2 <= len(waveform) <= self.ARB_POINTS_MAX - start:
+            raise ValueError("GW Instek AFG-2125: a waveform holds 2 to %d "
+                             "points." % (self.ARB_POINTS_MAX - start))
+        if not np.all(np.isfinite(waveform)):
+            raise ValueError("GW Instek AFG-2125: waveform is not finite.")
+
+        center = (waveform.max() + waveform.min())/2
+        span = (waveform.max() - waveform.min())/2
+        codes = np.zeros(len(waveform))
+        if span > 0:
+            codes = np.round((waveform - center)/span*self.ARB_CODE_MAX)
+        codes = codes.astype(byte_order + 'i2')
+
+        self.adapter.write_binary_block("DATA:DAC VOLATILE,%d," % start,
+                                        codes.tobytes())
+        self.write("SOUR:ARB:OUTP %d,%d" % (start, len(codes)))
+        self.signal = 'USER'
+        return codes
+
+    signal = Instrument.control("SOUR:FUNC?", "SOUR:FUNC %s",
                                 """ Signal type selected to apply.""")
 
-    frequency = Instrument.control("SOUR:FREQ?\n", "SOUR:FREQ %f\n",
+    frequency = Instrument.control("SOUR:FREQ?", "SOUR:FREQ %f",
                                    """ Frequency of the output.""")
 
-    amplitude = Instrument.control("SOUR:AMPL?\n", "SOUR:AMPL %f\n",
+    amplitude = Instrument.control("SOUR:AMPL?", "SOUR:AMPL %f",
                                    """ Peak-to-peak amplitude of the output. \
                                    Maximum is dependent by the termination \
                                    setting.""")
 
-    offset = Instrument.control("SOUR:DCO?\n", "SOUR:DCO %f\n",
+    offset = Instrument.control("SOUR:DCO?", "SOUR:DCO %f",
                                 """ DC Offset (in Volts) of the output. \
                                 Maximum is dependent on the termination \
                                 setting·""")
 
-    duty_cycle = Instrument.control("SOUR:SQU:DCYC?\n", "SOUR:SQU:DCYC %f\n",
+    duty_cycle = Instrument.control("SOUR:SQU:DCYC?", "SOUR:SQU:DCYC %f",
                                     """ Duty Cycle of the square signal. \
                                     This parameter has no effect if a signal \
                                     other than the square is selected.""")
 
-    symmetry = Instrument.control("SOUR:RAMP:SYMM?\n", "SOUR:RAMP:SYMM %f\n",
+    symmetry = Instrument.control("SOUR:RAMP:SYMM?", "SOUR:RAMP:SYMM %f",
                                   """ Symmetry of the ramp signal. \
                                   This parameter has no effect if a signal \
                                   other than the ramp is selected.""")
 
     high_impedance = \
-        Instrument.control("OUTP:LOAD?\n", "OUTP:LOAD %s\n",
+        Instrument.control("OUTP:LOAD?", "OUTP:LOAD %s",
                            """ State of the impedance setting of the AFG. \
                            True = High Impedance, False = 50 Ohms. """,
                            get_process=lambda v: bool(['DEF', npinf].index(v)),
                            set_process=lambda v: ['DEF', 'INF'][int(v)])
 
-    output = Instrument.control("OUTP?\n", "OUTP %s\n",
+    output = Instrument.control("OUTP?", "OUTP %s",
                                 """ Output state of the AFG (True/False).""",
                                 get_process=lambda v: bool(v),
                                 set_process=lambda v: ['OFF', 'ON'][int(v)])
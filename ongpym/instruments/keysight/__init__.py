@@ -8,6 +8,7 @@ Created on Wed May 12 10:12:52 2021
 
 from .n7744c import N7744C
 from .e36106a import E36106A
+from .supply_bank import E36106ABank
 from .n7776c import N7776C
 
 
@@ -5,11 +5,13 @@ log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
 from pymeasure.instruments import Instrument
-from pymeasure.instruments.validators import truncated_range
+from pymeasure.instruments.validators import (truncated_range,
+                                              strict_discrete_set)
 
 from pymeasure.adapters import VISAAdapter
 from pymeasure.adapters import VXI11Adapter
-from time import sleep
+from time import sleep, time
+import numpy as np
 
 class E36106A(Instrument):
     """ Represents the Keysight E36106A Power supply 
@@ -48,6 +50,74 @@ class E36106A(Instrument):
         """ Reads a DC voltage measurement in Volts. """
      )
     
+    ###############
+    # Digitizer   #
+    ###############
+    sweep_points = Instrument.control(
+        ":SENS:SWE:POIN?", ":SENS:SWE:POIN %d",
+        """ An integer property that controls the number of samples the
+        digitizer acquires for each voltage and current measurement. """,
+        validator=truncated_range,
+        values=[1, 4096],
+        cast=int
+    )
+
+    sweep_interval = Instrument.control(
+        ":SENS:SWE:TINT?", ":SENS:SWE:TINT %g",
+        """ A floating point property that controls the time between two
+        digitizer samples in seconds. """
+    )
+
+    voltage_current = Instrument.measurement(":MEAS:VOLT?;:FETC:CURR?",
+        """ Reads voltage and current of the same digitizer record as
+        list [V, I] in one query. """,
+        separator=';'
+    )
+
+    def measure_averaged(self, N_avg=1):
+        """ Acquires one digitizer record of `N_avg` samples of voltage and
+        current and reads both arrays back in one query.
+
+        :param N_avg: Number of samples to average.
+        :returns: Tuple (V, I, V_std, I_std) of the averaged voltage and
+                  current and their standard deviations.
+        """
+        if N_avg != self._sweep_points:
+            self.sweep_points = N_avg
+            self._sweep_points = N_avg
+        reply = self.ask(":MEAS:ARR:VOLT?;:FETC:ARR:CURR?")
+        volt, curr = reply.strip().split(';')
+        V = np.array(volt.split(','), dtype=float)
+        I = np.array(curr.split(','), dtype=float)
+        ddof = 1 if len(V) > 1 else 0
+        return V.mean(), I.mean(), V.std(ddof=ddof), I.std(ddof=ddof)
+
+    def wait_for_settling(self, tolerance=1e-3, window=3, interval=0.05,
+                          timeout=1, atol=1e-6):
+        """ Polls the output current until the drift over the last `window`
+        readings drops below `tolerance` (relative) plus `atol` (absolute).
+
+        :param tolerance: Relative peak-to-peak drift regarded as settled.
+        :param window: Number of successive readings compared.
+        :param interval: Time between two readings in seconds.
+        :param timeout: Maximum waiting time in seconds.
+        :param atol: Absolute drift in Amps regarded as settled, relevant
+                     for currents close to zero.
+        :returns: True if the current settled before the timeout.
+        """
+        readings = []
+        start = time()
+        while True:
+            readings.append(self.current)
+            recent = readings[-window:]
+            if len(recent) == window:
+                drift = max(recent) - min(recent)
+                if drift <= tolerance*abs(np.mean(recent)) + atol:
+                    return True
+            if time() - start >= timeout:
+                return False
+            sleep(interval)
+
     ##############
     #_status (0/1) #
     ##############
@@ -55,6 +125,115 @@ class E36106A(Instrument):
         """ Read power supply current output status. """,
     )
     
+    ########
+    # List #
+    ########
+    LIST_POINTS_MAX = 512
+
+    # Bits of the operation status register
+    OPERATION_WAIT_TRIGGER = 16
+    OPERATION_TRANSIENT = 64
+
+    voltage_mode = Instrument.control(
+        ":VOLT:MODE?", ":VOLT:MODE %s",
+        """ A string property that selects whether the output follows the
+        fixed voltage setting (FIX) or the uploaded list (LIST). """,
+        validator=strict_discrete_set,
+        values=['FIX', 'LIST']
+    )
+
+    trigger_source = Instrument.control(
+        ":TRIG:SOUR?", ":TRIG:SOUR %s",
+        """ A string property that selects the trigger source of the
+        transient system: software (BUS), immediate (IMM) or the external
+        trigger input (EXT). """,
+        validator=strict_discrete_set,
+        values=['BUS', 'IMM', 'EXT']
+    )
+
+    _operation_condition = Instrument.measurement(":STAT:OPER:COND?",
+        """ Reads the condition of the operation status register. """,
+        cast=int
+    )
+
+    def upload_sequence(self, voltages, dwell, currents=None, count=1,
+                        trigger_source='BUS'):
+        """ Uploads a voltage sequence as list to the instrument, which
+        steps through it on its own once triggered. The output keeps the
+        last voltage of the list when the sequence is completed, after
+        which :meth:`sequence_running` returns to the fixed voltage
+        setting.
+
+        :param voltages: Voltages of the sequence in Volts.
+        :param dwell: Dwell time in seconds, either one value for all steps
+                      or one value per step.
+        :param currents: Optional current limits in Amps, one value for all
+                         steps or one value per step.
+        :param count: Number of repetitions of the sequence.
+        :param trigger_source: Trigger source starting the sequence
+                               (BUS, IMM or EXT).
+        """
+        voltages = np.clip(np.atleast_1d(np.asarray(voltages, dtype=float)),
+                           0, 100)
+        if len(voltages) > self.LIST_POINTS_MAX:
+            raise ValueError("Keysight E36106A: a sequence holds at most "
+                             "%d steps." % self.LIST_POINTS_MAX)
+        dwell = np.broadcast_to(np.asarray(dwell, dtype=float),
+                                voltages.shape)
+
+        self.write(":LIST:VOLT " + ",".join("%g" % v for v in voltages))
+        self.write(":LIST:DWEL " + ",".join("%g" % t for t in dwell))
+        if currents is not None:
+            currents = np.broadcast_to(
+                np.clip(np.asarray(currents, dtype=float), 0, 0.4),
+                voltages.shape)
+            self.write(":LIST:CURR " + ",".join("%g" % c for c in currents))
+        self.write(":LIST:COUN %d" % count)
+        self.write(":LIST:STEP AUTO")
+        self.write(":LIST:TERM:LAST ON")
+        self.voltage_mode = 'LIST'
+        self.trigger_source = trigger_source
+        self._sequence_trigger = trigger_source
+        self._sequence_last = voltages[-1]
+
+    def start_sequence(self):
+        """ Arms the uploaded sequence and, for the software trigger source,
+        starts it right away.
+        """
+        self.write(":INIT")
+        if self._sequence_trigger == 'BUS':
+            self.write("*TRG")
+        self._sequence_active = True
+
+    def sequence_running(self):
+        """ Returns True while the sequence waits for its trigger or is
+        stepping through the list. Once the sequence is completed, the
+        supply is returned to the fixed voltage setting with
+        :meth:`end_sequence`.
+        """
+        mask = self.OPERATION_WAIT_TRIGGER | self.OPERATION_TRANSIENT
+        running = bool(self._operation_condition & mask)
+        if not running and self._sequence_active:
+            self.end_sequence()
+        return running
+
+    def end_sequence(self):
+        """ Returns to the fixed voltage setting at the last voltage of
+        the list, which the output keeps. In list mode, voltage settings
+        would be ignored.
+        """
+        self.write(":VOLT %g" % self._sequence_last)
+        self.voltage_mode = 'FIX'
+        self._sequence_active = False
+
+    def abort_sequence(self):
+        """ Aborts a running sequence and returns to the fixed voltage
+        setting.
+        """
+        self.write(":ABOR")
+        self.voltage_mode = 'FIX'
+        self._sequence_active = False
+
     ###############
     # Calibration #
     ###############
@@ -81,6 +260,10 @@ class E36106A(Instrument):
         super(E36106A, self).__init__(
             adapter, "Keysight E36106A power supply", **kwargs
         )
+        self._sequence_trigger = 'BUS'
+        self._sequence_last = 0
+        self._sequence_active = False
+        self._sweep_points = None
         
         # Set up data transfer format
         if isinstance(self.adapter, VISAAdapter):
@@ -109,4 +292,6 @@ class E36106A(Instrument):
         self.adapter.manager.close()
 
     def reset(self):
-        self.write("*RST")
\ No newline at end of file
+        self.write("*RST")
+        self._sweep_points = None
+        self._sequence_active = False
\ No newline at end of file
@@ -0,0 +1,152 @@
+import logging
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from .e36106a import E36106A
+
+
+class E36106ABank(object):
+    """ Represents a bank of Keysight E36106A power supplies, which are
+    addressed like one multi-channel supply. Every call is sent to all
+    units concurrently on a thread pool, so setting or reading N supplies
+    takes about as long as a single one.
+
+    .. code-block:: python
+
+        bank = E36106ABank(['TCPIP::10.0.0.11::INSTR',
+                            'TCPIP::10.0.0.12::INSTR'])
+        bank.set_voltages([1.5, 2.0])
+        bank.enable()
+        V, I = bank.measure()
+
+    :param addresses: VISA addresses or adapters of the supplies.
+    :param max_workers: Maximum number of concurrent threads, defaults to
+                        one per supply.
+    """
+
+    def __init__(self, addresses, max_workers=None, **kwargs):
+        addresses = list(addresses)
+        if len(addresses) == 0:
+            raise ValueError("E36106ABank: at least one address is needed.")
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(addresses))
+        self.supplies = self._map(lambda a: E36106A(a, **kwargs), addresses)
+
+    def __len__(self):
+        return len(self.supplies)
+
+    def __getitem__(self, index):
+        return self.supplies[index]
+
+    def _map(self, function, *iterables):
+        """ Calls `function` concurrently and returns the results in the
+        order of the supplies. Exceptions of any call are re-raised.
+        """
+        return list(self._executor.map(function, *iterables))
+
+    def _broadcast(self, values):
+        """ Broadcasts one value or one value per supply to an array with
+        one entry per supply.
+        """
+        return np.broadcast_to(np.asarray(values, dtype=float),
+                               (len(self),))
+
+    def set_voltages(self, voltages):
+        """ Sets the output voltages, either one value for all supplies or
+        one value per supply.
+        """
+        def set_voltage(src, V):
+            src.voltage_range = V
+        self._map(set_voltage, self.supplies, self._broadcast(voltages))
+
+    def set_currents(self, currents):
+        """ Sets the current limits, either one value for all supplies or
+        one value per supply.
+        """
+        def set_current(src, current):
+            src.current_range = current
+        self._map(set_current, self.supplies, self._broadcast(currents))
+
+    def measure(self):
+        """ Reads voltage and current of all supplies.
+
+        :returns: Tuple (V, I) of arrays in Volts and Amps.
+        """
+        reply = self._map(lambda src: src.voltage_current, self.supplies)
+        reply = np.asarray(reply, dtype=np.float64)
+        return reply[:, 0], reply[:, 1]
+
+    def measure_averaged(self, N_avg=1):
+        """ Acquires `N_avg` digitizer samples on all supplies.
+
+        :returns: Tuple (V, I, V_std, I_std) of arrays, see
+                  :meth:`E36106A.measure_averaged`.
+        """
+        reply = self._map(lambda src: src.measure_averaged(N_avg),
+                          self.supplies)
+        return tuple(np.asarray(reply, dtype=np.float64).T)
+
+    def wait_for_settling(self, **kwargs):
+        """ Waits for the currents of all supplies to settle, see
+        :meth:`E36106A.wait_for_settling`.
+
+        :returns: Boolean array, True for every supply that settled.
+        """
+        return np.array(self._map(lambda src: src.wait_for_settling(**kwargs),
+                                  self.supplies))
+
+    def upload_sequence(self, voltages, dwell, **kwargs):
+        """ Uploads voltage sequences as lists, see
+        :meth:`E36106A.upload_sequence`.
+
+        :param voltages: One sequence for all supplies, or a 2D array with
+                         one sequence per row and supply.
+        :param dwell: Dwell time in seconds, one value or one per step.
+        """
+        voltages = np.atleast_2d(np.asarray(voltages, dtype=float))
+        voltages = np.broadcast_to(voltages, (len(self), voltages.shape[1]))
+        self._map(lambda src, V: src.upload_sequence(V, dwell, **kwargs),
+                  self.supplies, voltages)
+
+    def start_sequence(self):
+        """ Starts the uploaded sequences on all supplies. Software
+        triggers are sent concurrently; use the external trigger source for
+        synchronization better than a few milliseconds.
+        """
+        self._map(lambda src: src.start_sequence(), self.supplies)
+
+    def sequence_running(self):
+        """ Returns True while any of the supplies runs its sequence. """
+        return any(self._map(lambda src: src.sequence_running(),
+                             self.supplies))
+
+    def abort_sequence(self):
+        """ Aborts the sequences of all supplies and returns them to the
+        fixed voltage setting.
+        """
+        self._map(lambda src: src.abort_sequence(), self.supplies)
+
+    def enable(self):
+        """ Enables the outputs of all supplies. """
+        self._map(lambda src: src.enable(), self.supplies)
+
+    def disable(self):
+        """ Disables the outputs of all supplies. """
+        self._map(lambda src: src.disable(), self.supplies)
+
+    def reset(self):
+        self._map(lambda src: src.reset(), self.supplies)
+
+    def check_errors(self):
+        self._map(lambda src: src.check_errors(), self.supplies)
+
+    def disconnect(self):
+        """ Disconnects all supplies and stops the thread pool. """
+        try:
+            self._map(lambda src: src.disconnect(), self.supplies)
+        finally:
+            self._executor.shutdown(wait=True)
@@ -4,6 +4,8 @@ from pymeasure.instruments import Instrument
 from pymeasure.instruments.validators import strict_range, strict_discrete_set
 import numpy as np
 
+from ...utils import ScaledCodes, TimeBase
+
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
@@ -324,6 +326,51 @@ class MDO3052(Instrument):
         vpos = float(self.ask('wfmoutpre:yoff?'))  # reference position (level)
         return vscale, voff, vpos
 
+    def get_scaled_waveform(self, start=1, stop=10000, channel='CH1'):
+        """
+        get the waveform from the oscilloscope as raw codes together with
+        their vertical scale
+
+        Parameters
+        ----------
+        start : int
+            the start number of the data points, example 1
+        stop : int
+            the stop number of the data points, example 1000/record length
+        channel : str, optional
+            defines the channel which is given back. The default is 'CH1'.
+
+        Returns
+        -------
+        codes : ScaledCodes
+            the int16 codes of the chosen channel, converted to an array
+            they give (codes-yoff)*ymult+yzero in volts
+
+        """
+        codes = self.getwaveform(start, stop, channel)
+        ymult, yzero, yoff = self.get_vscale(channel)
+        return ScaledCodes(codes, ymult, yoff, yzero)
+
+    def get_timebase(self, n=None):
+        """
+        get the time base of the last transferred waveform
+
+        Parameters
+        ----------
+        n : int, optional
+            the number of data points. The default is the record length.
+
+        Returns
+        -------
+        t : TimeBase
+            the times xzero+i*xincr of the data points
+
+        """
+        tstart, tscale, record = self.get_timescale()
+        if n is None:
+            n = record
+        return TimeBase(tstart, tscale, n)
+
     def reset(self):
         """
         resets the oscilloscope
@@ -0,0 +1,6 @@
+from .results import DataBlock, BlockResults, emit_block
+from ..utils import ScaledCodes, TimeBase
+from .binary import (BinaryResults, HDF5Results, NPZResults, MemmapResults,
+                     RawResults, new_results, load_results,
+                     load_procedure, results_extension, load_columns)
+from .filenames import allocate_filename, release_filename
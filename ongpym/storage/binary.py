@@ -0,0 +1,757 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from importlib import import_module
+
+import numpy as np
+import pandas as pd
+
+from pymeasure.experiment import Procedure, Results
+
+from .results import BlockResults, DataBlock
+from ..utils import ScaledCodes, TimeBase
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class BinaryFormatter(logging.Formatter):
+    """ Formatter handed to the pymeasure Recorder in place of the CSV
+    formatter. It appends every record to the binary file of its results
+    and returns an empty line for the (null) text file of the Recorder.
+    """
+
+    def __init__(self, results):
+        super(BinaryFormatter, self).__init__()
+        self.results = results
+        self.columns = results.procedure.DATA_COLUMNS
+
+    def format(self, record):
+        self.results.append(record)
+        return ''
+
+    def format_header(self):
+        return ','.join(self.columns)
+
+
+class BinaryResults(Results, ABC):
+    """ Base class of :class:`Results` stored in a binary file instead of
+    CSV text. The Recorder of pymeasure only writes to `os.devnull`, while
+    the formatter appends the records column-wise to `data_filename`. The
+    procedure and its parameters are stored with the same header text as
+    in CSV files and additionally the parameter values with their native
+    types, from which :meth:`load` reconstructs the procedure. Backends
+    that keep the file open or buffer records complete the file in
+    :meth:`close`, which the interfaces call when a run has ended.
+
+    :param procedure: Procedure object
+    :param data_filename: The data filename where the data is or should be
+                          stored
+    :param compression: Whether to compress the columns.
+    """
+
+    EXTENSION = None
+
+    def __init__(self, procedure, data_filename, compression=False):
+        if not isinstance(procedure, Procedure):
+            raise ValueError("Results require a Procedure object")
+        self.procedure = procedure
+        self.procedure_class = procedure.__class__
+        self.parameters = procedure.parameter_objects()
+        self._header_count = -1
+        self.compression = compression
+
+        self.data_filename = data_filename
+        self.data_filenames = [os.devnull]
+        self.formatter = BinaryFormatter(self)
+        self._lock = threading.RLock()
+        self._data = None
+
+        # An empty file is a name reserved by allocate_filename
+        if os.path.exists(data_filename) and \
+                os.path.getsize(data_filename) > 0:
+            self.procedure.status = Procedure.FINISHED
+        else:
+            self.create()
+
+    def __getstate__(self):
+        state = super(BinaryResults, self).__getstate__()
+        del state['_lock']
+        del state['formatter']
+        return state
+
+    def __setstate__(self, state):
+        super(BinaryResults, self).__setstate__(state)
+        self._lock = threading.RLock()
+        self.formatter = BinaryFormatter(self)
+
+    @staticmethod
+    def _columns(record):
+        """ Returns a row or :class:`DataBlock` as dictionary of 1D
+        arrays.
+        """
+        return {key: np.atleast_1d(np.asarray(value))
+                for key, value in record.items()}
+
+    @staticmethod
+    def _dtype(column):
+        if column.dtype.kind in 'biuf':
+            return column.dtype
+        return np.float64
+
+    def parameter_values(self):
+        """ Returns the parameter values that are set, by attribute name.
+        """
+        return {key: parameter.value
+                for key, parameter in self.parameters.items()
+                if parameter.value is not None}
+
+    @classmethod
+    def load_procedure(cls, data_filename, procedure_class=None):
+        """ Returns the Procedure object stored in the header of a file. """
+        header, values = cls.read_header(data_filename)
+        if procedure_class is None:
+            regex = r"<(?:(?P<module>[^>]+)\.)?(?P<class>[^.>]+)>"
+            search = re.search(regex, header)
+            try:
+                module = import_module(search.group('module'))
+                procedure_class = getattr(module, search.group('class'))
+            except (AttributeError, ImportError, TypeError):
+                procedure_class = None
+        if procedure_class is None or not values:
+            return Results.parse_header(
+                header.rstrip(Results.LINE_BREAK), procedure_class)
+        procedure = procedure_class()
+        procedure.set_parameters(values)
+        procedure.refresh_parameters()
+        return procedure
+
+    @classmethod
+    def load(cls, data_filename, procedure_class=None):
+        """ Returns a results object with the associated Procedure object
+        and data.
+        """
+        return cls(cls.load_procedure(data_filename, procedure_class),
+                   data_filename)
+
+    def reload(self):
+        with self._lock:
+            self._data = self.read()
+
+    @property
+    def data(self):
+        with self._lock:
+            if self._data is None:
+                try:
+                    self._data = self.read()
+                except (OSError, KeyError, ValueError):
+                    self._data = pd.DataFrame(
+                        columns=self.procedure.DATA_COLUMNS)
+            else:
+                new = self.read(start=len(self._data))
+                if len(new) > 0:
+                    self._data = pd.concat([self._data, new],
+                                           ignore_index=True)
+            return self._data
+
+    def close(self):
+        """ Writes buffered records and releases the file. """
+        pass
+
+    @abstractmethod
+    def create(self):
+        """ Creates the file holding the header and no data. """
+
+    @abstractmethod
+    def append(self, record):
+        """ Appends a row or :class:`DataBlock` to the file. """
+
+    @abstractmethod
+    def read(self, start=0, columns=None):
+        """ Returns the rows from `start` on as DataFrame, only of the
+        given columns if `columns` is not None.
+        """
+
+    def _columns_to_read(self, columns):
+        if columns is None:
+            return list(self.procedure.DATA_COLUMNS)
+        unknown = set(columns) - set(self.procedure.DATA_COLUMNS)
+        if unknown:
+            raise KeyError('%s has no columns %s.' % (
+                self.data_filename, sorted(unknown)))
+        return list(columns)
+
+    @staticmethod
+    @abstractmethod
+    def read_header(data_filename):
+        """ Returns the header text and the dictionary of parameter values
+        stored in the file.
+        """
+
+
+class HDF5Results(BinaryResults):
+    """ :class:`BinaryResults` in an HDF5 file. Every column is a chunked,
+    resizable dataset in the group 'data', optionally gzip compressed. The
+    parameter values are attributes of the group 'parameters', named like
+    the procedure attributes, and the header text is stored as attribute of
+    the file. While records are appended the file stays open and is
+    flushed after every record, until :meth:`close`.
+    """
+
+    EXTENSION = '.h5'
+    CHUNK_SIZE = 65536
+
+    def __init__(self, procedure, data_filename, compression=False):
+        if h5py is None:
+            raise ImportError("HDF5Results require the h5py package.")
+        self._file = None
+        super(HDF5Results, self).__init__(procedure, data_filename,
+                                          compression)
+
+    def __getstate__(self):
+        state = super(HDF5Results, self).__getstate__()
+        state['_file'] = None
+        return state
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def _dataset_name(column):
+        return column.replace('/', '|')
+
+    def create(self):
+        with self._lock, h5py.File(self.data_filename, 'w') as f:
+            f.attrs['header'] = self.header()
+            f.attrs['columns'] = list(self.procedure.DATA_COLUMNS)
+            parameters = f.create_group('parameters')
+            for key, value in self.parameter_values().items():
+                parameters.attrs[key] = value
+            f.create_group('data')
+
+    def append(self, record):
+        columns = self._columns(record)
+        with self._lock:
+            if self._file is None:
+                self._file = h5py.File(self.data_filename, 'a')
+            group = self._file['data']
+            for key in self.procedure.DATA_COLUMNS:
+                column = columns[key]
+                name = self._dataset_name(key)
+                if name not in group:
+                    group.create_dataset(
+                        name, shape=(0,), maxshape=(None,),
+                        dtype=self._dtype(column),
+                        chunks=(self.CHUNK_SIZE,),
+                        compression='gzip' if self.compression else None)
+                dataset = group[name]
+                n = dataset.shape[0]
+                dataset.resize((n + len(column),))
+                dataset[n:] = column
+            self._file.flush()
+
+    def read(self, start=0, columns=None):
+        columns = self._columns_to_read(columns)
+        with self._lock:
+            if self._file is not None:
+                data = self._read(self._file, start, columns)
+            else:
+                with h5py.File(self.data_filename, 'r') as f:
+                    data = self._read(f, start, columns)
+        return pd.DataFrame(data, columns=columns)
+
+    def _read(self, f, start, columns):
+        # Only the datasets of the columns are read
+        group = f['data']
+        data = {}
+        for key in columns:
+            name = self._dataset_name(key)
+            data[key] = group[name][start:] if name in group \
+                else np.zeros(0)
+        return data
+
+    @staticmethod
+    def read_header(data_filename):
+        with h5py.File(data_filename, 'r') as f:
+            values = {key: value.item() if isinstance(value, np.generic)
+                      else value
+                      for key, value in f['parameters'].attrs.items()}
+            return str(f.attrs['header']), values
+
+
+class NPZResults(BinaryResults):
+    """ :class:`BinaryResults` in a numpy .npz archive with one array per
+    column, the header text as array '__header__' and the parameter values
+    as JSON text in '__parameters__'. An archive cannot be
+    appended to, so the columns are kept in memory and the archive is
+    rewritten as a whole. Rows and :class:`DataBlock` are buffered alike
+    and written at most every `FLUSH_INTERVAL` seconds and by
+    :meth:`close`, so that long traces emitted block by block do not
+    rewrite the growing archive for every block.
+    """
+
+    EXTENSION = '.npz'
+    HEADER_KEY = '__header__'
+    PARAMETERS_KEY = '__parameters__'
+    FLUSH_INTERVAL = 10.
+
+    def create(self):
+        with self._lock:
+            self._arrays = {key: np.zeros(0)
+                            for key in self.procedure.DATA_COLUMNS}
+            self._pending = []
+            self.write()
+
+    def _merge(self):
+        """ Concatenates the buffered records to the columns. """
+        if self._pending:
+            for key in self.procedure.DATA_COLUMNS:
+                self._arrays[key] = np.concatenate(
+                    [self._arrays[key]] +
+                    [columns[key] for columns in self._pending])
+            self._pending = []
+
+    def write(self):
+        self._merge()
+        arrays = {'c%d' % i: self._arrays[key] for i, key in
+                  enumerate(self.procedure.DATA_COLUMNS)}
+        arrays[self.HEADER_KEY] = np.array(self.header())
+        arrays[self.PARAMETERS_KEY] = np.array(
+            json.dumps(self.parameter_values(), default=str))
+        save = np.savez_compressed if self.compression else np.savez
+        tmp_filename = self.data_filename + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            save(f, **arrays)
+        os.replace(tmp_filename, self.data_filename)
+        self._written = time.monotonic()
+        self._dirty = False
+
+    def append(self, record):
+        columns = self._columns(record)
+        with self._lock:
+            if not hasattr(self, '_arrays'):
+                data = self.read()
+                self._arrays = {key: data[key].to_numpy()
+                                for key in self.procedure.DATA_COLUMNS}
+                self._pending = []
+            self._pending.append(
+                {key: column.astype(self._dtype(column))
+                 for key, column in columns.items()})
+            self._dirty = True
+            if time.monotonic() - getattr(self, '_written', 0.) >= \
+                    self.FLUSH_INTERVAL:
+                self.write()
+
+    def close(self):
+        with self._lock:
+            if getattr(self, '_dirty', False):
+                self.write()
+
+    def read(self, start=0, columns=None):
+        columns = self._columns_to_read(columns)
+        with self._lock:
+            if hasattr(self, '_arrays'):
+                self._merge()
+                data = {key: np.asarray(self._arrays[key])[start:]
+                        for key in columns}
+            else:
+                names = {key: 'c%d' % i for i, key in
+                         enumerate(self.procedure.DATA_COLUMNS)}
+                # The archive is read lazily, array by array
+                with np.load(self.data_filename) as f:
+                    data = {key: f[names[key]][start:] for key in columns}
+        return pd.DataFrame(data, columns=columns)
+
+    @classmethod
+    def read_header(cls, data_filename):
+        with np.load(data_filename) as f:
+            return (str(f[cls.HEADER_KEY]),
+                    json.loads(str(f[cls.PARAMETERS_KEY])))
+
+
+class MemmapResults(BinaryResults):
+    """ :class:`BinaryResults` in a fixed-layout binary file that is opened
+    with :func:`numpy.memmap`. A text header, padded with spaces to a
+    multiple of `HEADER_ALIGNMENT` bytes, describes the layout, the
+    parameter values and holds the header of CSV files. It is followed by
+    the rows as little-endian float64 records. Reopening a file only maps
+    it, so slicing a window of a long trace reads the pages of that window
+    and the load time does not grow with the file size.
+    """
+
+    EXTENSION = '.bin'
+    HEADER_ALIGNMENT = 4096
+    HEADER_RESERVE = 0
+    DTYPE = np.dtype('<f8')
+    MAGIC = '#MemmapResults:'
+
+    def __init__(self, procedure, data_filename, compression=False):
+        self._memmap = None
+        self._layout = None
+        super(MemmapResults, self).__init__(procedure, data_filename,
+                                            compression)
+
+    def __getstate__(self):
+        state = super(MemmapResults, self).__getstate__()
+        state['_memmap'] = None
+        return state
+
+    def layout(self):
+        """ Returns the items of the first header line besides its size.
+        """
+        return {'dtype': self.DTYPE.str,
+                'columns': len(self.procedure.DATA_COLUMNS)}
+
+    def preface(self):
+        """ Returns the header lines between the first line and the header
+        of CSV files.
+        """
+        return ['#Columns: ' + json.dumps(self.procedure.DATA_COLUMNS),
+                '#Parameter values: ' + json.dumps(self.parameter_values(),
+                                                   default=str)]
+
+    def write_header(self, size=None):
+        """ Writes the header. Without `size`, a new file is created with
+        the smallest header size that is a multiple of `HEADER_ALIGNMENT`,
+        otherwise the header of `size` bytes of the file is overwritten.
+        """
+        def first_line(header_size):
+            items = ['header=%d' % header_size] + \
+                ['%s=%s' % item for item in self.layout().items()]
+            return self.MAGIC + ' ' + ', '.join(items)
+
+        text = Results.LINE_BREAK.join(self.preface()) + \
+            Results.LINE_BREAK + self.header()
+        mode = 'r+b'
+        if size is None:
+            # The header size is part of the header, reserve its digits
+            size = len((first_line(0) + Results.LINE_BREAK
+                        + text).encode()) + 16 + self.HEADER_RESERVE
+            size = -(-size // self.HEADER_ALIGNMENT)*self.HEADER_ALIGNMENT
+            mode = 'wb'
+        header = (first_line(size) + Results.LINE_BREAK + text).encode()
+        if len(header) >= size:
+            raise ValueError('The header does not fit into %d bytes.'
+                             % size)
+        header += b' '*(size - len(header) - 1) + b'\n'
+        with self._lock, open(self.data_filename, mode) as f:
+            f.write(header)
+
+    def create(self):
+        self.write_header()
+
+    def append(self, record):
+        columns = self._columns(record)
+        n = max(len(column) for column in columns.values())
+        rows = np.empty((n, len(self.procedure.DATA_COLUMNS)),
+                        dtype=self.DTYPE)
+        for i, key in enumerate(self.procedure.DATA_COLUMNS):
+            rows[:, i] = columns[key]
+        with self._lock, open(self.data_filename, 'ab') as f:
+            f.write(rows.tobytes())
+
+    @classmethod
+    def read_preface(cls, data_filename):
+        """ Returns the items of the first header line, the following lines
+        up to the header of CSV files by their keys and that header.
+        """
+        with open(data_filename, 'rb') as f:
+            first = f.readline().decode()
+            if not first.startswith(cls.MAGIC):
+                raise ValueError('%s is no %s file.'
+                                 % (data_filename, cls.__name__))
+            items = dict(item.strip().split('=') for item in
+                         first[len(cls.MAGIC):].split(','))
+            f.seek(0)
+            lines = f.read(int(items['header'])).decode().rstrip().split(
+                Results.LINE_BREAK)[1:]
+        i = [line.startswith('#Procedure') for line in lines].index(True)
+        preface = dict(line[1:].split(': ', 1) for line in lines[:i])
+        header = Results.LINE_BREAK.join(lines[i:]) + Results.LINE_BREAK
+        return items, preface, header
+
+    @classmethod
+    def read_layout(cls, data_filename):
+        """ Returns the header size and the dtype of the records of a file.
+        """
+        items = cls.read_preface(data_filename)[0]
+        return int(items['header']), np.dtype((np.dtype(items['dtype']),
+                                               int(items['columns'])))
+
+    def memmap(self):
+        """ Returns the records stored so far as read-only memory-mapped
+        array, here of shape (rows, columns) ordered like the DATA_COLUMNS.
+        """
+        with self._lock:
+            if self._layout is None:
+                self._layout = self.read_layout(self.data_filename)
+            offset, dtype = self._layout
+            n_rows = (os.path.getsize(self.data_filename) - offset) \
+                // dtype.itemsize
+            if self._memmap is None or len(self._memmap) != n_rows:
+                if n_rows == 0:
+                    self._memmap = np.zeros(0, dtype=dtype)
+                else:
+                    self._memmap = np.memmap(self.data_filename, dtype=dtype,
+                                             mode='r', offset=offset,
+                                             shape=(n_rows,))
+            return self._memmap
+
+    def read(self, start=0, columns=None):
+        if columns is None:
+            return pd.DataFrame(self.memmap()[start:],
+                                columns=self.procedure.DATA_COLUMNS,
+                                copy=False)
+        columns = self._columns_to_read(columns)
+        rows = self.memmap()
+        if len(rows) == 0:
+            return pd.DataFrame(columns=columns)
+        index = list(self.procedure.DATA_COLUMNS).index
+        return pd.DataFrame({key: np.array(rows[start:, index(key)])
+                             for key in columns}, columns=columns)
+
+    @property
+    def data(self):
+        # The frame is a view of the mapped file, rows are only read from
+        # disk when they are accessed
+        with self._lock:
+            try:
+                rows = self.memmap()
+            except (OSError, ValueError):
+                return pd.DataFrame(columns=self.procedure.DATA_COLUMNS)
+            if self._data is None or len(self._data) != len(rows):
+                self._data = self.read()
+            return self._data
+
+    @classmethod
+    def read_header(cls, data_filename):
+        items, preface, header = cls.read_preface(data_filename)
+        return header, json.loads(preface.get('Parameter values', '{}'))
+
+
+class RawResults(MemmapResults):
+    """ :class:`MemmapResults` storing raw digitizer data. Columns emitted
+    as :class:`ScaledCodes` are stored as their integer codes and columns
+    emitted as :class:`TimeBase` are not stored at all; their preambles are
+    part of the header, from which volts and times are reconstructed when
+    reading. Other columns are stored as float64. The layout is fixed by
+    the first record, later records need the same preambles.
+    """
+
+    EXTENSION = '.raw'
+    HEADER_RESERVE = 2048
+    MAGIC = '#RawResults:'
+
+    def __init__(self, procedure, data_filename, compression=False):
+        self.column_layout = None
+        self._rows = 0
+        super(RawResults, self).__init__(procedure, data_filename,
+                                         compression)
+
+    def layout(self):
+        return {'columns': len(self.procedure.DATA_COLUMNS)}
+
+    def preface(self):
+        return super(RawResults, self).preface() + \
+            ['#Layout: ' + json.dumps(self.column_layout)]
+
+    def describe(self, record, start=0):
+        """ Returns the layout of the columns of a record whose first row
+        is row `start` of the file.
+        """
+        layout = {}
+        for key in self.procedure.DATA_COLUMNS:
+            value = record[key]
+            if isinstance(value, TimeBase):
+                layout[key] = {'x0': value.x0 - start*value.dx,
+                               'dx': value.dx}
+            elif isinstance(value, ScaledCodes):
+                dtype = np.asarray(value.codes).dtype.newbyteorder('<')
+                layout[key] = dict(value.preamble, dtype=dtype.str)
+            else:
+                layout[key] = {'dtype': self.DTYPE.str}
+        return layout
+
+    @staticmethod
+    def record_dtype(layout):
+        return np.dtype([(key, column['dtype'])
+                         for key, column in layout.items()
+                         if 'dtype' in column])
+
+    def append(self, record):
+        with self._lock:
+            self.memmap()
+            if self.column_layout is None:
+                layout = self.describe(record)
+                if self.record_dtype(layout).itemsize == 0:
+                    raise ValueError('RawResults need at least one column '
+                                     'that is no TimeBase.')
+                self.column_layout = layout
+                self.write_header(self.read_layout(self.data_filename)[0])
+                self._layout = None
+            else:
+                layout = self.describe(record, start=self._rows)
+                for key, column in layout.items():
+                    stored = self.column_layout[key]
+                    if set(column) != set(stored) or not all(
+                            column[x] == stored[x] if x == 'dtype'
+                            else np.isclose(column[x], stored[x])
+                            for x in column):
+                        raise ValueError("The layout of column '%s' differs "
+                                         "from the stored one." % key)
+
+            dtype = self.record_dtype(self.column_layout)
+            n = record.n_rows if isinstance(record, DataBlock) else 1
+            rows = np.empty(n, dtype=dtype)
+            for key in dtype.names:
+                value = record[key]
+                if isinstance(value, ScaledCodes):
+                    value = value.codes
+                rows[key] = value
+            with open(self.data_filename, 'ab') as f:
+                f.write(rows.tobytes())
+            self._rows += n
+
+    @classmethod
+    def read_column_layout(cls, data_filename):
+        return json.loads(cls.read_preface(data_filename)[1]['Layout'])
+
+    @classmethod
+    def read_layout(cls, data_filename):
+        size = int(cls.read_preface(data_filename)[0]['header'])
+        layout = cls.read_column_layout(data_filename)
+        if layout is None:
+            return size, np.dtype([])
+        return size, cls.record_dtype(layout)
+
+    def memmap(self):
+        """ Returns the records stored so far as read-only memory-mapped
+        structured array with a field per stored column.
+        """
+        with self._lock:
+            if self.column_layout is None:
+                self.column_layout = self.read_column_layout(
+                    self.data_filename)
+            if self.column_layout is None:
+                return np.zeros(0)
+            rows = super(RawResults, self).memmap()
+            self._rows = len(rows)
+            return rows
+
+    def arrays(self):
+        """ Returns the columns by name without converting them, as
+        :class:`ScaledCodes` of the memory-mapped codes, :class:`TimeBase`
+        or memory-mapped float64 arrays.
+        """
+        rows = self.memmap()
+        if self.column_layout is None:
+            return {key: np.zeros(0) for key in self.procedure.DATA_COLUMNS}
+        columns = {}
+        for key, column in self.column_layout.items():
+            if 'dx' in column:
+                columns[key] = TimeBase(column['x0'], column['dx'],
+                                        len(rows))
+            elif 'ymult' in column:
+                columns[key] = ScaledCodes(rows[key], column['ymult'],
+                                           column['yoff'], column['yzero'])
+            else:
+                columns[key] = rows[key]
+        return columns
+
+    def read(self, start=0, columns=None):
+        columns = self._columns_to_read(columns)
+        arrays = self.arrays()
+        return pd.DataFrame({key: np.asarray(arrays[key][start:])
+                             for key in columns}, columns=columns)
+
+
+RESULTS_BACKENDS = {'csv': BlockResults,
+                    'hdf5': HDF5Results,
+                    'npz': NPZResults,
+                    'memmap': MemmapResults,
+                    'raw': RawResults}
+
+EXTENSIONS = {'.h5': HDF5Results,
+              '.hdf5': HDF5Results,
+              '.npz': NPZResults,
+              '.bin': MemmapResults,
+              '.raw': RawResults}
+
+
+def results_extension(backend):
+    """ Returns the file extension of results in `backend`. """
+    if backend == 'hdf5' and h5py is None:
+        backend = 'npz'
+    return RESULTS_BACKENDS[backend].EXTENSION
+
+
+def new_results(procedure, data_filename, backend='csv', compression=False):
+    """ Returns new results of `procedure` in the given backend. The
+    extension of `data_filename` is replaced by the one of the backend.
+
+    :param procedure: Procedure object
+    :param data_filename: The data filename
+    :param backend: 'csv', 'hdf5', 'npz', 'memmap' or 'raw'. Without
+                    h5py, 'hdf5' falls back to 'npz'.
+    :param compression: Whether the binary backends compress the columns.
+    """
+    if backend == 'hdf5' and h5py is None:
+        log.warning('h5py is not installed, storing results as npz.')
+        backend = 'npz'
+    root, ext = os.path.splitext(data_filename)
+    if ext.lower() != '.csv' and ext.lower() not in EXTENSIONS:
+        root = data_filename
+    cls = RESULTS_BACKENDS[backend]
+    if backend == 'csv':
+        return cls(procedure, root + cls.EXTENSION)
+    return cls(procedure, root + cls.EXTENSION, compression=compression)
+
+
+def load_results(data_filename, procedure_class=None):
+    """ Loads results of any backend, chosen by the file extension. """
+    ext = os.path.splitext(data_filename)[1].lower()
+    if ext in EXTENSIONS:
+        return EXTENSIONS[ext].load(data_filename, procedure_class)
+    return Results.load(data_filename, procedure_class)
+
+
+def load_procedure(data_filename, procedure_class=None):
+    """ Returns the Procedure object of results of any backend from the
+    header of the file, without reading the data.
+    """
+    ext = os.path.splitext(data_filename)[1].lower()
+    if ext in EXTENSIONS:
+        return EXTENSIONS[ext].load_procedure(data_filename, procedure_class)
+    header = ''
+    with open(data_filename, 'r') as f:
+        for line in f:
+            if not line.startswith(Results.COMMENT):
+                break
+            header += line.strip() + Results.LINE_BREAK
+    return Results.parse_header(header[:-1], procedure_class)
+
+
+def load_columns(data_filename, columns):
+    """ Returns only the given data columns of results of any backend as
+    DataFrame, e.g. to analyse many large files one after another. Only
+    the datasets, arrays or fields of these columns are read; CSV files
+    are parsed column-selectively without reading the header into a
+    procedure.
+    """
+    ext = os.path.splitext(data_filename)[1].lower()
+    if ext in EXTENSIONS:
+        return load_results(data_filename).read(columns=columns)
+    return pd.read_csv(data_filename, comment=Results.COMMENT,
+                       usecols=list(columns))
@@ -0,0 +1,402 @@
+""" SQLite catalog of measurement runs, their parameters and fit results.
+
+Backfill the catalog from existing result files with
+
+    python -m ongpym.storage.catalog DIRECTORY [DIRECTORY ...] [--fit]
+
+Backfilled runs have no queueing time, the time filters use their
+finishing time instead. Their resonances are only in the catalog if they
+are fitted again with --fit.
+"""
+
+import os
+import sys
+import logging
+import sqlite3
+import argparse
+from datetime import datetime
+from contextlib import closing
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from pymeasure.experiment import Procedure
+
+from .binary import EXTENSIONS, load_procedure
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+# Time of a run for the time filters, the finishing time for backfilled
+# runs, which were never queued
+RUN_TIME = 'coalesce(runs.queued, runs.finished)'
+# Units of the fit quantities of backfilled transmission runs
+FIT_UNITS = {'wavelength': 'nm', 'FWHM': 'nm', 'FSR': 'nm'}
+
+STATUSES = {Procedure.QUEUED: 'queued',
+            Procedure.RUNNING: 'running',
+            Procedure.FINISHED: 'finished',
+            Procedure.FAILED: 'failed',
+            Procedure.ABORTED: 'aborted'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    filename TEXT UNIQUE NOT NULL,
+    procedure TEXT,
+    status TEXT,
+    queued TEXT,
+    started TEXT,
+    finished TEXT,
+    rows INTEGER
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT,
+    number REAL,
+    units TEXT,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS fits (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    peak INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    units TEXT,
+    PRIMARY KEY (run_id, peak, name)
+);
+CREATE INDEX IF NOT EXISTS runs_procedure ON runs (procedure, queued);
+CREATE INDEX IF NOT EXISTS runs_queued ON runs (queued);
+CREATE INDEX IF NOT EXISTS parameters_number ON parameters (name, number);
+CREATE INDEX IF NOT EXISTS fits_value ON fits (name, value);
+"""
+
+
+def timestamp(time=None):
+    """ Returns `time` (datetime, ISO text, POSIX timestamp or now) as ISO
+    text.
+    """
+    if time is None:
+        time = datetime.now()
+    elif isinstance(time, str):
+        time = datetime.fromisoformat(time)
+    elif not isinstance(time, datetime):
+        time = datetime.fromtimestamp(time)
+    return time.isoformat(' ', 'seconds')
+
+
+class RunCatalog(object):
+    """ Catalog of measurement runs in an SQLite database. Every run is
+    identified by the file name of its results and has its procedure,
+    status and the times at which it was queued, started and finished,
+    its parameters and any number of fit results, e.g. Q, FWHM and FSR
+    of every fitted resonance. Each call opens its own connection, so a
+    catalog can be used from the GUI and the worker threads and by
+    several programs at once.
+
+    :param path: Path of the database file, created if necessary.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with closing(self.connect()) as connection, connection:
+            connection.executescript(SCHEMA)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute('PRAGMA foreign_keys = ON')
+        return connection
+
+    @staticmethod
+    def _run_id(connection, filename):
+        row = connection.execute('SELECT id FROM runs WHERE filename = ?',
+                                 (os.path.abspath(filename),)).fetchone()
+        if row is None:
+            raise KeyError('%s is not in the catalog.' % filename)
+        return row[0]
+
+    def add_run(self, filename, procedure, status=None, queued=None,
+                started=None, finished=None, rows=None):
+        """ Adds the run of `procedure` stored in `filename` with its
+        parameters, or updates it if the file is already cataloged.
+
+        :param filename: File name of the results.
+        :param procedure: Procedure object of the run.
+        :param status: Status text, by default the one of the procedure.
+        :param queued, started, finished: Times as accepted by
+                                          :func:`timestamp`.
+        :param rows: Number of data rows.
+        :returns: The id of the run.
+        """
+        if status is None:
+            status = STATUSES.get(procedure.status, 'queued')
+        name = '%s.%s' % (procedure.__class__.__module__,
+                          procedure.__class__.__name__)
+        times = [timestamp(x) if x is not None else None
+                 for x in [queued, started, finished]]
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                'INSERT INTO runs (filename, procedure, status, queued, '
+                'started, finished, rows) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (filename) DO UPDATE SET '
+                'procedure = excluded.procedure, status = excluded.status, '
+                'queued = coalesce(excluded.queued, queued), '
+                'started = coalesce(excluded.started, started), '
+                'finished = coalesce(excluded.finished, finished), '
+                'rows = coalesce(excluded.rows, rows)',
+                [os.path.abspath(filename), name, status] + times + [rows])
+            run_id = self._run_id(connection, filename)
+            connection.execute('DELETE FROM parameters WHERE run_id = ?',
+                               (run_id,))
+            connection.executemany(
+                'INSERT INTO parameters VALUES (?, ?, ?, ?, ?)',
+                [(run_id, key, str(parameter.value),
+                  parameter.value if isinstance(parameter.value,
+                                                (int, float)) else None,
+                  getattr(parameter, 'units', None))
+                 for key, parameter in procedure.parameter_objects().items()
+                 if parameter.value is not None])
+        return run_id
+
+    def set_status(self, filename, status, rows=None):
+        """ Sets the status of a run and the time at which it started
+        ('running') or ended (any other status than 'queued').
+        """
+        now = timestamp()
+        column = {'queued': 'queued', 'running': 'started'}.get(
+            status, 'finished')
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                'UPDATE runs SET status = ?, %s = ?, '
+                'rows = coalesce(?, rows) WHERE filename = ?' % column,
+                (status, now, rows, os.path.abspath(filename)))
+
+    def record_fit(self, filename, values, peak=0, units=None):
+        """ Records fit results of a run, replacing earlier results of the
+        same peak.
+
+        :param filename: File name of the results.
+        :param values: Dictionary of fit quantities, e.g. {'Q': 1.2e5}.
+        :param peak: Index of the fitted peak or resonance.
+        :param units: Optional dictionary of the units of the quantities.
+        """
+        units = units or {}
+        with closing(self.connect()) as connection, connection:
+            run_id = self._run_id(connection, filename)
+            connection.execute('DELETE FROM fits WHERE run_id = ? AND '
+                               'peak = ?', (run_id, peak))
+            connection.executemany(
+                'INSERT INTO fits VALUES (?, ?, ?, ?, ?)',
+                [(run_id, peak, key, float(value), units.get(key))
+                 for key, value in values.items()])
+
+    def query(self, sql, parameters=()):
+        """ Returns the result of an SQL query as DataFrame. """
+        with closing(self.connect()) as connection:
+            return pd.read_sql_query(sql, connection, params=parameters)
+
+    @staticmethod
+    def _conditions(procedure=None, status=None, since=None, until=None):
+        conditions, values = [], []
+        if procedure is not None:
+            conditions.append('runs.procedure LIKE ?')
+            values.append('%' + procedure)
+        if status is not None:
+            conditions.append('runs.status = ?')
+            values.append(status)
+        if since is not None:
+            conditions.append(RUN_TIME + ' >= ?')
+            values.append(timestamp(since))
+        if until is not None:
+            conditions.append(RUN_TIME + ' < ?')
+            values.append(timestamp(until))
+        return conditions, values
+
+    def runs(self, procedure=None, status=None, since=None, until=None,
+             **parameters):
+        """ Returns the runs matching all given conditions as DataFrame.
+
+        :param procedure: Name of the procedure class, optionally with its
+                          module.
+        :param status: Status of the runs, e.g. 'finished'.
+        :param since, until: Range of the times at which runs were queued,
+                             or finished if they were backfilled.
+        :param parameters: Values of parameters by attribute name, or
+                           (minimum, maximum) tuples of numeric parameters.
+        """
+        conditions, values = self._conditions(procedure, status, since,
+                                              until)
+        for key, value in parameters.items():
+            if isinstance(value, tuple):
+                conditions.append(
+                    'id IN (SELECT run_id FROM parameters WHERE name = ? '
+                    'AND number BETWEEN ? AND ?)')
+                values += [key, value[0], value[1]]
+            else:
+                conditions.append(
+                    'id IN (SELECT run_id FROM parameters WHERE name = ? '
+                    'AND value = ?)')
+                values += [key, str(value)]
+        where = ' WHERE ' + ' AND '.join(conditions) if conditions else ''
+        return self.query('SELECT * FROM runs%s ORDER BY %s' % (
+            where, RUN_TIME), values)
+
+    def fits(self, name, minimum=None, maximum=None, procedure=None,
+             status=None, since=None, until=None):
+        """ Returns the fit results of quantity `name` within the given
+        bounds together with their runs, e.g. all resonances with Q > 1e5
+        measured since a date with `fits('Q', 1e5, since=date)`.
+        """
+        conditions, values = self._conditions(procedure, status, since,
+                                              until)
+        conditions.insert(0, 'fits.name = ?')
+        values.insert(0, name)
+        if minimum is not None:
+            conditions.append('fits.value >= ?')
+            values.append(minimum)
+        if maximum is not None:
+            conditions.append('fits.value <= ?')
+            values.append(maximum)
+        return self.query(
+            'SELECT runs.filename, runs.procedure, runs.queued, fits.peak, '
+            'fits.name, fits.value, fits.units FROM fits '
+            'JOIN runs ON runs.id = fits.run_id WHERE %s '
+            'ORDER BY %s, fits.peak' % (' AND '.join(conditions),
+                                        RUN_TIME), values)
+
+    def parameters(self, filename):
+        """ Returns the parameter values of a run by attribute name. """
+        with closing(self.connect()) as connection:
+            run_id = self._run_id(connection, filename)
+            rows = connection.execute(
+                'SELECT name, value, number FROM parameters '
+                'WHERE run_id = ?', (run_id,)).fetchall()
+        return {name: value if number is None else number
+                for name, value, number in rows}
+
+    def contains(self, filename):
+        with closing(self.connect()) as connection:
+            return connection.execute(
+                'SELECT 1 FROM runs WHERE filename = ?',
+                (os.path.abspath(filename),)).fetchone() is not None
+
+    def rename(self, filename, new_filename):
+        """ Moves a run to the file name of its results after they were
+        converted or moved. Files that are not cataloged are ignored.
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute(
+                'UPDATE runs SET filename = ? WHERE filename = ?',
+                (os.path.abspath(new_filename), os.path.abspath(filename)))
+
+    def remove(self, filename):
+        """ Removes a run with its parameters and fit results, e.g. after
+        its results were deleted.
+        """
+        with closing(self.connect()) as connection, connection:
+            connection.execute('DELETE FROM runs WHERE filename = ?',
+                               (os.path.abspath(filename),))
+
+    def backfill_fits(self, filename, method='fast'):
+        """ Fits all resonances of a transmission run again and records
+        their Q, wavelength, FWHM and the FSR.
+
+        :param method: Fit method, 'lmfit' or 'fast'.
+        :returns: Number of recorded resonances, 0 for other procedures.
+        """
+        from ..analysis.batch import analyse_file
+
+        fits = analyse_file(filename, method)
+        if fits is None:
+            return 0
+        for peak, fit in enumerate(fits.itertuples()):
+            values = {'Q': fit.Q, 'wavelength': fit.center,
+                      'FWHM': fit.FWHM}
+            if np.isfinite(fit.FSR):
+                values['FSR'] = fit.FSR
+            self.record_fit(filename, values, peak, FIT_UNITS)
+        return len(fits)
+
+    def backfill(self, directory, update=False, fit=False):
+        """ Adds the result files below `directory` that are not cataloged
+        yet, with their modification time as finishing time. Files that
+        cannot be read as results are skipped.
+
+        :param update: Whether cataloged files are read again.
+        :param fit: Whether the resonances of transmission runs are fitted
+                    and recorded, see :meth:`backfill_fits`. Otherwise
+                    backfilled runs have no fit results.
+        :returns: Number of added files.
+        """
+        extensions = ['.csv'] + list(EXTENSIONS)
+        n = 0
+        for root, _, files in os.walk(directory):
+            for file in files:
+                filename = os.path.join(root, file)
+                if os.path.splitext(file)[1].lower() not in extensions or \
+                        (not update and self.contains(filename)):
+                    continue
+                try:
+                    procedure = load_procedure(filename)
+                except Exception as e:
+                    log.info('Skipping %s: %s' % (filename, e))
+                    continue
+                self.add_run(filename, procedure, status='finished',
+                             finished=os.path.getmtime(filename))
+                if fit:
+                    try:
+                        self.backfill_fits(filename)
+                    except Exception as e:
+                        log.warning('Fitting %s failed: %s' % (filename, e))
+                n += 1
+        return n
+
+
+@lru_cache(maxsize=None)
+def default_catalog():
+    """ Returns the catalog at PATH_CATALOG of the configuration, by
+    default 'catalog.sqlite' in PATH_TRASH, or None if neither is
+    configured.
+    """
+    try:
+        from ..config import PATH_CATALOG
+    except ImportError:
+        try:
+            from ..config import PATH_TRASH
+        except ImportError:
+            return None
+        PATH_CATALOG = os.path.join(PATH_TRASH, 'catalog.sqlite')
+    try:
+        return RunCatalog(PATH_CATALOG)
+    except sqlite3.Error as e:
+        log.warning('Run catalog %s is not available: %s' % (PATH_CATALOG,
+                                                             e))
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Adds existing result files to the run catalog.')
+    parser.add_argument('directories', nargs='+')
+    parser.add_argument('--catalog', help='Path of the catalog, by default '
+                        'the one of the configuration.')
+    parser.add_argument('--update', action='store_true',
+                        help='Read cataloged files again.')
+    parser.add_argument('--fit', action='store_true',
+                        help='Fit the resonances of transmission runs.')
+    args = parser.parse_args(argv)
+
+    catalog = RunCatalog(args.catalog) if args.catalog \
+        else default_catalog()
+    if catalog is None:
+        parser.error('No catalog configured, use --catalog.')
+    for directory in args.directories:
+        n = catalog.backfill(directory, update=args.update, fit=args.fit)
+        print('Added %d runs from %s' % (n, directory))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    main()
@@ -0,0 +1,79 @@
+import os
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+_lock = threading.Lock()
+_counters = {}
+
+
+def _path(directory, prefix, index, ext):
+    name = prefix if index == 0 else '%s_%d' % (prefix, index)
+    return os.path.join(directory, name + ext)
+
+
+def _first_free(directory, prefix, ext):
+    """ Returns the first unused index, assuming that the used indices are
+    contiguous, with a number of probes logarithmic in the used indices.
+    """
+    if not os.path.exists(_path(directory, prefix, 0, ext)):
+        return 0
+    lower, upper = 0, 1
+    while os.path.exists(_path(directory, prefix, upper, ext)):
+        lower, upper = upper, 2*upper
+    while upper - lower > 1:
+        middle = (lower + upper)//2
+        if os.path.exists(_path(directory, prefix, middle, ext)):
+            lower = middle
+        else:
+            upper = middle
+    return upper
+
+
+def allocate_filename(directory, prefix, ext='.csv'):
+    """ Reserves a new file name in `directory` and returns its path. The
+    name is `prefix` followed by `ext`, or if that is taken `prefix`_1,
+    `prefix`_2, ... The file is created empty with an exclusive create,
+    so the name is reserved atomically even if several programs queue into
+    the same directory; results treat the empty file as new file. The
+    next index per directory and prefix is kept, so that queueing many
+    runs does not scan the directory again.
+
+    :param directory: Directory of the file, created if necessary.
+    :param prefix: Name of the file without extension.
+    :param ext: Extension of the file, including the dot.
+    :returns: Absolute path of the reserved file.
+    """
+    directory = os.path.abspath(directory)
+    os.makedirs(directory, exist_ok=True)
+    key = (directory, prefix, ext)
+    with _lock:
+        index = _counters.get(key)
+        if index is None:
+            index = _first_free(directory, prefix, ext)
+        while True:
+            filename = _path(directory, prefix, index, ext)
+            try:
+                os.close(os.open(filename,
+                                 os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                index += 1
+                continue
+            _counters[key] = index + 1
+            if index > 0:
+                log.info('File already exists. Giving unique filename.')
+            return filename
+
+
+def release_filename(filename):
+    """ Removes the file of a name reserved by :func:`allocate_filename`
+    whose run was never queued, so that no stray file is left behind.
+    """
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log.warning('Could not release %s: %s' % (filename, e))
@@ -0,0 +1,109 @@
+import os
+import logging
+
+import numpy as np
+
+from pymeasure.experiment import Procedure, Results
+from pymeasure.experiment.results import CSVFormatter
+
+from ..utils import ScaledCodes, TimeBase
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+
+class DataBlock(dict):
+    """ Dictionary of equally long column arrays, emitted as one record by
+    :func:`emit_block` and written in one go by :class:`BlockFormatter`.
+    As a dictionary its length is the number of columns, the number of
+    rows is :attr:`n_rows`.
+    """
+
+    @property
+    def n_rows(self):
+        for column in self.values():
+            return len(column)
+        return 0
+
+
+class BlockFormatter(CSVFormatter):
+    """ CSV formatter that formats single rows like :class:`CSVFormatter`
+    and whole :class:`DataBlock` records at once, converting every column
+    to text in a single numpy call instead of one format call per value.
+    """
+
+    def format(self, record):
+        if not isinstance(record, DataBlock):
+            return super(BlockFormatter, self).format(record)
+        columns = [np.asarray(record[x]).astype(str).tolist()
+                   for x in self.columns]
+        return '\n'.join(map(self.delimiter.join, zip(*columns)))
+
+
+class BlockResults(Results):
+    """ :class:`Results` that also accept :class:`DataBlock` records, so
+    that a procedure can emit whole columns with :func:`emit_block`. A block
+    is appended to the file with a single write, which the plots of the
+    ManagedWindow pick up as one update. An existing empty file, as
+    reserved by :func:`allocate_filename`, is written like a new file.
+
+    :param procedure: Procedure object
+    :param data_filename: The data filename where the data is or should be
+                          stored
+    """
+
+    EXTENSION = '.csv'
+
+    def __init__(self, procedure, data_filename):
+        if not isinstance(procedure, Procedure):
+            raise ValueError("Results require a Procedure object")
+        self.procedure = procedure
+        self.procedure_class = procedure.__class__
+        self.parameters = procedure.parameter_objects()
+        self._header_count = -1
+
+        self.formatter = BlockFormatter(columns=self.procedure.DATA_COLUMNS)
+        self.data_filename = data_filename
+        self.data_filenames = [data_filename]
+
+        if os.path.exists(data_filename) and \
+                os.path.getsize(data_filename) > 0:
+            self.reload()
+            self.procedure.status = Procedure.FINISHED
+        else:
+            with open(data_filename, 'w') as f:
+                f.write(self.header())
+                f.write(self.labels())
+            self._data = None
+
+
+def emit_block(procedure, data, block_size=100000):
+    """ Emits the columns in `data` as results in blocks of `block_size`
+    rows and checks `should_stop` after every block. Scalars are broadcast
+    to the length of the columns, :class:`ScaledCodes` and
+    :class:`TimeBase` columns are passed on in slices.
+
+    :param procedure: The running procedure.
+    :param data: Dictionary of column names and arrays, scalars,
+                 :class:`ScaledCodes` or :class:`TimeBase`.
+    :param block_size: Number of rows per emitted block.
+    :returns: Number of emitted rows.
+    """
+    keys = list(data.keys())
+    scaled = [isinstance(data[key], (ScaledCodes, TimeBase)) for key in keys]
+    shape = np.broadcast_shapes(*[(len(data[key]),) if is_scaled
+                                  else np.shape(data[key])
+                                  for key, is_scaled in zip(keys, scaled)])
+    shape = shape or (1,)
+    columns = [data[key] if is_scaled
+               else np.broadcast_to(np.asarray(data[key]), shape)
+               for key, is_scaled in zip(keys, scaled)]
+    n_rows = shape[0]
+
+    for start in range(0, n_rows, block_size):
+        block = DataBlock((key, column[start:start+block_size])
+                          for key, column in zip(keys, columns))
+        procedure.emit('results', block)
+        if procedure.should_stop():
+            return start + block.n_rows
+    return n_rows
@@ -0,0 +1,268 @@
+""" Retention of the runs in the trash directory, where the interfaces store
+the results of runs that are not saved. The size and the age of the trash
+are bounded by deleting the least recently used files, after optionally
+compacting old CSV results into compressed binary results. Only the
+'.trash' directory is ever touched, never the directories users save into.
+Compacted and deleted runs are renamed in and removed from the run catalog.
+
+The quotas are set per bench in the configuration, where a missing entry
+means no limit, so that benches without any of them keep their trash:
+
+    TRASH_MAX_SIZE = 20         # GB, None for no limit
+    TRASH_MAX_AGE = 90          # days, None for no limit
+    TRASH_COMPACT_AFTER = 7     # days, None to not compact
+    TRASH_COMPACT_BACKEND = 'npz'
+    TRASH_INTERVAL = 10         # minutes between passes
+
+Enforce them once with
+
+    python -m ongpym.storage.retention
+"""
+
+import os
+import sys
+import time
+import logging
+import sqlite3
+import threading
+
+from .binary import EXTENSIONS, new_results, load_results
+from .results import DataBlock
+from .catalog import default_catalog
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+GB = 1024**3
+DAY = 24*3600
+
+
+def last_used(stat):
+    """ Returns the time at which a file was last read or written. """
+    return max(stat.st_atime, stat.st_mtime)
+
+
+class TrashRetention(threading.Thread):
+    """ Background thread that keeps the trash directory within its quotas.
+    Every `interval` seconds, CSV results older than `compact_after` are
+    compacted into compressed results of `compact_backend`, files not used
+    for `max_age` are deleted and, while the trash is larger than
+    `max_size`, the least recently used files are deleted. Files modified
+    within the last `grace` seconds, e.g. of queued or running runs, are
+    left alone.
+
+    :param directory: The trash directory, which has to be named '.trash'.
+    :param max_size: Maximum total size in bytes, or None.
+    :param max_age: Maximum time in seconds since the last use, or None.
+    :param compact_after: Time in seconds since the last modification
+                          after which CSV results are compacted, or None.
+    :param compact_backend: Results backend of compacted runs, 'npz' or
+                            'hdf5'.
+    :param interval: Time in seconds between two passes.
+    :param grace: Time in seconds after the last modification during which
+                  files are never compacted or deleted.
+    :param catalog: :class:`RunCatalog` whose runs follow the compacted
+                    and deleted files, or None.
+    """
+
+    def __init__(self, directory, max_size=None, max_age=None,
+                 compact_after=None, compact_backend='npz', interval=600,
+                 grace=3600, catalog=None):
+        super(TrashRetention, self).__init__(name='TrashRetention',
+                                             daemon=True)
+        directory = os.path.abspath(directory)
+        if os.path.basename(directory) != '.trash':
+            raise ValueError('%s is not a trash directory.' % directory)
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.compact_after = compact_after
+        self.compact_backend = compact_backend
+        self.interval = interval
+        self.grace = grace
+        self.catalog = catalog
+        self._stop_event = threading.Event()
+
+    def files(self):
+        """ Returns (path, stat) of all files in the trash, least recently
+        used first.
+        """
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    files.append((path, os.stat(path)))
+                except OSError:
+                    continue
+        return sorted(files, key=lambda file: last_used(file[1]))
+
+    def compact(self, filename):
+        """ Stores the CSV results `filename` as compressed binary results
+        with the same times of use and deletes the CSV file.
+
+        :returns: The file name of the compacted results.
+        """
+        # Reading the results would mark them as used
+        stat = os.stat(filename)
+        results = load_results(filename)
+        compacted = new_results(results.procedure, filename,
+                                self.compact_backend, compression=True)
+        try:
+            data = results.data
+            compacted.append(DataBlock({column: data[column].values
+                                        for column in data.columns}))
+            compacted.close()
+            os.utime(compacted.data_filename, (stat.st_atime,
+                                               stat.st_mtime))
+        except Exception:
+            os.remove(compacted.data_filename)
+            raise
+        os.remove(filename)
+        log.info('Compacted %s to %s.' % (filename, compacted.data_filename))
+        self._update_catalog('rename', filename, compacted.data_filename)
+        return compacted.data_filename
+
+    def remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError as e:
+            log.warning('Could not remove %s: %s' % (filename, e))
+            return False
+        log.info('Removed %s from the trash.' % filename)
+        self._update_catalog('remove', filename)
+        return True
+
+    def _update_catalog(self, method, *filenames):
+        """ Calls `method` of the catalog, a failure of which only costs
+        a stale entry.
+        """
+        if self.catalog is None:
+            return
+        try:
+            getattr(self.catalog, method)(*filenames)
+        except sqlite3.Error as e:
+            log.warning('Could not update the run catalog for %s: %s' % (
+                filenames[0], e))
+
+    def enforce(self):
+        """ Compacts and deletes files until the trash is within its
+        quotas.
+
+        :returns: The total size of the trash in bytes afterwards.
+        """
+        now = time.time()
+        files = [file for file in self.files()
+                 if now - file[1].st_mtime > self.grace]
+
+        if self.compact_after is not None:
+            for i, (path, stat) in enumerate(files):
+                if not path.lower().endswith('.csv') or \
+                        now - stat.st_mtime < self.compact_after:
+                    continue
+                root = os.path.splitext(path)[0]
+                if any(os.path.exists(root + ext) for ext in EXTENSIONS):
+                    continue
+                try:
+                    path = self.compact(path)
+                except Exception as e:
+                    log.warning('Could not compact %s: %s' % (path, e))
+                    continue
+                files[i] = (path, os.stat(path))
+
+        if self.max_age is not None:
+            removed = {path for path, stat in files
+                       if now - last_used(stat) > self.max_age and
+                       self.remove(path)}
+            files = [file for file in files if file[0] not in removed]
+
+        size = sum(stat.st_size for _, stat in self.files())
+        if self.max_size is not None:
+            for path, stat in files:
+                if size <= self.max_size:
+                    break
+                if self.remove(path):
+                    size -= stat.st_size
+            if size > self.max_size:
+                log.warning('The trash of %.1f GB exceeds its quota of '
+                            '%.1f GB with recent runs.' % (
+                                size/GB, self.max_size/GB))
+        return size
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.enforce()
+            except Exception:
+                log.exception('Trash retention failed.')
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def trash_retention():
+    """ Returns the :class:`TrashRetention` of the trash directory in
+    PATH_TRASH with the quotas of the configuration and the
+    :func:`default_catalog`, or None if PATH_TRASH or all of the quotas
+    are not configured.
+    """
+    try:
+        from ..config import PATH_TRASH
+    except ImportError:
+        return None
+    try:
+        from ..config import TRASH_MAX_SIZE
+    except ImportError:
+        TRASH_MAX_SIZE = None
+    try:
+        from ..config import TRASH_MAX_AGE
+    except ImportError:
+        TRASH_MAX_AGE = None
+    try:
+        from ..config import TRASH_COMPACT_AFTER
+    except ImportError:
+        TRASH_COMPACT_AFTER = None
+    try:
+        from ..config import TRASH_COMPACT_BACKEND
+    except ImportError:
+        TRASH_COMPACT_BACKEND = 'npz'
+    try:
+        from ..config import TRASH_INTERVAL
+    except ImportError:
+        TRASH_INTERVAL = 10
+    if TRASH_MAX_SIZE is None and TRASH_MAX_AGE is None and \
+            TRASH_COMPACT_AFTER is None:
+        return None
+
+    def scaled(value, unit):
+        return None if value is None else value*unit
+
+    return TrashRetention(os.path.join(PATH_TRASH, '.trash'),
+                          max_size=scaled(TRASH_MAX_SIZE, GB),
+                          max_age=scaled(TRASH_MAX_AGE, DAY),
+                          compact_after=scaled(TRASH_COMPACT_AFTER, DAY),
+                          compact_backend=TRASH_COMPACT_BACKEND,
+                          interval=scaled(TRASH_INTERVAL, 60),
+                          catalog=default_catalog())
+
+
+def start_trash_retention():
+    """ Starts the retention of the configured trash directory in the
+    background and returns its thread, or None if there is no trash or
+    no quota.
+    """
+    retention = trash_retention()
+    if retention is not None:
+        retention.start()
+    return retention
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout)
+    retention = trash_retention()
+    if retention is None:
+        sys.exit('PATH_TRASH or the trash quotas are not configured.')
+    if os.path.isdir(retention.directory):
+        size = retention.enforce()
+        print('The trash has %.2f GB.' % (size/GB))
@@ -0,0 +1 @@
+from .scaling import ScaledCodes, TimeBase
@@ -0,0 +1,84 @@
+import numpy as np
+
+
+class ScaledCodes(object):
+    """ Raw integer codes of a digitizer together with the scale of its
+    waveform preamble. Converted to an array, e.g. by `np.asarray`, the
+    codes give volts following the Tektronix convention
+
+        (codes - yoff)*ymult + yzero
+
+    and slicing returns :class:`ScaledCodes` of the sliced codes, so that
+    :func:`emit_block` passes them on unconverted. :class:`RawResults`
+    store the codes, all other results the volts.
+
+    :param codes: Array of the integer codes.
+    :param ymult: Volts per code.
+    :param yoff: Code of the reference level.
+    :param yzero: Volts at the reference level.
+    """
+
+    def __init__(self, codes, ymult, yoff=0., yzero=0.):
+        self.codes = codes
+        self.ymult = float(ymult)
+        self.yoff = float(yoff)
+        self.yzero = float(yzero)
+
+    @property
+    def preamble(self):
+        return {'ymult': self.ymult, 'yoff': self.yoff, 'yzero': self.yzero}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return ScaledCodes(self.codes[item], **self.preamble)
+        return np.asarray(self)[item]
+
+    def __array__(self, dtype=None):
+        volts = (np.asarray(self.codes, dtype=np.float64) - self.yoff) \
+            * self.ymult + self.yzero
+        if dtype is not None:
+            return volts.astype(dtype)
+        return volts
+
+    def __repr__(self):
+        return 'ScaledCodes(%d codes, ymult=%g, yoff=%g, yzero=%g)' % (
+            len(self), self.ymult, self.yoff, self.yzero)
+
+
+class TimeBase(object):
+    """ Uniformly sampled axis of `n` values x0 + i*dx, e.g. the time base
+    of a digitizer. Converted to an array it gives the values, sliced it
+    gives a :class:`TimeBase` of the selected samples. :class:`RawResults`
+    only store `x0` and `dx`.
+
+    :param x0: First value.
+    :param dx: Sample interval.
+    :param n: Number of samples.
+    """
+
+    def __init__(self, x0, dx, n):
+        self.x0 = float(x0)
+        self.dx = float(dx)
+        self.n = int(n)
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.n)
+            return TimeBase(self.x0 + start*self.dx, step*self.dx,
+                            len(range(start, stop, step)))
+        return self.x0 + range(self.n)[item]*self.dx
+
+    def __array__(self, dtype=None):
+        values = self.x0 + np.arange(self.n)*self.dx
+        if dtype is not None:
+            return values.astype(dtype)
+        return values
+
+    def __repr__(self):
+        return 'TimeBase(x0=%g, dx=%g, n=%d)' % (self.x0, self.dx, self.n)